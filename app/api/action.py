@@ -23,11 +23,13 @@ from app.core.cmd_handler import CommandHandler
 from app.core.jobcenter import JobCenter
 from app.core.services import ServiceManager
 from app.core.task_manager import GlobalTaskManager
+from app.db.main_db import MainDb
 from app.downloader import Downloader
 from app.indexer import Indexer
 from app.indexer.manager import IndexerManager
 from app.media import Media, Bangumi, DouBan, Scraper
 from app.media.meta import MetaInfo
+from app.media.tmdbv3api import TMDbCache
 from app.mediaserver import MediaServer
 from app.message import Message
 from app.models.user import User, UserManager
@@ -42,6 +44,7 @@ from app.modules.searcher import Searcher
 from app.modules.subscribe import Subscribe
 from app.modules.media_status import MediaStatusChecker
 from app.modules.sync import Sync
+from app.modules.system.backup import Backup
 from app.modules.torrentremover import TorrentRemover
 from app.plugins import PluginManager, EventManager
 from app.sites import SitesManager, SitesDataStatisticsCenter, CookieManager, SiteConf
@@ -1992,11 +1995,11 @@ class WebAction:
             return {"code": 0, "Items": res_list}
 
         # 补充存在与订阅状态
-        for res in res_list:
-            fav, rssid, item_url = MediaStatusChecker().get_media_exists_info(mtype=res.get("type"),
-                                                              title=res.get("title"),
-                                                              year=res.get("year"),
-                                                              mediaid=res.get("id"))
+        exists_infos = MediaStatusChecker().get_medias_exists_info([{"type": res.get("type"),
+                                                                     "title": res.get("title"),
+                                                                     "year": res.get("year"),
+                                                                     "mediaid": res.get("id")} for res in res_list])
+        for res, (fav, rssid, item_url) in zip(res_list, exists_infos):
             res.update({
                 'fav': fav,
                 'rssid': rssid,
@@ -2012,11 +2015,12 @@ class WebAction:
         if not media_list:
             return {"code": 0, "Items": []} 
 
-        for item in media_list:
-            fav, rssid, item_url = MediaStatusChecker().get_media_exists_info(mtype=item.get("type"),
-                                                              title=item.get("title"),
-                                                              year=item.get("year"),
-                                                              mediaid=item.get("tmdbid"))
+        exists_infos = MediaStatusChecker().get_medias_exists_info([{"type": item.get("type"),
+                                                                     "title": item.get("title"),
+                                                                     "year": item.get("year"),
+                                                                     "mediaid": item.get("tmdbid")}
+                                                                    for item in media_list])
+        for item, (fav, rssid, item_url) in zip(media_list, exists_infos):
             item.update({
                 'fav': fav,
                 'rssid': rssid,
@@ -2170,7 +2174,7 @@ class WebAction:
         """
         try:
             MetaHelper().clear_meta_data()
-            os.remove(MetaHelper().get_meta_data_path())
+            TMDbCache().clear()
         except Exception as e:
             log.exception("[act]清空TMDB缓存出错:")
             return {"code": 0, "msg": str(e)}
@@ -2206,11 +2210,12 @@ class WebAction:
         """
         filename = data.get("file_name")
         if filename:
-            config_path = Config().get_config_path()
             temp_path = Config().get_temp_path()
             file_path = os.path.join(temp_path, filename)
             try:
-                shutil.unpack_archive(file_path, config_path, format='zip')
+                Backup().restore(file_path)
+                # 补建非完整备份中删除的表及索引
+                MainDb().init_db()
                 return {"code": 0, "msg": ""}
             except Exception as e:
                 log.exception("[act]解压恢复备份文件出错:")
@@ -1,3 +1,4 @@
+import asyncio
 import os
 
 from functools import wraps
@@ -6,6 +7,7 @@ from math import floor
 from fastapi import APIRouter, Request, Depends
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 
 import log
 
@@ -14,6 +16,7 @@ from app.conf.moduleconf import ModuleConf
 from app.conf.systemconfig import SystemConfig
 from app.downloader.downloader import Downloader, PT_TRANSFER_INTERVAL
 from app.helper.meta_helper import MetaHelper
+from app.helper.snapshot_cache import SnapshotCache
 from app.helper.words_helper import WordsHelper
 from app.indexer.indexer import Indexer
 from app.media.category import Category
@@ -35,7 +38,7 @@ from app.sites.site_manager import SitesManager
 from app.sites.site_statistics import SitesDataStatisticsCenter
 from app.utils.constants import Constants
 from app.utils.system_utils import SystemUtils
-from app.utils.types import Spider, SystemConfigKey
+from app.utils.types import Spider, SystemConfigKey, SnapshotKey
 
 from config import Config
 
@@ -58,6 +61,15 @@ SEARCH_PARAMS = {
     "imdb": 'imdb id'
 }
 
+# 开始页面各面板的刷新间隔（秒），期间直接返回上次的数据
+DASHBOARD_REFRESH_INTERVALS = {
+    SnapshotKey.MediaLibraries: 600,
+    SnapshotKey.MediaActivity: 60,
+    SnapshotKey.MediaLatest: 300,
+    SnapshotKey.MediaCounts: 300,
+    SnapshotKey.LibrarySpace: 600,
+}
+
 
 # 异常捕获器
 def router_exception_handler(router: APIRouter):
@@ -95,7 +107,7 @@ def response(code: int = 0, msg: str = "success", data=None, status_code: int =
 
 # userinfo
 @data_router.post("/userinfo")
-async def sysinfo(current_user: User = Depends(get_current_user)):
+def sysinfo(current_user: User = Depends(get_current_user)):
 
     return response(data=
         {
@@ -106,7 +118,7 @@ async def sysinfo(current_user: User = Depends(get_current_user)):
 
 # sysinfo
 @data_router.post("/sysinfo")
-async def sysinfo(current_user: User = Depends(get_current_user)):
+def sysinfo(current_user: User = Depends(get_current_user)):
 
     # 判断当前的运营环境
     system_flag = SystemUtils.get_system()
@@ -154,7 +166,7 @@ async def sysinfo(current_user: User = Depends(get_current_user)):
 
 # 基础设置页面
 @data_router.post("/basic")
-async def basic():
+def basic():
 
     proxy = Config().get_config('app').get("proxies", {}).get("http")
     if proxy:
@@ -176,22 +188,23 @@ async def basic():
 @data_router.post("/index")
 async def index():
 
-    # 磁盘空间
-    library_spaces = _get_library_spacesize()
     # 媒体库配置
     library_sync_conf = SystemConfig().get(SystemConfigKey.SyncLibrary) or []
     # 媒体服务器类型
     server_type = Config().get_config('media').get('media_server')
 
-    # 媒体库
-    media_server = MediaServer()
-
-    media_librarys = media_server.get_libraries()
-    activity_logs = media_server.get_activity_log(30)
-    latest_adds = media_server.get_latest()
+    # 磁盘空间及媒体服务器数据使用后台刷新的快照，仅首次查询时需等待，互不依赖在线程池中并发查询
+    snapshots = SnapshotCache()
+    library_spaces, media_librarys, activity_logs, latest_adds, media_counts = await asyncio.gather(
+        run_in_threadpool(snapshots.get, SnapshotKey.LibrarySpace),
+        run_in_threadpool(snapshots.get, SnapshotKey.MediaLibraries),
+        run_in_threadpool(snapshots.get, SnapshotKey.MediaActivity),
+        run_in_threadpool(snapshots.get, SnapshotKey.MediaLatest),
+        run_in_threadpool(snapshots.get, SnapshotKey.MediaCounts)
+    )
+    library_spaces = library_spaces or {}
 
     # 获取媒体数量
-    media_counts = media_server.get_medias_count()
     if media_counts:
         server_sucess = True
         movie_count = "{:,}".format(media_counts.get('MovieCount'))
@@ -227,7 +240,7 @@ async def index():
 
 # 资源搜索页面
 @data_router.post("/search")
-async def search():
+def search():
 
     res = SearchProxy().get_torrent_search_result()
     return response(data=
@@ -240,7 +253,7 @@ async def search():
 
 # 订阅页面
 @data_router.post("/rss")
-async def rss(t: str = "MOV"):
+def rss(t: str = "MOV"):
 
     rule_groups = {str(group["id"]): group["name"] for group in Filter().get_rule_groups()}
     download_settings = Downloader().get_download_setting()
@@ -268,7 +281,7 @@ async def rss(t: str = "MOV"):
 
 # 订阅历史页面
 @data_router.post("/rss_history")
-async def rss_history(t: str = ""):
+def rss_history(t: str = ""):
 
     rss_history = [rec.as_dict() for rec in Rss().get_rss_history(rtype=t)]
 
@@ -281,7 +294,7 @@ async def rss_history(t: str = ""):
 
 # 订阅日历页面
 @data_router.post("/rss_calendar")
-async def rss_calendar():
+def rss_calendar():
 
     subscriber = Subscribe()
 
@@ -325,7 +338,7 @@ async def rss_calendar():
 
 # 索引站点页面
 @data_router.post("/indexer")
-async def indexer(p: int = 1):
+def indexer(p: int = 1):
 
     # 启用的索引站点
     indexer_sites = SystemConfig().get(SystemConfigKey.UserIndexerSites)
@@ -369,7 +382,7 @@ async def indexer(p: int = 1):
 
 # 站点维护页面
 @data_router.post("/site")
-async def sites_page():
+def sites_page():
 
     indexer_sites = SystemConfig().get(SystemConfigKey.UserIndexerSites)
     if not indexer_sites:
@@ -399,7 +412,7 @@ async def sites_page():
 
 # 站点资源页面
 @data_router.post("/sitelist")
-async def sitelist_page():
+def sitelist_page():
     indexer_sites = Indexer().get_indexers(check=False)
     return response(data=
         {
@@ -410,7 +423,7 @@ async def sitelist_page():
 
 # 媒体库页面
 @data_router.post("/library")
-async def library():
+def library():
     rmt_mode_dict = _get_rmt_modes_dict()
     scraper_conf = SystemConfig().get(SystemConfigKey.UserScraperConf) or {}
     return response(data=
@@ -424,7 +437,7 @@ async def library():
 
 # 通知消息页面
 @data_router.post("/notification")
-async def notification():
+def notification():
 
     message_clients = Message().get_message_client_info()
     switchs = ModuleConf.MESSAGE_CONF.get("switch")
@@ -449,7 +462,7 @@ async def notification():
 
 # 用户管理页面
 @data_router.post("/users")
-async def users(current_user: User = Depends(get_current_user)):
+def users(current_user: User = Depends(get_current_user)):
 
     users = []
     top_menus = []
@@ -471,7 +484,7 @@ async def users(current_user: User = Depends(get_current_user)):
 
 # 过滤规则设置页面
 @data_router.post("/filterrule")
-async def filterrule():
+def filterrule():
 
     _filter = Filter()
     rule_groups = _filter.get_rule_infos()
@@ -486,7 +499,7 @@ async def filterrule():
 
 # 目录同步页面
 @data_router.post("/directorysync")
-async def directorysync():
+def directorysync():
     rmt_mode_dict = _get_rmt_modes_dict()
     sync_paths = Sync().get_sync_path_conf()
     return response(data=
@@ -498,7 +511,7 @@ async def directorysync():
 
 # 自定义识别词设置页面
 @data_router.post("/customwords")
-async def customwords():
+def customwords():
     groups = WordsHelper().get_customwords_groups()
     return response(data=
         {
@@ -509,7 +522,7 @@ async def customwords():
 
 # 插件页面
 @data_router.post("/plugin")
-async def plugin(current_user: User = Depends(get_current_user)):
+def plugin(current_user: User = Depends(get_current_user)):
 
     # 插件
     plugins = PluginManager().get_plugins_conf(current_user.level)
@@ -522,7 +535,7 @@ async def plugin(current_user: User = Depends(get_current_user)):
 
 # 用户RSS页面
 @data_router.post("/user_rss")
-async def user_rss():
+def user_rss():
     """
     用户RSS页面
     """
@@ -550,7 +563,7 @@ async def user_rss():
 
 # 服务页面
 @data_router.post("/service")
-async def service(current_user: User = Depends(get_current_user)):
+def service(current_user: User = Depends(get_current_user)):
     """
     服务页面
     """
@@ -629,7 +642,7 @@ async def service(current_user: User = Depends(get_current_user)):
 
 # 下载器
 @data_router.post("/downloaders")
-async def downloading():
+def downloading():
     """
     正在下载页面
     """
@@ -662,7 +675,7 @@ async def downloading():
 
 # 正在下载页面
 @data_router.post("/downloading")
-async def downloading():
+def downloading():
     """
     正在下载页面
     """
@@ -686,7 +699,7 @@ async def downloading():
 
 # 媒体文件管理页面
 @data_router.post("/mediafile")
-async def mediafile():
+def mediafile():
     """
     媒体文件管理页面
     """
@@ -713,7 +726,7 @@ async def mediafile():
 
 # 数据统计页面
 @data_router.post("/statistics")
-async def statistics(current_user: User = Depends(get_current_user)):
+def statistics(current_user: User = Depends(get_current_user)):
     """
     数据统计页面
     """
@@ -777,7 +790,7 @@ async def statistics(current_user: User = Depends(get_current_user)):
 
 # 刷流任务页面
 @data_router.post("/brushtask")
-async def brushtask():
+def brushtask():
     """
     刷流任务页面
     """
@@ -800,7 +813,7 @@ async def brushtask():
 
 # RSS解析器页面
 @data_router.post("/rss_parser")
-async def rss_parser():
+def rss_parser():
     """
     RSS解析器页面
     """
@@ -816,7 +829,7 @@ async def rss_parser():
 
 # 自动删种页面
 @data_router.post("/torrent_remove")
-async def torrent_remove():
+def torrent_remove():
     """
     自动删种页面
     """
@@ -835,7 +848,7 @@ async def torrent_remove():
 
 # 下载设置页面
 @data_router.post("/download_setting")
-async def download_setting():
+def download_setting():
     """
     下载设置页面
     """
@@ -872,7 +885,8 @@ async def tmdbcache(request: Request):
     else:
         current_page = int(current_page)
 
-    total_count, tmdb_caches = MetaHelper().dump_meta_data(search_str, current_page, page_num)
+    total_count, tmdb_caches = await run_in_threadpool(MetaHelper().dump_meta_data,
+                                                       search_str, current_page, page_num)
 
     return response(data=
         {
@@ -907,7 +921,8 @@ async def history(request: Request):
         current_page = int(current_page)
 
     # 查询
-    total_count, historys = FileTransfer().get_transfer_history(search_str, current_page, page_size)
+    total_count, historys = await run_in_threadpool(FileTransfer().get_transfer_history,
+                                                    search_str, current_page, page_size)
     # 结果转换
     historys_list = []
     for history in historys:
@@ -959,7 +974,8 @@ async def unidentification(request: Request):
         current_page = int(current_page)
 
     # 查询
-    total_count, db_records = FileTransfer().get_transfer_unknown_paths_by_page(search_str, current_page, page_num)
+    total_count, db_records = await run_in_threadpool(FileTransfer().get_transfer_unknown_paths_by_page,
+                                                      search_str, current_page, page_num)
     # 结果转换
     unknown_items = []
     for rec in db_records:
@@ -1059,5 +1075,24 @@ def _get_library_spacesize():
 
 
 
+def _register_dashboard_snapshots():
+    """
+    注册开始页面各面板的数据快照
+    """
+    loaders = {
+        SnapshotKey.MediaLibraries: lambda: MediaServer().get_libraries(),
+        SnapshotKey.MediaActivity: lambda: MediaServer().get_activity_log(30),
+        SnapshotKey.MediaLatest: lambda: MediaServer().get_latest(),
+        SnapshotKey.MediaCounts: lambda: MediaServer().get_medias_count(),
+        SnapshotKey.LibrarySpace: _get_library_spacesize,
+    }
+    snapshots = SnapshotCache()
+    for key, loader in loaders.items():
+        snapshots.register(key, loader, DASHBOARD_REFRESH_INTERVALS.get(key))
+
+
+_register_dashboard_snapshots()
+
+
 # 给这个 router 加异常捕获
 router_exception_handler(data_router)
\ No newline at end of file
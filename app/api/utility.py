@@ -1,20 +1,19 @@
 import os
-import hashlib
-import httpx
 
 from fastapi import APIRouter, HTTPException, Query, Request, Depends, Response
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 
 from urllib.parse import unquote, urlparse, urlunparse
 from pathlib import Path
 
 import log
 
+from app.helper import ImageCache
 from app.middleware.security import get_current_user
 from app.modules.system.backup import Backup
-from app.utils import RequestUtils, SystemUtils
+from app.utils import SystemUtils
 from app.utils.types import OsType
-from app.utils.async_request import AsyncRequestUtils
 
 from config import Config
 
@@ -35,37 +34,11 @@ async def dirlist(request: Request):
     """
     r = ['<ul class="jqueryFileTree" style="display: none;">']
     try:
-        r = ['<ul class="jqueryFileTree" style="display: none;">']
         form = await request.form()
         in_dir = unquote(form.get('dir'))
         ft = form.get("filter")
-        if not in_dir or in_dir == "/":
-            if SystemUtils.get_system() == OsType.WINDOWS:
-                partitions = SystemUtils.get_windows_drives()
-                if partitions:
-                    dirs = partitions
-                else:
-                    dirs = [os.path.join("C:/", f) for f in os.listdir("C:/")]
-            else:
-                dirs = [os.path.join("/", f) for f in os.listdir("/")]
-        else:
-            d = os.path.normpath(unquote(in_dir))
-            if not os.path.isdir(d):
-                d = os.path.dirname(d)
-            dirs = [os.path.join(d, f) for f in os.listdir(d)]
-        for ff in dirs:
-            f = os.path.basename(ff)
-            if not f:
-                f = ff
-            if os.path.isdir(ff):
-                r.append('<li class="directory collapsed"><a rel="%s/">%s</a></li>' % (
-                    ff.replace("\\", "/"), f.replace("\\", "/")))
-            else:
-                if ft != "HIDE_FILES_FILTER":
-                    e = os.path.splitext(f)[1][1:]
-                    r.append('<li class="file ext_%s"><a rel="%s">%s</a></li>' % (
-                        e, ff.replace("\\", "/"), f.replace("\\", "/")))
-        r.append('</ul>')
+        # 目录可能在网络存储上，在线程池中查询
+        r += await run_in_threadpool(_list_dir, in_dir, ft)
     except Exception as e:
         log.exception('[App]加载路径失败: ')
         r.append('加载路径失败: %s' % str(e))
@@ -73,6 +46,42 @@ async def dirlist(request: Request):
     return Response(content=''.join(r), media_type="text/html")
 
 
+def _list_dir(in_dir, ft):
+    """
+    列出目录下的子目录及文件
+    :return: 目录树的HTML片段
+    """
+    r = []
+    if not in_dir or in_dir == "/":
+        if SystemUtils.get_system() == OsType.WINDOWS:
+            partitions = SystemUtils.get_windows_drives()
+            if partitions:
+                dirs = partitions
+            else:
+                dirs = [os.path.join("C:/", f) for f in os.listdir("C:/")]
+        else:
+            dirs = [os.path.join("/", f) for f in os.listdir("/")]
+    else:
+        d = os.path.normpath(unquote(in_dir))
+        if not os.path.isdir(d):
+            d = os.path.dirname(d)
+        dirs = [os.path.join(d, f) for f in os.listdir(d)]
+    for ff in dirs:
+        f = os.path.basename(ff)
+        if not f:
+            f = ff
+        if os.path.isdir(ff):
+            r.append('<li class="directory collapsed"><a rel="%s/">%s</a></li>' % (
+                ff.replace("\\", "/"), f.replace("\\", "/")))
+        else:
+            if ft != "HIDE_FILES_FILTER":
+                e = os.path.splitext(f)[1][1:]
+                r.append('<li class="file ext_%s"><a rel="%s">%s</a></li>' % (
+                    e, ff.replace("\\", "/"), f.replace("\\", "/")))
+    r.append('</ul>')
+    return r
+
+
 # 备份配置文件
 @utility_router.post("/backup")
 async def backup():
@@ -80,7 +89,7 @@ async def backup():
     备份用户设置文件
     :return: 备份文件.zip_file
     """
-    zip_file = Backup().backup()
+    zip_file = await run_in_threadpool(Backup().backup)
     if not zip_file:
         return Response(content="创建备份失败", status_code=400)
     return FileResponse(zip_file)
@@ -96,14 +105,11 @@ async def upload(request: Request):
         form = await request.form()
         files = form.get('file')
         temp_path = Config().get_temp_path()
-        if not os.path.exists(temp_path):
-            os.makedirs(temp_path)
         file_path = Path(temp_path) / files.filename
 
         # 保存文件
-        with open(file_path, "wb") as f:
-            content = await files.read()
-            f.write(content)
+        content = await files.read()
+        await run_in_threadpool(_save_file, file_path, content)
 
         return {"code": 0, "filepath": str(file_path)}
     except Exception as e:
@@ -111,37 +117,37 @@ async def upload(request: Request):
         return {"code": 1, "msg": str(e), "filepath": ""}
 
 
+def _save_file(file_path: Path, content: bytes):
+    """
+    保存上传的文件
+    """
+    os.makedirs(file_path.parent, exist_ok=True)
+    with open(file_path, "wb") as f:
+        f.write(content)
+
+
 # 图片中转服务
 @utility_router.get("/img")
-async def img(request: Request, url: str):
+async def img(request: Request, url: str, w: int = None):
     """
     图片中转服务
+    :param w: 缩略图宽度，列表页使用
     """
     if not url:
         return Response(content="参数错误", status_code=400)
 
-    # 计算Etag
-    etag = hashlib.sha256(url.encode('utf-8')).hexdigest()
-
-    # 检查协商缓存
-    if_none_match = request.headers.get('If-None-Match')
-    if if_none_match and if_none_match == etag:
-        return Response(content='', status_code=304)
-
-    # 获取图片数据
-    response = Response(
-        content=RequestUtils.request_cache(url),
-        media_type='image/jpeg'
-    )
-    response.headers['Cache-Control'] = 'max-age=604800'
-    response.headers['Etag'] = etag
-    return response
+    return await _cached_image_response(request=request,
+                                        url=url,
+                                        width=w,
+                                        cache_control="max-age=604800")
 
 
 # 豆瓣图片中转服务
 @utility_router.get("/doubanimg")
 async def proxy_douban_image(
-    url: str = Query(..., description="Douban image url")
+    request: Request,
+    url: str = Query(..., description="Douban image url"),
+    w: int = Query(None, description="Thumbnail width")
 ):
     parsed = urlparse(url)
 
@@ -154,30 +160,37 @@ async def proxy_douban_image(
         "User-Agent": Config().get_ua(),
     }
 
-    try:
+    return await _cached_image_response(request=request,
+                                        url=force_webp(url),
+                                        width=w,
+                                        headers=headers,
+                                        cache_control="public, max-age=86400")
+
 
-        webp_url = force_webp(url)
-        resp = await AsyncRequestUtils.http_client.get(webp_url, headers=headers)
+async def _cached_image_response(request: Request, url: str, width: int = None, headers: dict = None,
+                                 cache_control: str = None):
+    """
+    从磁盘缓存返回图片，未缓存时下载
+    """
+    image_cache = ImageCache()
+    # 检查协商缓存
+    etag = '"%s"' % image_cache.get_key(url, image_cache.get_thumb_width(width))
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
 
-        if resp.status_code != 200:
-            raise HTTPException(
-                status_code=resp.status_code,
-                detail="Upstream request failed"
-            )
+    image = await image_cache.fetch(url, headers=headers, width=width)
+    if not image:
+        raise HTTPException(status_code=502, detail="Upstream request failed")
 
-        content_type = resp.headers.get("content-type", "image/webp")
+    return FileResponse(image.path,
+                        media_type=image.media_type,
+                        headers={
+                            "Cache-Control": cache_control,
+                            "ETag": etag
+                        })
 
-        return StreamingResponse(
-            resp.aiter_bytes(),
-            media_type=content_type,
-            headers={
-                "Cache-Control": "public, max-age=86400"
-            }
-        )
 
-    except httpx.RequestError:
-        raise HTTPException(status_code=502, detail="Upstream connection error")
-    
 def force_webp(url: str) -> str:
     parsed = urlparse(url)
     path = parsed.path
@@ -6,6 +6,7 @@ from fastapi import FastAPI
 import log
 from log import set_event_loop_for_logging
 
+from app.core.loop_monitor import LoopLagMonitor
 from app.core.task_manager import task_processor_start, task_processor_stop
 from app.utils.async_request import AsyncRequestUtils
 
@@ -29,6 +30,8 @@ async def lifespan(app: FastAPI):
         try:
             loop = asyncio.get_running_loop()
             set_event_loop_for_logging(loop)
+            # 事件循环阻塞监控
+            LoopLagMonitor.start()
             
         except RuntimeError as e:
             log.error(f"Could not capture event loop for SSE logging: {e}")
@@ -46,6 +49,7 @@ async def lifespan(app: FastAPI):
         log.critical('❌ FastAPI 应用启动时异常')
     finally:
         log.info('FastAPI 应用开始关闭...')
+        await LoopLagMonitor.stop()
         ServiceManager.stop_service()
 
         # 关闭配置文件监控
@@ -56,6 +60,6 @@ async def lifespan(app: FastAPI):
         task_processor_stop()
 
         # 关闭client_session
-        AsyncRequestUtils.close_client()
+        await AsyncRequestUtils.close_client()
 
         log.info("🛑 FastAPI 应用已关闭")
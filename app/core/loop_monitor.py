@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import log
+
+# 检测间隔（秒）
+LOOP_LAG_INTERVAL = 0.5
+# 事件循环被阻塞超过该时间（秒）时告警
+LOOP_LAG_THRESHOLD = 0.3
+
+
+class LoopLagMonitor(object):
+    """
+    事件循环延迟监控
+    定时休眠并测量实际唤醒时间与预期的差值，超过阈值说明有处理函数在事件循环中执行了阻塞操作，
+    告警时带上当时正在处理的请求，便于定位
+    """
+    _lock = threading.Lock()
+    # 请求ID -> (请求方法 路径, 开始时间)
+    _active = {}
+    # 最近处理完成的请求 (请求方法 路径, 开始时间, 完成时间)
+    _finished = deque(maxlen=100)
+    _task = None
+    _request_seq = 0
+
+    _max_lag = 0
+    _last_lag = 0
+    _blocked_count = 0
+
+    @classmethod
+    def start(cls):
+        """
+        在事件循环中启动监控
+        """
+        if cls._task and not cls._task.done():
+            return
+        cls._task = asyncio.get_running_loop().create_task(cls.__run())
+
+    @classmethod
+    async def stop(cls):
+        """
+        停止监控
+        """
+        if not cls._task:
+            return
+        cls._task.cancel()
+        try:
+            await cls._task
+        except asyncio.CancelledError:
+            pass
+        cls._task = None
+
+    @classmethod
+    async def __run(cls):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = time.monotonic() - started - LOOP_LAG_INTERVAL
+            cls._last_lag = lag
+            cls._max_lag = max(cls._max_lag, lag)
+            if lag < LOOP_LAG_THRESHOLD:
+                continue
+            cls._blocked_count += 1
+            requests = cls.active_requests(since=started)
+            log.warn(f"【System】事件循环被阻塞 {round(lag, 2)} 秒，处理中的请求："
+                     f"{'、'.join(requests) if requests else '无'}")
+
+    @classmethod
+    def request_started(cls, name):
+        """
+        记录开始处理的请求
+        :return: 请求ID
+        """
+        with cls._lock:
+            cls._request_seq += 1
+            cls._active[cls._request_seq] = (name, time.monotonic())
+            return cls._request_seq
+
+    @classmethod
+    def request_finished(cls, request_id):
+        """
+        记录处理完成的请求
+        """
+        with cls._lock:
+            item = cls._active.pop(request_id, None)
+            if item:
+                cls._finished.append((item[0], item[1], time.monotonic()))
+
+    @classmethod
+    def active_requests(cls, since=None):
+        """
+        正在处理的请求及已处理时间
+        :param since: 同时返回该时间之后处理完成的请求
+        """
+        now = time.monotonic()
+        with cls._lock:
+            requests = ["%s(%ss)" % (name, round(now - started, 1)) for name, started in cls._active.values()]
+            if since:
+                requests += ["%s(%ss)" % (name, round(finished - started, 1))
+                             for name, started, finished in cls._finished if finished >= since]
+        return requests
+
+    @classmethod
+    def stats(cls):
+        """
+        监控统计
+        """
+        return {
+            "last_lag": round(cls._last_lag, 3),
+            "max_lag": round(cls._max_lag, 3),
+            "blocked_count": cls._blocked_count,
+            "active_requests": len(cls._active)
+        }
@@ -118,7 +118,7 @@ class Scheduler:
                             mediasync_interval = 0
                 if mediasync_interval:
                     self.get_scheduler().add_job(
-                        MediaServer().sync_mediaserver,
+                        MediaServer().sync_mediaserver_incremental,
                         "interval",
                         hours=mediasync_interval,
                         name='媒体库同步'
@@ -11,6 +11,7 @@ from app.downloader import Downloader
 
 from app.helper import ThreadHelper, DisplayHelper
 
+from app.indexer.client.browser import BrowserPool
 from app.indexer.manager import IndexerManager
 from app.modules.brushtaskv2 import BrushTaskV2 as BrushTask
 from app.modules.rsschecker import RssChecker
@@ -68,6 +69,8 @@ class ServiceManager:
         TorrentRemover().stop_service()
         # 关闭下载器监控
         Downloader().stop_service()
+        # 关闭浏览器池
+        BrowserPool().stop_service()
         # 关闭插件
         PluginManager().stop_service()
         # 清理定时器
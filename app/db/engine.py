@@ -0,0 +1,142 @@
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Query
+from sqlalchemy.pool import QueuePool
+
+# 连接参数
+SQLITE_PRAGMAS = [
+    # WAL模式下读写互不阻塞
+    "PRAGMA journal_mode=WAL",
+    # WAL模式下NORMAL已可保证一致性，减少fsync
+    "PRAGMA synchronous=NORMAL",
+    # 锁等待时间（毫秒），避免并发写时直接报 database is locked
+    "PRAGMA busy_timeout=30000",
+    # 页缓存，负数单位为KB
+    "PRAGMA cache_size=-32768",
+    # 内存映射读取
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+]
+# 写连接池：SQLite同时只有一个写事务，保持少量连接，并发时由连接池等待及busy_timeout排队
+WRITER_POOL_SIZE = 5
+WRITER_MAX_OVERFLOW = 2
+# 只读连接池：用完即还
+READER_POOL_SIZE = 5
+READER_MAX_OVERFLOW = 10
+# 获取连接的最长等待时间（秒）
+POOL_TIMEOUT = 30
+
+_stats_lock = threading.Lock()
+_pool_stats = {}
+
+
+class TimedQueuePool(QueuePool):
+    """
+    记录获取连接等待时间的连接池
+    """
+
+    _stats_name = None
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._stats_name = self._stats_name
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            record_pool_wait(self._stats_name, time.perf_counter() - start, timeout=True)
+            raise
+        record_pool_wait(self._stats_name, time.perf_counter() - start)
+        return conn
+
+
+class ReleasingQuery(Query):
+    """
+    查询完成后归还连接的Query
+    按线程保持的会话在只读查询后不会提交，连接会一直被占用；由查询开启的事务在取回结果后即提交，
+    连接随之归还连接池。会话中已有事务或待写入的数据时不做处理，由写入方统一提交
+    """
+
+    def _iter(self):
+        session = self.session
+        if session.in_transaction() or session.new or session.dirty or session.deleted \
+                or self.load_options._yield_per:
+            return super()._iter()
+        result = session.execute(self._statement_20(),
+                                 self._params,
+                                 execution_options={"_sa_orm_load_options": self.load_options})
+        # 先取回全部结果，只读事务提交仅用于归还连接，expire_on_commit=False时已加载的对象不受影响
+        result = result.freeze()()
+        session.commit()
+        # 与Query._iter一致的结果处理
+        if result._attributes.get("is_single_entity", False):
+            result = result.scalars()
+        if result._attributes.get("filtered", False):
+            result = result.unique()
+        return result
+
+
+def record_pool_wait(name, cost, timeout=False):
+    """
+    记录一次获取连接的等待时间
+    """
+    if not name:
+        return
+    with _stats_lock:
+        item = _pool_stats.setdefault(name, {"checkouts": 0, "timeouts": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0})
+        item["checkouts"] += 1
+        if timeout:
+            item["timeouts"] += 1
+        item["total_wait_ms"] += cost * 1000
+        item["max_wait_ms"] = max(item["max_wait_ms"], cost * 1000)
+
+
+def get_pool_stats():
+    """
+    查询各连接池获取连接的次数和等待时间
+    """
+    with _stats_lock:
+        stats = {name: dict(item) for name, item in _pool_stats.items()}
+    for item in stats.values():
+        item["avg_wait_ms"] = round(item["total_wait_ms"] / item["checkouts"], 3) if item["checkouts"] else 0
+        item["total_wait_ms"] = round(item["total_wait_ms"], 3)
+        item["max_wait_ms"] = round(item["max_wait_ms"], 3)
+    return stats
+
+
+def create_sqlite_engine(db_path, name, readonly=False):
+    """
+    创建SQLite引擎，连接时设置WAL等参数
+    :param db_path: 数据库文件路径
+    :param name: 连接池名称，用于统计
+    :param readonly: 是否只读连接池
+    """
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        echo=False,
+        poolclass=TimedQueuePool,
+        pool_size=READER_POOL_SIZE if readonly else WRITER_POOL_SIZE,
+        max_overflow=READER_MAX_OVERFLOW if readonly else WRITER_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=60 * 10,
+        connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    engine.pool._stats_name = f"{name}.{'reader' if readonly else 'writer'}"
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            if readonly:
+                cursor.execute("PRAGMA query_only=1")
+        finally:
+            cursor.close()
+
+    return engine
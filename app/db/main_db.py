@@ -1,11 +1,16 @@
 import os
 import threading
+import time
 
-from sqlalchemy import create_engine, text
+from contextlib import contextmanager
+
+from sqlalchemy import text, case, func, literal_column, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
 
+from app.db.engine import create_sqlite_engine, ReleasingQuery
 from app.db.models import Base
+from app.db.query_plan import check_query_plans
 from app.utils import PathUtils
 
 from config import Config
@@ -13,19 +18,23 @@ from config import Config
 import log
 
 lock = threading.Lock()
-_Engine = create_engine(
-    f"sqlite:///{os.path.join(Config().get_config_path(), 'user.db')}?check_same_thread=False",
-    echo=False,
-    poolclass=QueuePool,
-    pool_pre_ping=True,
-    pool_size=100,
-    pool_recycle=60 * 10,
-    max_overflow=0
-)
+# 当前线程的事务嵌套层数，大于0时由最外层统一提交
+_local = threading.local()
+# 提交次数及耗时统计
+_stats_lock = threading.Lock()
+_commit_stats = {}
+_db_path = os.path.join(Config().get_config_path(), 'user.db')
+_Engine = create_sqlite_engine(_db_path, name="main")
 _Session = scoped_session(sessionmaker(bind=_Engine,
                                        autoflush=True,
                                        autocommit=False,
-                                       expire_on_commit=False))
+                                       expire_on_commit=False,
+                                       query_cls=ReleasingQuery))
+# 只读连接，页面查询不排在写事务后面
+_ReaderEngine = create_sqlite_engine(_db_path, name="main", readonly=True)
+_ReadSession = sessionmaker(bind=_ReaderEngine,
+                            autoflush=False,
+                            expire_on_commit=False)
 
 
 class MainDb:
@@ -37,7 +46,45 @@ class MainDb:
     def init_db(self):
         with lock:
             Base.metadata.create_all(_Engine)
+            self.ensure_indexes()
             self.init_db_version()
+        self.check_query_plans()
+
+    @staticmethod
+    def ensure_indexes():
+        """
+        补建模型中定义但数据库中缺失的索引，create_all只会为新建的表创建索引，已有的表需单独检查
+        """
+        with _Engine.connect() as conn:
+            for table in Base.metadata.sorted_tables:
+                exists = {row[1] for row in conn.exec_driver_sql(f'PRAGMA index_list("{table.name}")')}
+                for index in table.indexes:
+                    if index.name in exists:
+                        continue
+                    try:
+                        index.create(conn)
+                        conn.commit()
+                        log.info(f"【Db】已创建索引 {index.name}")
+                    except Exception as err:
+                        conn.rollback()
+                        log.warn(f"【Db】创建索引 {index.name} 失败：{str(err)}")
+
+    @staticmethod
+    def check_query_plans():
+        """
+        检查高频查询是否都使用了索引，存在全表扫描时输出告警
+        """
+        session = _ReadSession()
+        try:
+            failed = check_query_plans(session)
+            if not failed:
+                log.debug("【Db】高频查询均已使用索引")
+            return failed
+        except Exception as err:
+            log.warn(f"【Db】检查查询计划失败：{str(err)}")
+            return None
+        finally:
+            session.close()
 
     def init_db_version(self):
         """
@@ -87,6 +134,18 @@ class MainDb:
         查询对象
         """
         return self.session.query(*obj)
+
+    @contextmanager
+    def read_session(self):
+        """
+        只读会话，使用独立的只读连接池，用完立即归还连接
+        查询结果在会话关闭后仍可读取，但不能用于修改
+        """
+        session = _ReadSession()
+        try:
+            yield session
+        finally:
+            session.close()
     
     def execute_sql_script(self, sql: str):
         session = self.session  # scoped_session 返回当前线程的 Session
@@ -111,11 +170,96 @@ class MainDb:
         """
         self.session.flush()
 
-    def commit(self):
+    def bulk_insert(self, model, rows: list):
+        """
+        批量插入，使用executemany一次写入
+        :param model: 表模型
+        :param rows: 字段字典列表
+        """
+        if not rows:
+            return
+        self.session.execute(sqlite_insert(model), rows)
+
+    def bulk_upsert(self, model, rows: list, index_elements: list,
+                    update_columns: list = None, keep_empty: list = None, keep_null: list = None):
+        """
+        批量插入或更新，使用 INSERT ... ON CONFLICT 一次写入，冲突字段上需要有唯一索引
+        :param model: 表模型
+        :param rows: 字段字典列表
+        :param index_elements: 冲突判断字段
+        :param update_columns: 冲突时直接覆盖的字段，均为空时冲突记录不更新
+        :param keep_empty: 冲突时新值为空（None/0/空字符串）则保留原值的字段
+        :param keep_null: 冲突时新值为None则保留原值的字段
+        """
+        if not rows:
+            return
+        stmt = sqlite_insert(model)
+        set_ = {}
+        for column in update_columns or []:
+            set_[column] = stmt.excluded[column]
+        for column in keep_empty or []:
+            new_value = stmt.excluded[column]
+            is_empty = or_(new_value.is_(None), new_value == literal_column("0"), new_value == literal_column("''"))
+            set_[column] = case((is_empty, getattr(model, column)), else_=new_value)
+        for column in keep_null or []:
+            set_[column] = func.coalesce(stmt.excluded[column], getattr(model, column))
+        if set_:
+            stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+        self.session.execute(stmt, rows)
+
+    @staticmethod
+    def in_unit_of_work():
+        """
+        当前线程是否处于统一提交的事务中
+        """
+        return getattr(_local, "depth", 0) > 0
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        将多次数据库操作合并为一个事务，由最外层统一提交，出错时整体回滚
+        期间DbPersist装饰的方法只刷写不提交
+        """
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        try:
+            yield self
+            if depth == 0:
+                self.commit(caller="unit_of_work")
+        except Exception:
+            if depth == 0:
+                self.rollback()
+            raise
+        finally:
+            _local.depth = depth
+
+    def commit(self, caller=None):
         """
         提交事务
         """
-        self.session.commit()
+        start = time.perf_counter()
+        try:
+            self.session.commit()
+        finally:
+            record_commit(caller or "commit", time.perf_counter() - start)
+
+    @staticmethod
+    def get_commit_stats():
+        """
+        查询各调用方的提交次数和耗时
+        """
+        with _stats_lock:
+            stats = {name: dict(item) for name, item in _commit_stats.items()}
+        for item in stats.values():
+            item["avg_ms"] = round(item["total_ms"] / item["commits"], 2) if item["commits"] else 0
+            item["total_ms"] = round(item["total_ms"], 2)
+            item["max_ms"] = round(item["max_ms"], 2)
+        return {
+            "commits": sum(item["commits"] for item in stats.values()),
+            "callers": stats
+        }
 
     def rollback(self):
         """
@@ -124,22 +268,42 @@ class MainDb:
         self.session.rollback()
 
 
+def record_commit(caller, cost):
+    """
+    记录一次提交耗时
+    """
+    with _stats_lock:
+        item = _commit_stats.setdefault(caller, {"commits": 0, "total_ms": 0.0, "max_ms": 0.0})
+        item["commits"] += 1
+        item["total_ms"] += cost * 1000
+        item["max_ms"] = max(item["max_ms"], cost * 1000)
+
+
 class DbPersist(object):
     """
     数据库持久化装饰器
+    处于unit_of_work中时只刷写，由unit_of_work统一提交，出错时抛出异常使整个事务回滚
     """
 
     def __init__(self, db):
         self.db = db
 
     def __call__(self, f):
+        caller = f.__qualname__
+
         def persist(*args, **kwargs):
+            in_unit = self.db.in_unit_of_work()
             try:
                 ret = f(*args, **kwargs)
-                self.db.commit()
+                if in_unit:
+                    self.db.flush()
+                else:
+                    self.db.commit(caller=caller)
                 return True if ret is None else ret
             except Exception as e:
                 log.critical('[DB]数据库持久化出错: ')
+                if in_unit:
+                    raise
                 self.db.rollback()
                 return False
 
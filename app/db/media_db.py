@@ -3,29 +3,45 @@ import os
 import threading
 import time
 
-from cachetools import cached, TTLCache
-from sqlalchemy import create_engine
+from sqlalchemy import insert, func
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
 
+from app.db.engine import create_sqlite_engine
+from app.db.media_index import MediaIndex
 from app.db.models import BaseMedia, MEDIASYNCITEMS, MEDIASYNCSTATISTIC
 from config import Config
 
 import log
 
 lock = threading.Lock()
-_Engine = create_engine(
-    f"sqlite:///{os.path.join(Config().get_config_path(), 'media.db')}?check_same_thread=False",
-    echo=False,
-    poolclass=QueuePool,
-    pool_pre_ping=True,
-    pool_size=100,
-    pool_recycle=60 * 10,
-    max_overflow=0
-)
+_db_path = os.path.join(Config().get_config_path(), 'media.db')
+_Engine = create_sqlite_engine(_db_path, name="media")
 _Session = scoped_session(sessionmaker(bind=_Engine,
                                        autoflush=True,
                                        autocommit=False))
+# 只读连接，查询不排在同步写入事务后面
+_ReaderEngine = create_sqlite_engine(_db_path, name="media", readonly=True)
+_ReadSession = sessionmaker(bind=_ReaderEngine,
+                            autoflush=False,
+                            expire_on_commit=False)
+
+
+def _load_index_rows(server_type):
+    """
+    加载内存索引所需的字段
+    """
+    with _ReadSession() as session:
+        return session.query(MEDIASYNCITEMS.ID,
+                             MEDIASYNCITEMS.ITEM_ID,
+                             MEDIASYNCITEMS.ITEM_TYPE,
+                             MEDIASYNCITEMS.TITLE,
+                             MEDIASYNCITEMS.YEAR,
+                             MEDIASYNCITEMS.TMDBID,
+                             MEDIASYNCITEMS.JSON).filter(MEDIASYNCITEMS.SERVER == server_type).all()
+
+
+# 同步数据的内存索引，所有MediaDb实例共用
+_Index = MediaIndex(_load_index_rows)
 
 
 class MediaDb:
@@ -46,26 +62,118 @@ class MediaDb:
             self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
                                                       MEDIASYNCITEMS.ITEM_ID == iteminfo.get("id")).delete()
             self.session.flush()
-            self.session.add(MEDIASYNCITEMS(
-                SERVER=server_type,
-                LIBRARY=iteminfo.get("library"),
-                ITEM_ID=iteminfo.get("id"),
-                ITEM_TYPE=iteminfo.get("type"),
-                TITLE=iteminfo.get("title"),
-                ORGIN_TITLE=iteminfo.get("originalTitle"),
-                YEAR=iteminfo.get("year"),
-                TMDBID=iteminfo.get("tmdbid"),
-                IMDBID=iteminfo.get("imdbid"),
-                PATH=iteminfo.get("path"),
-                JSON=json.dumps(seasoninfo)
-            ))
+            self.session.add(MEDIASYNCITEMS(**self.__to_row(server_type, iteminfo, seasoninfo)))
             self.session.commit()
+            _Index.update(server_type, [self.__to_index_row(iteminfo, seasoninfo)])
             return True
         except Exception as e:
             log.exception("[Db]insert MEDIASYNC_ITEMS error:")
             self.session.rollback()
         return False
 
+    @staticmethod
+    def __to_row(server_type, iteminfo, seasoninfo):
+        return {
+            "SERVER": server_type,
+            "LIBRARY": iteminfo.get("library"),
+            "ITEM_ID": iteminfo.get("id"),
+            "ITEM_TYPE": iteminfo.get("type"),
+            "TITLE": iteminfo.get("title"),
+            "ORGIN_TITLE": iteminfo.get("originalTitle"),
+            "YEAR": iteminfo.get("year"),
+            "TMDBID": iteminfo.get("tmdbid"),
+            "IMDBID": iteminfo.get("imdbid"),
+            "PATH": iteminfo.get("path"),
+            "JSON": json.dumps(seasoninfo)
+        }
+
+    @staticmethod
+    def __to_index_row(iteminfo, seasoninfo):
+        return (None, iteminfo.get("id"), iteminfo.get("type"), iteminfo.get("title"),
+                iteminfo.get("year"), iteminfo.get("tmdbid"), seasoninfo)
+
+    def insert_batch(self, server_type, items):
+        """
+        批量插入，一个事务内完成
+        :param server_type: 媒体服务器类型
+        :param items: [(iteminfo, seasoninfo)]
+        """
+        if not server_type or not items:
+            return False
+        try:
+            self.session.execute(insert(MEDIASYNCITEMS),
+                                 [self.__to_row(server_type, iteminfo, seasoninfo)
+                                  for iteminfo, seasoninfo in items if iteminfo])
+            self.session.commit()
+            return True
+        except Exception as e:
+            log.exception("[Db]insert_batch MEDIASYNC_ITEMS error:")
+            self.session.rollback()
+        return False
+
+    def upsert_batch(self, server_type, items):
+        """
+        批量插入或更新，按项目ID替换已有数据，一个事务内完成
+        :param server_type: 媒体服务器类型
+        :param items: [(iteminfo, seasoninfo)]
+        """
+        if not server_type or not items:
+            return False
+        rows = [self.__to_row(server_type, iteminfo, seasoninfo)
+                for iteminfo, seasoninfo in items if iteminfo and iteminfo.get("id")]
+        if not rows:
+            return False
+        try:
+            self.session.query(MEDIASYNCITEMS).filter(
+                MEDIASYNCITEMS.SERVER == server_type,
+                MEDIASYNCITEMS.ITEM_ID.in_([row.get("ITEM_ID") for row in rows])).delete(synchronize_session=False)
+            self.session.execute(insert(MEDIASYNCITEMS), rows)
+            self.session.commit()
+            _Index.update(server_type, [self.__to_index_row(iteminfo, seasoninfo)
+                                        for iteminfo, seasoninfo in items if iteminfo and iteminfo.get("id")])
+            return True
+        except Exception as e:
+            log.exception("[Db]upsert_batch MEDIASYNC_ITEMS error:")
+            self.session.rollback()
+        return False
+
+    def delete_items(self, server_type, item_ids):
+        """
+        按项目ID删除
+        """
+        if not server_type or not item_ids:
+            return False
+        try:
+            item_ids = list(item_ids)
+            # 分批删除，避免超过SQLite参数数量限制
+            for i in range(0, len(item_ids), 500):
+                self.session.query(MEDIASYNCITEMS).filter(
+                    MEDIASYNCITEMS.SERVER == server_type,
+                    MEDIASYNCITEMS.ITEM_ID.in_(item_ids[i:i + 500])).delete(synchronize_session=False)
+            self.session.commit()
+            _Index.remove(server_type, item_ids)
+            return True
+        except Exception as e:
+            log.exception("[Db]delete_items MEDIASYNC_ITEMS error:")
+            self.session.rollback()
+        return False
+
+    def swap(self, server_type, staging_server_type):
+        """
+        用暂存的同步数据替换当前数据，一个事务内完成，替换前查询到的均为旧数据
+        """
+        try:
+            self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type).delete()
+            self.session.query(MEDIASYNCITEMS).filter(
+                MEDIASYNCITEMS.SERVER == staging_server_type).update({MEDIASYNCITEMS.SERVER: server_type})
+            self.session.commit()
+            _Index.invalidate(server_type)
+            return True
+        except Exception as e:
+            log.exception("[Db]swap MEDIASYNC_ITEMS error:")
+            self.session.rollback()
+        return False
+
     def empty(self, server_type=None, library=None):
         try:
             if server_type and library:
@@ -76,6 +184,7 @@ class MediaDb:
             else:
                 self.session.query(MEDIASYNCITEMS).delete()
             self.session.commit()
+            _Index.invalidate(server_type)
             return True
         except Exception as e:
             log.exception("[Db]empty MEDIASYNC_ITEMS error:")
@@ -103,30 +212,57 @@ class MediaDb:
             self.session.rollback()
         return False
 
-    @cached(cache=TTLCache(maxsize=128, ttl=60))
-    def query(self, server_type, title, year, tmdbid):
-        if not server_type or not title:
-            return {}
+    @staticmethod
+    def read_session():
+        """
+        只读会话，用完需关闭以归还连接
+        """
+        return _ReadSession()
+
+    @staticmethod
+    def query(server_type, title, year, tmdbid):
+        """
+        查找已同步的电影或剧集，先按TMDBID，再按标题+年份，使用内存索引不查询数据库
+        :return: MediaIndexItem，未找到时返回None
+        """
+        return _Index.query(server_type=server_type, title=title, year=year, tmdbid=tmdbid)
 
-        if tmdbid:
-            item = self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
-                                                             MEDIASYNCITEMS.TMDBID == tmdbid).first()
-            if item:
-                return item
-
-        if year:
-            item = self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
-                                                             MEDIASYNCITEMS.TITLE == title,
-                                                             MEDIASYNCITEMS.YEAR == year).first()
-        else:
-            item = self.session.query(MEDIASYNCITEMS).filter(MEDIASYNCITEMS.SERVER == server_type,
-                                                             MEDIASYNCITEMS.TITLE == title).first()
-        if item:
-            if tmdbid and (not item.TMDBID or item.TMDBID != str(tmdbid)):
-                return {}
-        return item
+    @staticmethod
+    def query_batch(server_type, medias):
+        """
+        批量查找已同步的电影或剧集
+        :param medias: [(标题, 年份, TMDBID)]
+        :return: 与输入顺序一致的列表，未找到的为None
+        """
+        return _Index.query_batch(server_type=server_type, medias=medias)
+
+    def get_item_ids(self, server_type, libraries=None):
+        """
+        查询已同步的项目ID
+        :param libraries: 媒体库ID列表，为空时查询全部
+        """
+        if not server_type:
+            return set()
+        with self.read_session() as session:
+            query = session.query(MEDIASYNCITEMS.ITEM_ID).filter(MEDIASYNCITEMS.SERVER == server_type)
+            if libraries:
+                query = query.filter(MEDIASYNCITEMS.LIBRARY.in_(libraries))
+            return {row[0] for row in query.all()}
+
+    def count_items(self, server_type):
+        """
+        按类型统计已同步的项目数
+        :return: {类型: 数量}
+        """
+        if not server_type:
+            return {}
+        with self.read_session() as session:
+            rows = session.query(MEDIASYNCITEMS.ITEM_TYPE, func.count(MEDIASYNCITEMS.ID)).filter(
+                MEDIASYNCITEMS.SERVER == server_type).group_by(MEDIASYNCITEMS.ITEM_TYPE).all()
+            return {item_type: count for item_type, count in rows}
 
     def get_statistics(self, server_type):
         if not server_type:
             return None
-        return self.session.query(MEDIASYNCSTATISTIC).filter(MEDIASYNCSTATISTIC.SERVER == server_type).first()
+        with self.read_session() as session:
+            return session.query(MEDIASYNCSTATISTIC).filter(MEDIASYNCSTATISTIC.SERVER == server_type).first()
@@ -0,0 +1,202 @@
+import json
+import threading
+
+
+class MediaIndexItem(object):
+    """
+    媒体库索引中的单个电影或剧集，字段名与MEDIASYNC_ITEMS保持一致
+    """
+    __slots__ = ("ID", "ITEM_ID", "ITEM_TYPE", "TITLE", "YEAR", "TMDBID", "seasons")
+
+    def __init__(self, row_id, item_id, item_type, title, year, tmdbid, seasoninfo):
+        self.ID = row_id
+        self.ITEM_ID = item_id
+        self.ITEM_TYPE = item_type
+        self.TITLE = title
+        self.YEAR = MediaIndex.normalize(year)
+        self.TMDBID = MediaIndex.normalize(tmdbid)
+        # 季号 -> 集号位图
+        self.seasons = {}
+        for info in seasoninfo or []:
+            season_num = info.get("season_num")
+            episode_num = info.get("episode_num")
+            if season_num is None:
+                continue
+            bits = self.seasons.get(int(season_num)) or 0
+            if episode_num is not None and int(episode_num) >= 0:
+                bits |= 1 << int(episode_num)
+            self.seasons[int(season_num)] = bits
+
+    def has_episode(self, season, episode=None):
+        """
+        是否存在某季或某集
+        """
+        bits = self.seasons.get(int(season))
+        if bits is None:
+            return False
+        if not episode:
+            return True
+        return bool(bits >> int(episode) & 1)
+
+
+class _ServerIndex(object):
+    """
+    单个媒体服务器的索引
+    """
+
+    def __init__(self):
+        # ITEM_ID -> MediaIndexItem
+        self.items = {}
+        # TMDBID -> [MediaIndexItem]，按写入顺序排列
+        self.by_tmdbid = {}
+        # (标题, 年份) -> [MediaIndexItem]
+        self.by_title_year = {}
+        # 标题 -> [MediaIndexItem]
+        self.by_title = {}
+
+    def add(self, item: MediaIndexItem):
+        self.remove(item.ITEM_ID)
+        self.items[item.ITEM_ID] = item
+        if item.TMDBID:
+            self.by_tmdbid.setdefault(item.TMDBID, []).append(item)
+        if item.TITLE:
+            self.by_title_year.setdefault((item.TITLE, item.YEAR), []).append(item)
+            self.by_title.setdefault(item.TITLE, []).append(item)
+
+    def remove(self, item_id):
+        item = self.items.pop(item_id, None)
+        if not item:
+            return
+        self.__discard(self.by_tmdbid, item.TMDBID, item)
+        self.__discard(self.by_title_year, (item.TITLE, item.YEAR), item)
+        self.__discard(self.by_title, item.TITLE, item)
+
+    @staticmethod
+    def __discard(index, key, item):
+        items = index.get(key)
+        if not items:
+            return
+        try:
+            items.remove(item)
+        except ValueError:
+            pass
+        if not items:
+            index.pop(key, None)
+
+
+class MediaIndex(object):
+    """
+    媒体库同步数据的内存索引
+    按 TMDBID、标题+年份 查找项目，季集信息转为位图，存在性判断无需查询数据库及解析JSON；
+    首次查询时从数据库加载，同步写入后增量更新或整体失效
+    """
+
+    def __init__(self, loader):
+        """
+        :param loader: 加载函数，参数为服务器类型，返回 [(ID, ITEM_ID, ITEM_TYPE, TITLE, YEAR, TMDBID, JSON)]
+        """
+        self._lock = threading.Lock()
+        self._loader = loader
+        self._indexes = {}
+
+    @staticmethod
+    def normalize(value):
+        """
+        统一为字符串，与数据库中Text字段的比较方式一致
+        """
+        if value is None or value == "":
+            return None
+        return str(value)
+
+    @staticmethod
+    def __to_item(row):
+        row_id, item_id, item_type, title, year, tmdbid, seasoninfo = row
+        if isinstance(seasoninfo, str):
+            try:
+                seasoninfo = json.loads(seasoninfo or "[]")
+            except ValueError:
+                seasoninfo = []
+        return MediaIndexItem(row_id, item_id, item_type, title, year, tmdbid, seasoninfo)
+
+    def __get_index(self, server_type):
+        with self._lock:
+            index = self._indexes.get(server_type)
+            if index is not None:
+                return index
+            index = _ServerIndex()
+            for row in sorted(self._loader(server_type), key=lambda x: x[0] or 0):
+                index.add(self.__to_item(row))
+            self._indexes[server_type] = index
+            return index
+
+    def invalidate(self, server_type=None):
+        """
+        清除索引，下次查询时重新加载
+        """
+        with self._lock:
+            if server_type:
+                self._indexes.pop(server_type, None)
+            else:
+                self._indexes.clear()
+
+    def update(self, server_type, rows):
+        """
+        写入或替换项目，索引未加载时忽略
+        """
+        with self._lock:
+            index = self._indexes.get(server_type)
+            if index is None:
+                return
+            for row in rows:
+                index.add(self.__to_item(row))
+
+    def remove(self, server_type, item_ids):
+        """
+        删除项目，索引未加载时忽略
+        """
+        with self._lock:
+            index = self._indexes.get(server_type)
+            if index is None:
+                return
+            for item_id in item_ids:
+                index.remove(item_id)
+
+    def query(self, server_type, title, year, tmdbid):
+        """
+        查找项目，与按数据库查询的顺序一致：先按TMDBID，再按标题+年份
+        :return: MediaIndexItem，未找到时返回None
+        """
+        if not server_type or not title:
+            return None
+        index = self.__get_index(server_type)
+        tmdbid = self.normalize(tmdbid)
+        year = self.normalize(year)
+        if tmdbid:
+            items = index.by_tmdbid.get(tmdbid)
+            if items:
+                return items[0]
+        if year:
+            items = index.by_title_year.get((title, year))
+        else:
+            items = index.by_title.get(title)
+        if not items:
+            return None
+        item = items[0]
+        if tmdbid and item.TMDBID != tmdbid:
+            return None
+        return item
+
+    def query_batch(self, server_type, medias):
+        """
+        批量查找项目
+        :param medias: [(标题, 年份, TMDBID)]
+        :return: 与输入顺序一致的 MediaIndexItem 列表，未找到的为None
+        """
+        return [self.query(server_type, title, year, tmdbid) for title, year, tmdbid in medias]
+
+    def stats(self):
+        """
+        索引统计
+        """
+        with self._lock:
+            return {server_type: len(index.items) for server_type, index in self._indexes.items()}
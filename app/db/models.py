@@ -163,6 +163,9 @@ class DOWNLOADER(Base):
 
 class DOWNLOADHISTORY(Base):
     __tablename__ = 'DOWNLOAD_HISTORY'
+    __table_args__ = (
+        Index('INDX_DOWNLOAD_HISTORY_DOWNLOADER', 'DOWNLOADER', 'DOWNLOAD_ID'),
+    )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
     TITLE = Column(Text, index=True)
@@ -273,7 +276,7 @@ class RSSTORRENTS(Base):
     )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
-    TORRENT_NAME = Column(Text)
+    TORRENT_NAME = Column(Text, index=True)
     ENCLOSURE = Column(Text, index=True)
     TYPE = Column(Text)
     TITLE = Column(Text)
@@ -400,6 +403,9 @@ class SITEBRUSHTASK(Base):
 
 class SITEBRUSHTORRENTS(Base):
     __tablename__ = 'SITE_BRUSH_TORRENTS'
+    __table_args__ = (
+        Index('INDX_SITE_BRUSH_TORRENTS_TASK', 'TASK_ID', 'DOWNLOAD_ID'),
+    )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
     TASK_ID = Column(Text, index=True)
@@ -508,6 +514,11 @@ class TRANSFERBLACKLIST(Base):
 
 class TRANSFERHISTORY(Base):
     __tablename__ = 'TRANSFER_HISTORY'
+    __table_args__ = (
+        Index('INDX_TRANSFER_HISTORY_SOURCE', 'SOURCE_PATH', 'SOURCE_FILENAME'),
+        Index('INDX_TRANSFER_HISTORY_DEST', 'DEST_PATH', 'DEST_FILENAME'),
+        Index('INDX_TRANSFER_HISTORY_TMDBID', 'TMDBID', 'SEASON_EPISODE'),
+    )
 
     ID = Column(Integer, Sequence('ID'), primary_key=True)
     MODE = Column(Text)
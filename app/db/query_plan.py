@@ -0,0 +1,75 @@
+import re
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import Query
+
+from app.db.models import DOWNLOADHISTORY, RSSTORRENTS, SITEBRUSHTORRENTS, TRANSFERHISTORY, TRANSFERUNKNOWN
+
+import log
+
+# 全表扫描，SQLite 3.36 之后输出 SCAN 表名，之前为 SCAN TABLE 表名；带 USING ... 的为按索引扫描
+_FULL_SCAN_RE = re.compile(r"^SCAN (TABLE )?(\w+)\b(?!.* USING )")
+
+
+def hot_queries(session):
+    """
+    DbHelper中的高频查询，参数仅用于生成执行计划
+    """
+    return {
+        "transfer_history.source": session.query(TRANSFERHISTORY).filter(
+            TRANSFERHISTORY.SOURCE_PATH == "/path", TRANSFERHISTORY.SOURCE_FILENAME == "file"),
+        "transfer_history.dest": session.query(TRANSFERHISTORY).filter(
+            TRANSFERHISTORY.DEST_PATH == "/path", TRANSFERHISTORY.DEST_FILENAME == "file"),
+        "transfer_history.tmdbid": session.query(TRANSFERHISTORY).filter(
+            TRANSFERHISTORY.TMDBID == 1, TRANSFERHISTORY.SEASON_EPISODE == "S01 E01"),
+        "transfer_unknown.path": session.query(TRANSFERUNKNOWN).filter(TRANSFERUNKNOWN.PATH == "/path"),
+        "download_history.enclosure": session.query(DOWNLOADHISTORY).filter(
+            DOWNLOADHISTORY.ENCLOSURE == "enclosure"),
+        "download_history.download_id": session.query(DOWNLOADHISTORY).filter(
+            DOWNLOADHISTORY.DOWNLOADER == "downloader", DOWNLOADHISTORY.DOWNLOAD_ID == "id"),
+        "site_brush_torrents.enclosure": session.query(SITEBRUSHTORRENTS).filter(
+            SITEBRUSHTORRENTS.ENCLOSURE == "enclosure"),
+        "site_brush_torrents.download_id": session.query(SITEBRUSHTORRENTS).filter(
+            SITEBRUSHTORRENTS.TASK_ID == "1", SITEBRUSHTORRENTS.DOWNLOAD_ID == "id"),
+        "rss_torrents.enclosure": session.query(RSSTORRENTS).filter(RSSTORRENTS.ENCLOSURE == "enclosure"),
+        "rss_torrents.torrent_name": session.query(RSSTORRENTS).filter(RSSTORRENTS.TORRENT_NAME == "name"),
+    }
+
+
+def explain(session, query: Query):
+    """
+    获取查询的执行计划
+    :return: 执行计划明细列表
+    """
+    sql = str(query.statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+def get_full_scans(session, query: Query):
+    """
+    返回查询中全表扫描的表名，为空表示都使用了索引
+    """
+    scans = []
+    for detail in explain(session, query):
+        match = _FULL_SCAN_RE.match(detail)
+        if match:
+            scans.append(match.group(2))
+    return scans
+
+
+def check_query_plans(session, queries: dict = None):
+    """
+    检查查询是否都使用了索引
+    :param session: 数据库会话
+    :param queries: 名称->查询，为空时检查内置的高频查询
+    :return: 存在全表扫描的查询 {名称: [表名]}
+    """
+    if queries is None:
+        queries = hot_queries(session)
+    failed = {}
+    for name, query in queries.items():
+        scans = get_full_scans(session, query)
+        if scans:
+            failed[name] = scans
+            log.warn(f"【Db】查询 {name} 未使用索引，全表扫描：{', '.join(scans)}")
+    return failed
@@ -0,0 +1,204 @@
+import threading
+import time
+
+import qbittorrentapi
+
+# 缓存最长有效时间（秒），超过后查询前先同步增量
+QB_SYNC_MAX_AGE = 5
+
+# qBittorrent 状态筛选与种子状态的对应关系，与 WebUI 的 filter 参数保持一致
+QB_STATE_FILTERS = {
+    "downloading": {"downloading", "metaDL", "forcedMetaDL", "stalledDL", "checkingDL",
+                    "pausedDL", "stoppedDL", "queuedDL", "forcedDL"},
+    "seeding": {"uploading", "stalledUP", "checkingUP", "queuedUP", "forcedUP"},
+    "completed": {"uploading", "stalledUP", "checkingUP", "queuedUP", "forcedUP",
+                  "pausedUP", "stoppedUP"},
+    "paused": {"pausedDL", "pausedUP", "stoppedDL", "stoppedUP"},
+    "stopped": {"pausedDL", "pausedUP", "stoppedDL", "stoppedUP"},
+    "stalled": {"stalledDL", "stalledUP"},
+    "stalled_uploading": {"stalledUP"},
+    "stalled_downloading": {"stalledDL"},
+    "checking": {"checkingDL", "checkingUP", "checkingResumeData"},
+    "moving": {"moving"},
+    "errored": {"error", "missingFiles"},
+}
+
+
+class QbTorrentCache(object):
+    """
+    qBittorrent 种子状态缓存
+    通过 sync/maindata 的 rid 增量同步种子信息，按 Hash/标签/分类/状态 建立内存索引，
+    同一下载器的所有查询共用一份缓存，超过有效期才向下载器同步一次增量
+    """
+
+    def __init__(self, qbc, max_age=QB_SYNC_MAX_AGE):
+        self._lock = threading.RLock()
+        self._qbc = qbc
+        self._max_age = max_age
+        self._rid = 0
+        self._synced_at = 0
+        # Hash -> 种子原始数据
+        self._raw = {}
+        # Hash -> TorrentDictionary
+        self._torrents = {}
+        self._by_tag = {}
+        self._by_category = {}
+        self._by_state = {}
+        self._full_updates = 0
+        self._delta_updates = 0
+
+    @staticmethod
+    def split_tags(tags):
+        """
+        拆分种子标签字符串
+        """
+        if not tags:
+            return []
+        return [t.strip() for t in str(tags).split(",") if t.strip()]
+
+    def reset(self, qbc=None):
+        """
+        清空缓存，下次查询时全量同步
+        """
+        with self._lock:
+            if qbc is not None:
+                self._qbc = qbc
+            self._rid = 0
+            self._synced_at = 0
+            self._raw = {}
+            self._torrents = {}
+            self._by_tag = {}
+            self._by_category = {}
+            self._by_state = {}
+
+    def invalidate(self):
+        """
+        标记缓存过期，下次查询时同步增量
+        """
+        with self._lock:
+            self._synced_at = 0
+
+    def refresh(self, force=False):
+        """
+        同步下载器的种子变化
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._synced_at < self._max_age:
+                return
+            try:
+                data = self._qbc.sync_maindata(rid=self._rid)
+            except Exception:
+                # 同步出错时下次重新全量同步
+                self.reset()
+                raise
+            if data.get("full_update"):
+                self._full_updates += 1
+                self._raw = {}
+                self._torrents = {}
+                self._by_tag = {}
+                self._by_category = {}
+                self._by_state = {}
+            else:
+                self._delta_updates += 1
+            for torrent_hash in data.get("torrents_removed") or []:
+                self.__remove(torrent_hash)
+            for torrent_hash, delta in (data.get("torrents") or {}).items():
+                self.__merge(torrent_hash, delta)
+            self._rid = data.get("rid") or 0
+            self._synced_at = time.monotonic()
+
+    def __remove(self, torrent_hash):
+        raw = self._raw.pop(torrent_hash, None)
+        self._torrents.pop(torrent_hash, None)
+        if raw:
+            self.__unindex(torrent_hash, raw)
+
+    def __merge(self, torrent_hash, delta):
+        """
+        合并单个种子的增量字段并更新索引
+        """
+        raw = self._raw.get(torrent_hash)
+        if raw:
+            self.__unindex(torrent_hash, raw)
+            raw = dict(raw)
+            raw.update(delta)
+        else:
+            raw = dict(delta)
+        raw["hash"] = torrent_hash
+        self._raw[torrent_hash] = raw
+        # 每次生成新对象，调用方持有的旧对象不会被修改
+        self._torrents[torrent_hash] = qbittorrentapi.TorrentDictionary(data=raw, client=self._qbc)
+        for tag in self.split_tags(raw.get("tags")):
+            self._by_tag.setdefault(tag, set()).add(torrent_hash)
+        self._by_category.setdefault(raw.get("category") or "", set()).add(torrent_hash)
+        self._by_state.setdefault(raw.get("state") or "", set()).add(torrent_hash)
+
+    def __unindex(self, torrent_hash, raw):
+        for tag in self.split_tags(raw.get("tags")):
+            self.__discard(self._by_tag, tag, torrent_hash)
+        self.__discard(self._by_category, raw.get("category") or "", torrent_hash)
+        self.__discard(self._by_state, raw.get("state") or "", torrent_hash)
+
+    @staticmethod
+    def __discard(index, key, torrent_hash):
+        hashes = index.get(key)
+        if hashes is None:
+            return
+        hashes.discard(torrent_hash)
+        if not hashes:
+            index.pop(key, None)
+
+    @staticmethod
+    def support_status(status):
+        """
+        是否支持在缓存中按该状态筛选
+        """
+        return not status or status == "all" or status in QB_STATE_FILTERS
+
+    def query(self, ids=None, status=None, tags=None, category=None):
+        """
+        查询种子
+        :param ids: 种子Hash，字符串或列表
+        :param status: 状态筛选，同 torrents_info 的 status_filter
+        :param tags: 标签列表，需同时包含
+        :param category: 分类
+        :return: TorrentDictionary列表，按添加时间排序
+        """
+        self.refresh()
+        with self._lock:
+            candidates = None
+            if ids:
+                if isinstance(ids, str):
+                    ids = ids.split("|")
+                candidates = {i.lower() for i in ids if i} & self._torrents.keys()
+            for tag in tags or []:
+                if not tag:
+                    continue
+                hashes = self._by_tag.get(tag) or set()
+                candidates = hashes if candidates is None else candidates & hashes
+            if category is not None:
+                hashes = self._by_category.get(category) or set()
+                candidates = hashes if candidates is None else candidates & hashes
+            if status and status != "all":
+                hashes = set()
+                for state in QB_STATE_FILTERS.get(status) or []:
+                    hashes |= self._by_state.get(state) or set()
+                candidates = hashes if candidates is None else candidates & hashes
+            if candidates is None:
+                torrents = list(self._torrents.values())
+            else:
+                torrents = [self._torrents[h] for h in candidates]
+        return sorted(torrents, key=lambda x: x.get("added_on") or 0)
+
+    def stats(self):
+        """
+        缓存统计
+        """
+        with self._lock:
+            return {
+                "torrents": len(self._torrents),
+                "rid": self._rid,
+                "full_updates": self._full_updates,
+                "delta_updates": self._delta_updates,
+                "age": round(time.monotonic() - self._synced_at, 1) if self._synced_at else None
+            }
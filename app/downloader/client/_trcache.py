@@ -0,0 +1,202 @@
+import threading
+import time
+
+from transmission_rpc import Torrent
+
+# 缓存最长有效时间（秒），超过后查询前先同步最近活动的种子
+TR_SYNC_MAX_AGE = 5
+# 全量同步间隔（秒），用于校正增量同步遗漏的变化
+TR_FULL_SYNC_INTERVAL = 600
+# Transmission 的 recently-active 只包含最近60秒内有变化的种子，超过该间隔未同步时需全量同步
+TR_RECENTLY_ACTIVE_WINDOW = 50
+# 添加后基本不会变化的字段，增量同步时不查询
+TR_STATIC_FIELDS = {"name", "totalSize", "addedDate", "trackers", "trackerStats"}
+
+
+class TrTorrentCache(object):
+    """
+    Transmission 种子状态缓存
+    定期通过 torrent-get recently-active 仅查询变化字段同步增量，并按较长间隔全量同步，
+    按 Hash/ID/标签/状态 建立内存索引，同一下载器的所有查询共用一份缓存
+    """
+
+    def __init__(self, trc, arguments, max_age=TR_SYNC_MAX_AGE, full_sync_interval=TR_FULL_SYNC_INTERVAL):
+        self._lock = threading.RLock()
+        self._trc = trc
+        self._arguments = list(dict.fromkeys(arguments))
+        self._delta_arguments = [f for f in self._arguments if f not in TR_STATIC_FIELDS]
+        self._max_age = max_age
+        self._full_sync_interval = full_sync_interval
+        self._synced_at = 0
+        self._full_synced_at = 0
+        self._stale = True
+        # Hash -> Torrent
+        self._torrents = {}
+        # ID -> Hash
+        self._ids = {}
+        self._by_label = {}
+        self._by_status = {}
+        self._full_updates = 0
+        self._delta_updates = 0
+
+    @staticmethod
+    def __status_key(torrent):
+        status = torrent.fields.get("status")
+        if status is None:
+            return ""
+        return getattr(torrent.status, "value", str(torrent.status))
+
+    def invalidate(self):
+        """
+        标记缓存过期，下次查询时同步增量
+        """
+        with self._lock:
+            self._stale = True
+
+    def reset(self):
+        """
+        清空缓存，下次查询时全量同步
+        """
+        with self._lock:
+            self._stale = True
+            self._full_synced_at = 0
+
+    def refresh(self, force=False):
+        """
+        同步下载器的种子变化
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and not self._stale and now - self._synced_at < self._max_age:
+                return
+            try:
+                if now - self._full_synced_at >= self._full_sync_interval \
+                        or now - self._synced_at >= TR_RECENTLY_ACTIVE_WINDOW:
+                    self.__full_sync()
+                else:
+                    self.__delta_sync()
+            except Exception:
+                # 同步出错时下次重新全量同步
+                self.reset()
+                raise
+            self._stale = False
+            self._synced_at = time.monotonic()
+
+    def __full_sync(self):
+        torrents = self._trc.get_torrents(arguments=self._arguments)
+        self._torrents = {}
+        self._ids = {}
+        self._by_label = {}
+        self._by_status = {}
+        for torrent in torrents:
+            self.__merge(torrent.fields)
+        self._full_updates += 1
+        self._full_synced_at = time.monotonic()
+
+    def __delta_sync(self):
+        active, removed = self._trc.get_recently_active_torrents(arguments=self._delta_arguments)
+        for tid in removed or []:
+            self.__remove(self._ids.get(tid))
+        new_ids = []
+        for torrent in active:
+            if torrent.hashString.lower() in self._torrents:
+                self.__merge(torrent.fields)
+            else:
+                new_ids.append(torrent.id)
+        # 新增的种子补查全部字段
+        if new_ids:
+            for torrent in self._trc.get_torrents(ids=new_ids, arguments=self._arguments):
+                self.__merge(torrent.fields)
+        self._delta_updates += 1
+
+    def __merge(self, fields):
+        """
+        合并单个种子的字段并更新索引
+        """
+        torrent_hash = fields.get("hashString").lower()
+        exists = self._torrents.get(torrent_hash)
+        if exists:
+            self.__unindex(torrent_hash, exists)
+            merged = dict(exists.fields)
+            merged.update(fields)
+        else:
+            merged = dict(fields)
+        # 每次生成新对象，调用方持有的旧对象不会被修改
+        torrent = Torrent(fields=merged)
+        self._torrents[torrent_hash] = torrent
+        self._ids[merged.get("id")] = torrent_hash
+        for label in merged.get("labels") or []:
+            self._by_label.setdefault(label, set()).add(torrent_hash)
+        self._by_status.setdefault(self.__status_key(torrent), set()).add(torrent_hash)
+
+    def __remove(self, torrent_hash):
+        if not torrent_hash:
+            return
+        torrent = self._torrents.pop(torrent_hash, None)
+        if torrent:
+            self._ids.pop(torrent.fields.get("id"), None)
+            self.__unindex(torrent_hash, torrent)
+
+    def __unindex(self, torrent_hash, torrent):
+        for label in torrent.fields.get("labels") or []:
+            self.__discard(self._by_label, label, torrent_hash)
+        self.__discard(self._by_status, self.__status_key(torrent), torrent_hash)
+
+    @staticmethod
+    def __discard(index, key, torrent_hash):
+        hashes = index.get(key)
+        if hashes is None:
+            return
+        hashes.discard(torrent_hash)
+        if not hashes:
+            index.pop(key, None)
+
+    def query(self, ids=None, status=None, tags=None):
+        """
+        查询种子
+        :param ids: 种子ID或Hash，单个或列表
+        :param status: 状态列表
+        :param tags: 标签列表，需同时包含
+        :return: Torrent列表，按ID排序
+        """
+        self.refresh()
+        with self._lock:
+            candidates = None
+            if ids:
+                if not isinstance(ids, list):
+                    ids = [ids]
+                candidates = set()
+                for tid in ids:
+                    if isinstance(tid, int):
+                        torrent_hash = self._ids.get(tid)
+                    else:
+                        torrent_hash = str(tid).lower()
+                    if torrent_hash in self._torrents:
+                        candidates.add(torrent_hash)
+            for tag in tags or []:
+                if not tag:
+                    continue
+                hashes = self._by_label.get(tag) or set()
+                candidates = hashes if candidates is None else candidates & hashes
+            if status:
+                hashes = set()
+                for item in status:
+                    hashes |= self._by_status.get(item) or set()
+                candidates = hashes if candidates is None else candidates & hashes
+            if candidates is None:
+                torrents = list(self._torrents.values())
+            else:
+                torrents = [self._torrents[h] for h in candidates]
+        return sorted(torrents, key=lambda x: x.fields.get("id") or 0)
+
+    def stats(self):
+        """
+        缓存统计
+        """
+        with self._lock:
+            return {
+                "torrents": len(self._torrents),
+                "full_updates": self._full_updates,
+                "delta_updates": self._delta_updates,
+                "age": round(time.monotonic() - self._synced_at, 1) if self._synced_at else None
+            }
@@ -12,8 +12,10 @@ import log
 import qbittorrentapi
 
 from app.downloader.client._base import _IDownloadClient
+from app.downloader.client._qbcache import QbTorrentCache, QB_SYNC_MAX_AGE
 from app.utils import StringUtils, SiteUtils
 from app.utils.types import DownloaderType
+from config import Config
 
 
 class Qbittorrent(_IDownloadClient):
@@ -27,6 +29,8 @@ class Qbittorrent(_IDownloadClient):
     # 私有属性
     _client_config = {}
     _torrent_management = False
+    _torrent_cache = None
+    _sync_max_age = QB_SYNC_MAX_AGE
 
     qbc = None
     ver = None
@@ -58,6 +62,10 @@ class Qbittorrent(_IDownloadClient):
             self._torrent_management = self._client_config.get('torrent_management')
             if self._torrent_management not in ["default", "manual", "auto"]:
                 self._torrent_management = "default"
+        # 种子状态缓存有效期，为0时不使用缓存
+        laboratory = Config().get_config('laboratory') or {}
+        sync_max_age = laboratory.get("qbittorrent_sync_max_age")
+        self._sync_max_age = QB_SYNC_MAX_AGE if sync_max_age is None else float(sync_max_age)
 
     @classmethod
     def match(cls, ctype):
@@ -69,6 +77,10 @@ class Qbittorrent(_IDownloadClient):
     def connect(self):
         if self.host and self.port:
             self.qbc = self.__login_qbittorrent()
+        if self.qbc and self._sync_max_age > 0:
+            self._torrent_cache = QbTorrentCache(self.qbc, max_age=self._sync_max_age)
+        else:
+            self._torrent_cache = None
 
     def __login_qbittorrent(self):
         """
@@ -187,20 +199,21 @@ class Qbittorrent(_IDownloadClient):
         """
         if not self.qbc:
             return [], True
+        if tag and not isinstance(tag, list):
+            tag = [tag]
+        if self._torrent_cache and self._torrent_cache.support_status(status):
+            try:
+                return self._torrent_cache.query(ids=ids, status=status, tags=tag), False
+            except Exception as err:
+                log.warn(f"【{self.client_name}】{self.name} 同步种子状态出错，改为直接查询：{str(err)}")
         try:
             torrents = self.qbc.torrents_info(torrent_hashes=ids,
                                               status_filter=status)
             if tag:
                 results = []
-                if not isinstance(tag, list):
-                    tag = [tag]
                 for torrent in torrents:
-                    include_flag = True
-                    for t in tag:
-                        if t and t not in torrent.get("tags"):
-                            include_flag = False
-                            break
-                    if include_flag:
+                    torrent_tags = QbTorrentCache.split_tags(torrent.get("tags"))
+                    if all(t in torrent_tags for t in tag if t):
                         results.append(torrent)
                 return results or [], False
             return torrents or [], False
@@ -208,6 +221,21 @@ class Qbittorrent(_IDownloadClient):
             log.exception(f"【{self.client_name}】{self.name} 获取种子列表出错：")
             return [], True
 
+    def get_cache_stats(self):
+        """
+        种子状态缓存统计
+        """
+        if not self._torrent_cache:
+            return {}
+        return self._torrent_cache.stats()
+
+    def __invalidate_cache(self):
+        """
+        种子发生变化后标记缓存过期，下次查询时同步增量
+        """
+        if self._torrent_cache:
+            self._torrent_cache.invalidate()
+
     def get_completed_torrents(self, ids=None, tag=None):
         """
         获取已完成的种子
@@ -237,7 +265,9 @@ class Qbittorrent(_IDownloadClient):
         :param tag: 标签内容
         """
         try:
-            return self.qbc.torrents_delete_tags(torrent_hashes=ids, tags=tag)
+            ret = self.qbc.torrents_delete_tags(torrent_hashes=ids, tags=tag)
+            self.__invalidate_cache()
+            return ret
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 移除种子tag出错: ")
             return False
@@ -251,6 +281,7 @@ class Qbittorrent(_IDownloadClient):
         try:
             # 打标签
             self.qbc.torrents_add_tags(tags="已整理", torrent_hashes=ids)
+            self.__invalidate_cache()
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 设置种子状态为已整理出错：")
 
@@ -499,6 +530,7 @@ class Qbittorrent(_IDownloadClient):
                                             cookie=cookie)
             success = True if qbc_ret and str(qbc_ret).find("Ok") != -1 else False
             if success:
+                self.__invalidate_cache()
                 torrent_hash = self._get_torrent_hash(content)
                 return True, torrent_hash
             return False, None
@@ -537,7 +569,9 @@ class Qbittorrent(_IDownloadClient):
         if not self.qbc:
             return False
         try:
-            return self.qbc.torrents_resume(torrent_hashes=ids)
+            ret = self.qbc.torrents_resume(torrent_hashes=ids)
+            self.__invalidate_cache()
+            return ret
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 开始下载出错：")
             return False
@@ -546,7 +580,9 @@ class Qbittorrent(_IDownloadClient):
         if not self.qbc:
             return False
         try:
-            return self.qbc.torrents_pause(torrent_hashes=ids)
+            ret = self.qbc.torrents_pause(torrent_hashes=ids)
+            self.__invalidate_cache()
+            return ret
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 停止下载出错：")
             return False
@@ -558,6 +594,7 @@ class Qbittorrent(_IDownloadClient):
             return False
         try:
             self.qbc.torrents_delete(delete_files=delete_file, torrent_hashes=ids)
+            self.__invalidate_cache()
             return True
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 删除种子出错：")
@@ -693,7 +730,9 @@ class Qbittorrent(_IDownloadClient):
         if not self.qbc:
             return False
         try:
-            return self.qbc.torrents_recheck(torrent_hashes=ids)
+            ret = self.qbc.torrents_recheck(torrent_hashes=ids)
+            self.__invalidate_cache()
+            return ret
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 检验种子出错：")
             return False
@@ -11,6 +11,8 @@ import log
 from app.utils import StringUtils
 from app.utils.types import DownloaderType
 from app.downloader.client._base import _IDownloadClient
+from app.downloader.client._trcache import TrTorrentCache, TR_SYNC_MAX_AGE
+from config import Config
 
 
 class Transmission(_IDownloadClient):
@@ -29,6 +31,8 @@ class Transmission(_IDownloadClient):
 
     # 私有属性
     _client_config = {}
+    _torrent_cache = None
+    _sync_max_age = TR_SYNC_MAX_AGE
 
     trc = None
     host = None
@@ -53,6 +57,10 @@ class Transmission(_IDownloadClient):
             self.password = self._client_config.get('password')
             self.download_dir = self._client_config.get('download_dir') or []
             self.name = self._client_config.get('name') or ""
+        # 种子状态缓存有效期，为0时不使用缓存
+        laboratory = Config().get_config('laboratory') or {}
+        sync_max_age = laboratory.get("transmission_sync_max_age")
+        self._sync_max_age = TR_SYNC_MAX_AGE if sync_max_age is None else float(sync_max_age)
 
     @classmethod
     def match(cls, ctype):
@@ -64,6 +72,10 @@ class Transmission(_IDownloadClient):
     def connect(self):
         if self.host and self.port:
             self.trc = self.__login_transmission()
+        if self.trc and self._sync_max_age > 0:
+            self._torrent_cache = TrTorrentCache(self.trc, self._trarg, max_age=self._sync_max_age)
+        else:
+            self._torrent_cache = None
 
     def __login_transmission(self):
         """
@@ -104,12 +116,6 @@ class Transmission(_IDownloadClient):
         if not self.trc:
             return [], True
         ids = self.__parse_ids(ids)
-        try:
-            torrents = self.trc.get_torrents(ids=ids, arguments=self._trarg)
-        except Exception as err:
-            log.exception(f"【{self.client_name}】{self.name} 获取种子列表 出错：")
-            return [], True
-        
         filter_download_pause = False
 
         if status:
@@ -121,6 +127,19 @@ class Transmission(_IDownloadClient):
         if tag and not isinstance(tag, list):
             tag = [tag]
 
+        torrents = None
+        if self._torrent_cache:
+            try:
+                torrents = self._torrent_cache.query(ids=ids, status=status, tags=tag)
+            except Exception as err:
+                log.warn(f"【{self.client_name}】{self.name} 同步种子状态出错，改为直接查询：{str(err)}")
+        if torrents is None:
+            try:
+                torrents = self.trc.get_torrents(ids=ids, arguments=self._trarg)
+            except Exception as err:
+                log.exception(f"【{self.client_name}】{self.name} 获取种子列表 出错：")
+                return [], True
+
         ret_torrents = []
         for torrent in torrents:
             if status and torrent.status not in status:
@@ -139,6 +158,21 @@ class Transmission(_IDownloadClient):
                 ret_torrents.append(torrent)
         return ret_torrents, False
 
+    def get_cache_stats(self):
+        """
+        种子状态缓存统计
+        """
+        if not self._torrent_cache:
+            return {}
+        return self._torrent_cache.stats()
+
+    def __invalidate_cache(self):
+        """
+        种子发生变化后标记缓存过期，下次查询时同步增量
+        """
+        if self._torrent_cache:
+            self._torrent_cache.invalidate()
+
     def get_completed_torrents(self, ids=None, tag=None):
         """
         获取已完成的种子列表
@@ -187,6 +221,7 @@ class Transmission(_IDownloadClient):
         # 打标签
         try:
             self.trc.change_torrent(labels=tags, ids=ids)
+            self.__invalidate_cache()
             log.info(f"【{self.client_name}】{self.name} 设置种子标签成功")
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 设置种子为已整理状态异常：")
@@ -200,6 +235,7 @@ class Transmission(_IDownloadClient):
         ids = self.__parse_ids(tid)
         try:
             self.trc.change_torrent(labels=tag, ids=ids)
+            self.__invalidate_cache()
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 设置种子标签异常：")
 
@@ -266,6 +302,7 @@ class Transmission(_IDownloadClient):
                                     seedRatioLimit=seedRatioLimit,
                                     seedIdleMode=seedIdleMode,
                                     seedIdleLimit=seedIdleLimit)
+            self.__invalidate_cache()
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 设置种子参数异常：")
 
@@ -397,6 +434,7 @@ class Transmission(_IDownloadClient):
                                        paused=is_paused,
                                        labels=tag,
                                        cookies=cookie)
+            self.__invalidate_cache()
             if ret and ret.hashString:
                 if upload_limit:
                     self.set_uploadspeed_limit(ret.hashString, int(upload_limit))
@@ -412,7 +450,9 @@ class Transmission(_IDownloadClient):
             return False
         ids = self.__parse_ids(ids)
         try:
-            return self.trc.start_torrent(ids=ids)
+            ret = self.trc.start_torrent(ids=ids)
+            self.__invalidate_cache()
+            return ret
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 发起下载异常：")
             return False
@@ -422,7 +462,9 @@ class Transmission(_IDownloadClient):
             return False
         ids = self.__parse_ids(ids)
         try:
-            return self.trc.stop_torrent(ids=ids)
+            ret = self.trc.stop_torrent(ids=ids)
+            self.__invalidate_cache()
+            return ret
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 暂停下载 异常：")
             return False
@@ -434,7 +476,9 @@ class Transmission(_IDownloadClient):
             return False
         ids = self.__parse_ids(ids)
         try:
-            return self.trc.remove_torrent(delete_data=delete_file, ids=ids)
+            ret = self.trc.remove_torrent(delete_data=delete_file, ids=ids)
+            self.__invalidate_cache()
+            return ret
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 删除下载 异常：")
             return False
@@ -574,7 +618,9 @@ class Transmission(_IDownloadClient):
             return False
         ids = self.__parse_ids(ids)
         try:
-            return self.trc.verify_torrent(ids=ids)
+            ret = self.trc.verify_torrent(ids=ids)
+            self.__invalidate_cache()
+            return ret
         except Exception as err:
             log.exception(f"【{self.client_name}】{self.name} 验证种子状态 异常：")
             return False
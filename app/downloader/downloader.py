@@ -20,7 +20,7 @@ from app.conf import ModuleConf
 from app.conf import SystemConfig
 from app.modules.filetransfer import FileTransfer
 from app.models.model import UserSiteConf, IndexerInfo
-from app.helper import DbHelper, ThreadHelper, SubmoduleHelper
+from app.helper import DbHelper, ThreadHelper, SubmoduleHelper, TransferExecutor, TransferLimiter
 from app.indexer.client import InterfaceSpider, MTorrentSpider
 from app.indexer.client.browser import PlaywrightHelper
 from app.indexer.manager import IndexerManager
@@ -89,6 +89,7 @@ class Downloader:
     dbhelper = None
     systemconfig = None
     eventmanager = None
+    transfer_executor = None
 
     transfer_job : Optional[Job] = None
 
@@ -115,6 +116,7 @@ class Downloader:
         self.systemconfig = SystemConfig()
         self.eventmanager = EventManager()
         self.sitesubtitle = SiteSubtitle()
+        self.transfer_executor = TransferExecutor()
         # 清空已存在下载器实例
         self.clients = {}
         # 下载器配置, 生成实例
@@ -1051,22 +1053,41 @@ class Downloader:
                 if not trans_tasks:
                     log.debug(f"【Downloader】下载器 {downloader_name} 没有可以进行转移的任务")
                     continue
-                    
-                log.info(f"【Downloader】下载器 {downloader_name} 开始转移下载文件...")
+
+                # 加入转移队列，已在队列中的任务不重复加入
+                new_count = 0
                 for task in trans_tasks:
-                    done_flag, done_msg = self.filetransfer.transfer_media(in_from=self._DownloaderEnum[str(downloader_id)],
-                                                                           in_path=task.get("path"),
-                                                                           rmt_mode=rmt_mode)
-                    if not done_flag:
-                        log.warn(f"【Downloader】下载器 {downloader_name} 任务%s 转移失败: %s" % (task.get("path"), done_msg))
-                        download_client.set_torrents_status(ids=task.get("id"), tags=task.get("tags"))
-                    else:
-                        if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
-                            log.warn(f"【Downloader】下载器 {downloader_name} 移动模式下删除种子文件: %s" % task.get("id"))
-                            download_client.delete_torrents(delete_file=True, ids=task.get("id"))
-                        else:
-                            download_client.set_torrents_status(ids=task.get("id"), tags=task.get("tags"))
-                log.info(f"【Downloader】下载器 {downloader_name} 下载文件转移结束")
+                    if self.transfer_executor.submit((str(downloader_id), task.get("id")),
+                                                     self.__transfer_task,
+                                                     downloader_id=downloader_id,
+                                                     download_client=download_client,
+                                                     downloader_name=downloader_name,
+                                                     rmt_mode=rmt_mode,
+                                                     task=task):
+                        new_count += 1
+                if new_count:
+                    log.info(f"【Downloader】下载器 {downloader_name} 新增 {new_count} 个转移任务，"
+                             f"队列中共 {self.transfer_executor.pending_count()} 个")
+
+    def __transfer_task(self, downloader_id, download_client, downloader_name, rmt_mode, task):
+        """
+        转移单个下载任务，同一源路径同时只有一个任务处理
+        """
+        with TransferLimiter().path_lock(task.get("path")):
+            log.info(f"【Downloader】下载器 {downloader_name} 开始转移：%s" % task.get("path"))
+            done_flag, done_msg = self.filetransfer.transfer_media(in_from=self._DownloaderEnum[str(downloader_id)],
+                                                                   in_path=task.get("path"),
+                                                                   rmt_mode=rmt_mode)
+            if not done_flag:
+                log.warn(f"【Downloader】下载器 {downloader_name} 任务%s 转移失败: %s" % (task.get("path"), done_msg))
+                download_client.set_torrents_status(ids=task.get("id"), tags=task.get("tags"))
+            else:
+                if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
+                    log.warn(f"【Downloader】下载器 {downloader_name} 移动模式下删除种子文件: %s" % task.get("id"))
+                    download_client.delete_torrents(delete_file=True, ids=task.get("id"))
+                else:
+                    download_client.set_torrents_status(ids=task.get("id"), tags=task.get("tags"))
+            log.info(f"【Downloader】下载器 {downloader_name} 转移结束：%s" % task.get("path"))
 
     def get_torrents(self, downloader_id=None, ids=None, tag=None):
         """
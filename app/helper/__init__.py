@@ -11,4 +11,8 @@ from .words_helper import WordsHelper
 from .submodule_helper import SubmoduleHelper
 from .ffmpeg_helper import FfmpegHelper
 from .rss_helper import RssHelper
-from .file_helper import FileHelper
\ No newline at end of file
+from .file_helper import FileHelper
+from .transfer_helper import TransferExecutor, TransferLimiter
+from .library_index import LibraryIndex
+from .snapshot_cache import SnapshotCache
+from .image_cache import ImageCache
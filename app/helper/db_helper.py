@@ -8,6 +8,7 @@ from typing import List
 from sqlalchemy import cast, func, and_
 
 from app.db.models import *
+from app.db.engine import get_pool_stats
 from app.db.main_db import MainDb, DbPersist
 from app.utils import StringUtils
 from app.utils.types import MediaType, RmtMode
@@ -16,10 +17,30 @@ from app.utils.types import MediaType, RmtMode
 class DbHelper:
     _db = MainDb()
 
+    def unit_of_work(self):
+        """
+        将多个方法的数据库操作合并在一个事务中提交
+        """
+        return self._db.unit_of_work()
+
+    @staticmethod
+    def get_commit_stats():
+        """
+        查询数据库提交次数及耗时
+        """
+        return MainDb.get_commit_stats()
+
+    @staticmethod
+    def get_pool_stats():
+        """
+        查询数据库连接池获取连接的等待时间
+        """
+        return get_pool_stats()
+
     @DbPersist(_db)
     def insert_search_results(self, media_items: list, title=None, ident_flag=True):
         """
-        将返回信息插入数据库
+        将返回信息批量插入数据库
         """
         if not media_items:
             return
@@ -32,7 +53,7 @@ class DbHelper:
             else:
                 mtype = "ANI"
             data_list.append(
-                SEARCHRESULTINFO(
+                dict(
                     TORRENT_NAME=media_item.org_string,
                     ENCLOSURE=media_item.enclosure,
                     DESCRIPTION=media_item.description,
@@ -66,7 +87,7 @@ class DbHelper:
                     NOTE=media_item.labels,
                     PUBDATE=media_item.pubdate
                 ))
-        self._db.insert(data_list)
+        self._db.bulk_insert(SEARCHRESULTINFO, data_list)
 
     def get_search_result_by_id(self, dl_id) -> List[SEARCHRESULTINFO]:
         """
@@ -76,9 +97,10 @@ class DbHelper:
 
     def get_search_results(self):
         """
-        查询搜索结果的所有记录
+        查询搜索结果的所有记录，按入库顺序（即优先级顺序）返回
         """
-        return self._db.query(SEARCHRESULTINFO).all()
+        with self._db.read_session() as session:
+            return session.query(SEARCHRESULTINFO).order_by(SEARCHRESULTINFO.ID).all()
     
     @DbPersist(_db)
     def update_search_results_date(self, dl_id, tmdb_id):
@@ -176,22 +198,23 @@ class DbHelper:
         """
         查询识别转移记录
         """
-        if int(page) == 1:
-            begin_pos = 0
-        else:
-            begin_pos = (int(page) - 1) * int(rownum)
-
-        if search:
-            search = f"%{search}%"
-            count = self._db.query(TRANSFERHISTORY).filter((TRANSFERHISTORY.SOURCE_FILENAME.like(search))
-                                                           | (TRANSFERHISTORY.TITLE.like(search))).count()
-            data = self._db.query(TRANSFERHISTORY).filter((TRANSFERHISTORY.SOURCE_FILENAME.like(search))
-                                                          | (TRANSFERHISTORY.TITLE.like(search))).order_by(
-                TRANSFERHISTORY.DATE.desc()).limit(int(rownum)).offset(begin_pos).all()
-            return count, data
-        else:
-            return self._db.query(TRANSFERHISTORY).count(), self._db.query(TRANSFERHISTORY).order_by(
-                TRANSFERHISTORY.DATE.desc()).limit(int(rownum)).offset(begin_pos).all()
+        with self._db.read_session() as session:
+            if int(page) == 1:
+                begin_pos = 0
+            else:
+                begin_pos = (int(page) - 1) * int(rownum)
+
+            if search:
+                search = f"%{search}%"
+                count = session.query(TRANSFERHISTORY).filter((TRANSFERHISTORY.SOURCE_FILENAME.like(search))
+                                                              | (TRANSFERHISTORY.TITLE.like(search))).count()
+                data = session.query(TRANSFERHISTORY).filter((TRANSFERHISTORY.SOURCE_FILENAME.like(search))
+                                                             | (TRANSFERHISTORY.TITLE.like(search))).order_by(
+                    TRANSFERHISTORY.DATE.desc()).limit(int(rownum)).offset(begin_pos).all()
+                return count, data
+            else:
+                return session.query(TRANSFERHISTORY).count(), session.query(TRANSFERHISTORY).order_by(
+                    TRANSFERHISTORY.DATE.desc()).limit(int(rownum)).offset(begin_pos).all()
 
     def get_transfer_info_by_id(self, logid):
         """
@@ -1168,13 +1191,14 @@ class DbHelper:
         """
         查询历史记录统计
         """
-        begin_date = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
-        return self._db.query(TRANSFERHISTORY.TYPE,
-                              func.substr(TRANSFERHISTORY.DATE, 1, 10),
-                              func.count('*')
-                              ).filter(TRANSFERHISTORY.DATE > begin_date).group_by(
-            TRANSFERHISTORY.TYPE, func.substr(TRANSFERHISTORY.DATE, 1, 10)
-        ).order_by(TRANSFERHISTORY.DATE).all()
+        with self._db.read_session() as session:
+            begin_date = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+            return session.query(TRANSFERHISTORY.TYPE,
+                                 func.substr(TRANSFERHISTORY.DATE, 1, 10),
+                                 func.count('*')
+                                 ).filter(TRANSFERHISTORY.DATE > begin_date).group_by(
+                TRANSFERHISTORY.TYPE, func.substr(TRANSFERHISTORY.DATE, 1, 10)
+            ).order_by(TRANSFERHISTORY.DATE).all()
 
     @DbPersist(_db)
     def update_site_user_statistics_site_name(self, new_name, old_name):
@@ -1190,74 +1214,35 @@ class DbHelper:
     @DbPersist(_db)
     def update_site_user_statistics(self, site_user_infos: list):
         """
-        更新站点用户粒度数据
+        更新站点用户粒度数据，按URL批量插入或更新，空值不覆盖已有数据
         """
         if not site_user_infos:
             return
         update_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+        rows = []
         for site_user_info in site_user_infos:
-            site = site_user_info.site_name
-            username = site_user_info.username
-            user_level = site_user_info.user_level
-            join_at = site_user_info.join_at
-            upload = site_user_info.upload
-            download = site_user_info.download
-            ratio = site_user_info.ratio
-            seeding = site_user_info.seeding
-            seeding_size = site_user_info.seeding_size
-            leeching = site_user_info.leeching
-            bonus = site_user_info.bonus
-            url = site_user_info.site_url
-            msg_unread = site_user_info.message_unread
-            if not self.is_exists_site_user_statistics(url):
-                self._db.insert(SITEUSERINFOSTATS(
-                    SITE=site,
-                    USERNAME=username,
-                    USER_LEVEL=user_level,
-                    JOIN_AT=join_at,
-                    UPDATE_AT=update_at,
-                    UPLOAD=upload,
-                    DOWNLOAD=download,
-                    RATIO=ratio,
-                    SEEDING=seeding,
-                    LEECHING=leeching,
-                    SEEDING_SIZE=seeding_size,
-                    BONUS=bonus,
-                    URL=url,
-                    MSG_UNREAD=msg_unread
-                ))
-            else:
-                update_dic = {}
-
-                if username:
-                    update_dic['USERNAME'] = username
-                if user_level:
-                    update_dic['USER_LEVEL'] = user_level
-                if join_at is not None:
-                    update_dic['JOIN_AT'] = join_at
-
-                if upload:
-                    update_dic['UPLOAD'] = upload
-                if download:
-                    update_dic['DOWNLOAD'] = download
-                if ratio:
-                    update_dic['RATIO'] = ratio
-                if seeding:
-                    update_dic['SEEDING'] = seeding
-                if leeching:
-                    update_dic['LEECHING'] = leeching
-                if seeding_size:
-                    update_dic['SEEDING_SIZE'] = seeding_size
-                if bonus:
-                    update_dic['BONUS'] = bonus
-                if msg_unread is not None:
-                    update_dic['MSG_UNREAD'] = msg_unread
-                if not update_dic:
-                    return
-                
-                update_dic['UPDATE_AT'] = update_at
-                
-                self._db.query(SITEUSERINFOSTATS).filter(SITEUSERINFOSTATS.URL == url).update(update_dic)
+            rows.append({
+                "SITE": site_user_info.site_name,
+                "USERNAME": site_user_info.username,
+                "USER_LEVEL": site_user_info.user_level,
+                "JOIN_AT": site_user_info.join_at,
+                "UPDATE_AT": update_at,
+                "UPLOAD": site_user_info.upload,
+                "DOWNLOAD": site_user_info.download,
+                "RATIO": site_user_info.ratio,
+                "SEEDING": site_user_info.seeding,
+                "LEECHING": site_user_info.leeching,
+                "SEEDING_SIZE": site_user_info.seeding_size,
+                "BONUS": site_user_info.bonus,
+                "URL": site_user_info.site_url,
+                "MSG_UNREAD": site_user_info.message_unread
+            })
+        self._db.bulk_upsert(SITEUSERINFOSTATS, rows,
+                             index_elements=["URL"],
+                             update_columns=["UPDATE_AT"],
+                             keep_empty=["USERNAME", "USER_LEVEL", "UPLOAD", "DOWNLOAD", "RATIO",
+                                         "SEEDING", "LEECHING", "SEEDING_SIZE", "BONUS"],
+                             keep_null=["JOIN_AT", "MSG_UNREAD"])
 
     def is_exists_site_user_statistics(self, url):
         """
@@ -1330,27 +1315,20 @@ class DbHelper:
     @DbPersist(_db)
     def update_site_seed_info(self, site_user_infos: list):
         """
-        更新站点做种数据
+        更新站点做种数据，按URL批量插入或更新
         """
         if not site_user_infos:
             return
         update_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
-        for site_user_info in site_user_infos:
-            if not self.is_site_seeding_info_exist(url=site_user_info.site_url):
-                self._db.insert(SITEUSERSEEDINGINFO(
-                    SITE=site_user_info.site_name,
-                    UPDATE_AT=update_at,
-                    SEEDING_INFO=site_user_info.seeding_info,
-                    URL=site_user_info.site_url
-                ))
-            else:
-                self._db.query(SITEUSERSEEDINGINFO).filter(SITEUSERSEEDINGINFO.URL == site_user_info.site_url).update(
-                    {
-                        "SITE": site_user_info.site_name,
-                        "UPDATE_AT": update_at,
-                        "SEEDING_INFO": site_user_info.seeding_info
-                    }
-                )
+        self._db.bulk_upsert(SITEUSERSEEDINGINFO,
+                             [{
+                                 "SITE": site_user_info.site_name,
+                                 "UPDATE_AT": update_at,
+                                 "SEEDING_INFO": site_user_info.seeding_info,
+                                 "URL": site_user_info.site_url
+                             } for site_user_info in site_user_infos],
+                             index_elements=["URL"],
+                             update_columns=["SITE", "UPDATE_AT", "SEEDING_INFO"])
 
     def is_site_user_statistics_exists(self, url):
         """
@@ -1368,14 +1346,15 @@ class DbHelper:
         """
         查询站点数据历史
         """
-        if strict_urls:
-            # 根据站点优先级排序
-            return self._db.query(SITEUSERINFOSTATS) \
-                .join(CONFIGSITE, SITEUSERINFOSTATS.SITE == CONFIGSITE.NAME) \
-                .filter(SITEUSERINFOSTATS.URL.in_(tuple(strict_urls + ["__DUMMY__"]))) \
-                .order_by(cast(CONFIGSITE.PRI, Integer).asc()).limit(num).all()
-        else:
-            return self._db.query(SITEUSERINFOSTATS).limit(num).all()
+        with self._db.read_session() as session:
+            if strict_urls:
+                # 根据站点优先级排序
+                return session.query(SITEUSERINFOSTATS) \
+                    .join(CONFIGSITE, SITEUSERINFOSTATS.SITE == CONFIGSITE.NAME) \
+                    .filter(SITEUSERINFOSTATS.URL.in_(tuple(strict_urls + ["__DUMMY__"]))) \
+                    .order_by(cast(CONFIGSITE.PRI, Integer).asc()).limit(num).all()
+            else:
+                return session.query(SITEUSERINFOSTATS).limit(num).all()
 
     def is_site_statistics_history_exists(self, url, date):
         """
@@ -1407,51 +1386,28 @@ class DbHelper:
     @DbPersist(_db)
     def insert_site_statistics_history(self, site_user_infos: list):
         """
-        插入站点数据
+        插入站点数据，同一天同一站点只保留最新一条
         """
         if not site_user_infos:
             return
         date_now = time.strftime('%Y-%m-%d', time.localtime(time.time()))
-        for site_user_info in site_user_infos:
-            site = site_user_info.site_name
-            upload = site_user_info.upload
-            user_level = site_user_info.user_level
-            download = site_user_info.download
-            ratio = site_user_info.ratio
-            seeding = site_user_info.seeding
-            seeding_size = site_user_info.seeding_size
-            leeching = site_user_info.leeching
-            bonus = site_user_info.bonus
-            url = site_user_info.site_url
-            if not self.is_site_statistics_history_exists(date=date_now, url=url):
-                self._db.insert(SITESTATISTICSHISTORY(
-                    SITE=site,
-                    USER_LEVEL=user_level,
-                    DATE=date_now,
-                    UPLOAD=upload,
-                    DOWNLOAD=download,
-                    RATIO=ratio,
-                    SEEDING=seeding,
-                    LEECHING=leeching,
-                    SEEDING_SIZE=seeding_size,
-                    BONUS=bonus,
-                    URL=url
-                ))
-            else:
-                self._db.query(SITESTATISTICSHISTORY).filter(SITESTATISTICSHISTORY.DATE == date_now,
-                                                             SITESTATISTICSHISTORY.URL == url).update(
-                    {
-                        "SITE": site,
-                        "USER_LEVEL": user_level,
-                        "UPLOAD": upload,
-                        "DOWNLOAD": download,
-                        "RATIO": ratio,
-                        "SEEDING": seeding,
-                        "LEECHING": leeching,
-                        "SEEDING_SIZE": seeding_size,
-                        "BONUS": bonus
-                    }
-                )
+        self._db.bulk_upsert(SITESTATISTICSHISTORY,
+                             [{
+                                 "SITE": site_user_info.site_name,
+                                 "USER_LEVEL": site_user_info.user_level,
+                                 "DATE": date_now,
+                                 "UPLOAD": site_user_info.upload,
+                                 "DOWNLOAD": site_user_info.download,
+                                 "RATIO": site_user_info.ratio,
+                                 "SEEDING": site_user_info.seeding,
+                                 "LEECHING": site_user_info.leeching,
+                                 "SEEDING_SIZE": site_user_info.seeding_size,
+                                 "BONUS": site_user_info.bonus,
+                                 "URL": site_user_info.site_url
+                             } for site_user_info in site_user_infos],
+                             index_elements=["DATE", "URL"],
+                             update_columns=["SITE", "USER_LEVEL", "UPLOAD", "DOWNLOAD", "RATIO",
+                                             "SEEDING", "LEECHING", "SEEDING_SIZE", "BONUS"])
 
     def get_site_statistics_history(self, site, days=30):
         """
@@ -1488,76 +1444,77 @@ class DbHelper:
         :param strict_urls 需要的站点URL的列表
         传入 7,"2020-01-01" 表示需要从2020-01-01之前6天的数据
         """
-        # 查询最大最小日期
-        if strict_urls is None:
-            strict_urls = []
-        end = datetime.datetime.now()
-        if end_day:
-            try:
-                end = datetime.datetime.strptime(end_day, "%Y-%m-%d")
-            except Exception:
-                pass
-
-        # 开始时间
-        b_date = (end - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
-        # 结束时间
-        e_date = end.strftime("%Y-%m-%d")
-        # 大于开始时间范围里的最大日期与最小日期
-        date_ret = self._db.query(func.max(SITESTATISTICSHISTORY.DATE),
-                                  func.MIN(SITESTATISTICSHISTORY.DATE)).filter(
-            SITESTATISTICSHISTORY.DATE > b_date, SITESTATISTICSHISTORY.DATE <= e_date).all()
-        if date_ret and date_ret[0][0]:
-            total_upload = 0
-            total_download = 0
-            ret_site_uploads = []
-            ret_site_downloads = []
-            min_date = date_ret[0][1]
-            max_date = date_ret[0][0]
-            # 查询开始值
-            if strict_urls:
-                subquery = self._db.query(SITESTATISTICSHISTORY.SITE.label("SITE"),
-                                          SITESTATISTICSHISTORY.DATE.label("DATE"),
-                                          func.sum(SITESTATISTICSHISTORY.UPLOAD).label("UPLOAD"),
-                                          func.sum(SITESTATISTICSHISTORY.DOWNLOAD).label("DOWNLOAD")).filter(
-                    SITESTATISTICSHISTORY.DATE >= min_date,
-                    SITESTATISTICSHISTORY.DATE <= max_date,
-                    SITESTATISTICSHISTORY.URL.in_(tuple(strict_urls + ["__DUMMY__"]))
-                ).group_by(SITESTATISTICSHISTORY.SITE, SITESTATISTICSHISTORY.DATE).subquery()
-            else:
-                subquery = self._db.query(SITESTATISTICSHISTORY.SITE.label("SITE"),
-                                          SITESTATISTICSHISTORY.DATE.label("DATE"),
-                                          func.sum(SITESTATISTICSHISTORY.UPLOAD).label("UPLOAD"),
-                                          func.sum(SITESTATISTICSHISTORY.DOWNLOAD).label("DOWNLOAD")).filter(
-                    SITESTATISTICSHISTORY.DATE >= min_date,
-                    SITESTATISTICSHISTORY.DATE <= max_date
-                ).group_by(SITESTATISTICSHISTORY.SITE, SITESTATISTICSHISTORY.DATE).subquery()
-            # 查询大于开始时间范围里的单日,单站点 最大值与最小值
-            rets = self._db.query(subquery.c.SITE,
-                                  func.min(subquery.c.UPLOAD),
-                                  func.min(subquery.c.DOWNLOAD),
-                                  func.max(subquery.c.UPLOAD),
-                                  func.max(subquery.c.DOWNLOAD)).group_by(subquery.c.SITE).all()
-            ret_sites = []
-            for ret_b in rets:
-                # 如果最小值都是0，可能时由于近几日没有更新数据，或者cookie过期，正常有数据的话，第二天能正常
-                ret_b = list(ret_b)
-                if ret_b[1] == 0 and ret_b[2] == 0:
-                    ret_b[1] = ret_b[3]
-                    ret_b[2] = ret_b[4]
-                ret_sites.append(ret_b[0])
-                if int(ret_b[1]) < int(ret_b[3]):
-                    total_upload += int(ret_b[3]) - int(ret_b[1])
-                    ret_site_uploads.append(int(ret_b[3]) - int(ret_b[1]))
-                else:
-                    ret_site_uploads.append(0)
-                if int(ret_b[2]) < int(ret_b[4]):
-                    total_download += int(ret_b[4]) - int(ret_b[2])
-                    ret_site_downloads.append(int(ret_b[4]) - int(ret_b[2]))
+        with self._db.read_session() as session:
+            # 查询最大最小日期
+            if strict_urls is None:
+                strict_urls = []
+            end = datetime.datetime.now()
+            if end_day:
+                try:
+                    end = datetime.datetime.strptime(end_day, "%Y-%m-%d")
+                except Exception:
+                    pass
+
+            # 开始时间
+            b_date = (end - datetime.timedelta(days=days)).strftime("%Y-%m-%d")
+            # 结束时间
+            e_date = end.strftime("%Y-%m-%d")
+            # 大于开始时间范围里的最大日期与最小日期
+            date_ret = session.query(func.max(SITESTATISTICSHISTORY.DATE),
+                                     func.MIN(SITESTATISTICSHISTORY.DATE)).filter(
+                SITESTATISTICSHISTORY.DATE > b_date, SITESTATISTICSHISTORY.DATE <= e_date).all()
+            if date_ret and date_ret[0][0]:
+                total_upload = 0
+                total_download = 0
+                ret_site_uploads = []
+                ret_site_downloads = []
+                min_date = date_ret[0][1]
+                max_date = date_ret[0][0]
+                # 查询开始值
+                if strict_urls:
+                    subquery = session.query(SITESTATISTICSHISTORY.SITE.label("SITE"),
+                                             SITESTATISTICSHISTORY.DATE.label("DATE"),
+                                             func.sum(SITESTATISTICSHISTORY.UPLOAD).label("UPLOAD"),
+                                             func.sum(SITESTATISTICSHISTORY.DOWNLOAD).label("DOWNLOAD")).filter(
+                        SITESTATISTICSHISTORY.DATE >= min_date,
+                        SITESTATISTICSHISTORY.DATE <= max_date,
+                        SITESTATISTICSHISTORY.URL.in_(tuple(strict_urls + ["__DUMMY__"]))
+                    ).group_by(SITESTATISTICSHISTORY.SITE, SITESTATISTICSHISTORY.DATE).subquery()
                 else:
-                    ret_site_downloads.append(0)
-            return total_upload, total_download, ret_sites, ret_site_uploads, ret_site_downloads
-        else:
-            return 0, 0, [], [], []
+                    subquery = session.query(SITESTATISTICSHISTORY.SITE.label("SITE"),
+                                             SITESTATISTICSHISTORY.DATE.label("DATE"),
+                                             func.sum(SITESTATISTICSHISTORY.UPLOAD).label("UPLOAD"),
+                                             func.sum(SITESTATISTICSHISTORY.DOWNLOAD).label("DOWNLOAD")).filter(
+                        SITESTATISTICSHISTORY.DATE >= min_date,
+                        SITESTATISTICSHISTORY.DATE <= max_date
+                    ).group_by(SITESTATISTICSHISTORY.SITE, SITESTATISTICSHISTORY.DATE).subquery()
+                # 查询大于开始时间范围里的单日,单站点 最大值与最小值
+                rets = session.query(subquery.c.SITE,
+                                     func.min(subquery.c.UPLOAD),
+                                     func.min(subquery.c.DOWNLOAD),
+                                     func.max(subquery.c.UPLOAD),
+                                     func.max(subquery.c.DOWNLOAD)).group_by(subquery.c.SITE).all()
+                ret_sites = []
+                for ret_b in rets:
+                    # 如果最小值都是0，可能时由于近几日没有更新数据，或者cookie过期，正常有数据的话，第二天能正常
+                    ret_b = list(ret_b)
+                    if ret_b[1] == 0 and ret_b[2] == 0:
+                        ret_b[1] = ret_b[3]
+                        ret_b[2] = ret_b[4]
+                    ret_sites.append(ret_b[0])
+                    if int(ret_b[1]) < int(ret_b[3]):
+                        total_upload += int(ret_b[3]) - int(ret_b[1])
+                        ret_site_uploads.append(int(ret_b[3]) - int(ret_b[1]))
+                    else:
+                        ret_site_uploads.append(0)
+                    if int(ret_b[2]) < int(ret_b[4]):
+                        total_download += int(ret_b[4]) - int(ret_b[2])
+                        ret_site_downloads.append(int(ret_b[4]) - int(ret_b[2]))
+                    else:
+                        ret_site_downloads.append(0)
+                return total_upload, total_download, ret_sites, ret_site_uploads, ret_site_downloads
+            else:
+                return 0, 0, [], [], []
 
     def query_exists_download_history(self, enclosure, downloader, download_id):
         """
@@ -1624,25 +1581,26 @@ class DbHelper:
         """
         查询下载历史
         """
-        if hid:
-            return self._db.query(DOWNLOADHISTORY).filter(DOWNLOADHISTORY.ID == int(hid)).all()
-        sub_query = self._db.query(DOWNLOADHISTORY,
-                                   func.max(DOWNLOADHISTORY.DATE)
-                                   ).group_by(DOWNLOADHISTORY.TITLE).subquery()
-        if date:
-            return self._db.query(DOWNLOADHISTORY).filter(
-                DOWNLOADHISTORY.DATE > date).join(
-                sub_query,
-                and_(sub_query.c.ID == DOWNLOADHISTORY.ID)
-            ).order_by(DOWNLOADHISTORY.DATE.desc()).all()
-        else:
-            offset = (int(page) - 1) * int(num)
-            return self._db.query(DOWNLOADHISTORY).join(
-                sub_query,
-                and_(sub_query.c.ID == DOWNLOADHISTORY.ID)
-            ).order_by(
-                DOWNLOADHISTORY.DATE.desc()
-            ).limit(num).offset(offset).all()
+        with self._db.read_session() as session:
+            if hid:
+                return session.query(DOWNLOADHISTORY).filter(DOWNLOADHISTORY.ID == int(hid)).all()
+            sub_query = session.query(DOWNLOADHISTORY,
+                                      func.max(DOWNLOADHISTORY.DATE)
+                                      ).group_by(DOWNLOADHISTORY.TITLE).subquery()
+            if date:
+                return session.query(DOWNLOADHISTORY).filter(
+                    DOWNLOADHISTORY.DATE > date).join(
+                    sub_query,
+                    and_(sub_query.c.ID == DOWNLOADHISTORY.ID)
+                ).order_by(DOWNLOADHISTORY.DATE.desc()).all()
+            else:
+                offset = (int(page) - 1) * int(num)
+                return session.query(DOWNLOADHISTORY).join(
+                    sub_query,
+                    and_(sub_query.c.ID == DOWNLOADHISTORY.ID)
+                ).order_by(
+                    DOWNLOADHISTORY.DATE.desc()
+                ).limit(num).offset(offset).all()
 
     def get_download_history_by_title(self, title):
         """
@@ -1858,6 +1816,17 @@ class DbHelper:
             return None
         return self._db.query(SITEBRUSHTORRENTS).filter(SITEBRUSHTORRENTS.ENCLOSURE == enclosure).first()
 
+    def get_brushtask_handled_enclosures(self, enclosures):
+        """
+        批量查询已在刷流任务中的种子链接
+        """
+        enclosures = list({enclosure for enclosure in enclosures or [] if enclosure})
+        handled = set()
+        for i in range(0, len(enclosures), 500):
+            handled.update(row[0] for row in self._db.query(SITEBRUSHTORRENTS.ENCLOSURE).filter(
+                SITEBRUSHTORRENTS.ENCLOSURE.in_(enclosures[i:i + 500])).distinct())
+        return handled
+
     def is_brushtask_torrent_exists(self, brush_id, title, enclosure):
         """
         查询刷流任务种子是否已存在
@@ -2154,12 +2123,13 @@ class DbHelper:
         """
         查询RSS历史
         """
-        if rid:
-            return self._db.query(RSSHISTORY).filter(RSSHISTORY.ID == int(rid)).all()
-        elif rtype:
-            return self._db.query(RSSHISTORY).filter(RSSHISTORY.TYPE == rtype) \
-                .order_by(RSSHISTORY.FINISH_TIME.desc()).all()
-        return self._db.query(RSSHISTORY).order_by(RSSHISTORY.FINISH_TIME.desc()).all()
+        with self._db.read_session() as session:
+            if rid:
+                return session.query(RSSHISTORY).filter(RSSHISTORY.ID == int(rid)).all()
+            elif rtype:
+                return session.query(RSSHISTORY).filter(RSSHISTORY.TYPE == rtype) \
+                    .order_by(RSSHISTORY.FINISH_TIME.desc()).all()
+            return session.query(RSSHISTORY).order_by(RSSHISTORY.FINISH_TIME.desc()).all()
 
     def is_exists_rss_history(self, rssid):
         """
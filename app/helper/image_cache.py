@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import aiohttp
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+import log
+from app.utils import RequestUtils
+from app.utils.async_request import AsyncRequestUtils
+from app.utils.commons import singleton
+from config import Config
+
+# 缓存总大小上限（MB），可通过 laboratory.image_cache_size 调整
+IMAGE_CACHE_SIZE = 512
+# 缩略图宽度，请求的宽度向上取最接近的一档，避免生成过多尺寸
+IMAGE_THUMB_WIDTHS = (200, 300, 500, 800)
+# 缩略图WebP质量
+IMAGE_THUMB_QUALITY = 80
+# 下载超时时间（秒）
+IMAGE_FETCH_TIMEOUT = 20
+
+
+class CachedImage(object):
+    """
+    已缓存的图片文件
+    """
+    __slots__ = ("key", "path", "size", "mtime")
+
+    def __init__(self, key, path, size, mtime):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+
+    @property
+    def media_type(self):
+        return mimetypes.guess_type(self.path)[0] or "image/jpeg"
+
+
+@singleton
+class ImageCache(object):
+    """
+    图片代理磁盘缓存
+    图片按地址的哈希保存为文件，总大小超过上限时淘汰最久未使用的文件，重启后仍然有效；
+    同一图片同时只下载一次，可按宽度生成WebP缩略图
+    """
+    _lock = threading.Lock()
+    _cache_path = None
+    _max_size = 0
+    _items = None
+    _total_size = 0
+    _loaded = False
+    _inflight = None
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._inflight = {}
+        self.init_config()
+
+    def init_config(self):
+        laboratory = Config().get_config('laboratory') or {}
+        try:
+            max_size = int(laboratory.get('image_cache_size') or IMAGE_CACHE_SIZE)
+        except (TypeError, ValueError):
+            max_size = IMAGE_CACHE_SIZE
+        self._max_size = max_size * 1024 * 1024
+        self._cache_path = os.path.join(Config().get_config_path(), "image_cache")
+
+    @staticmethod
+    def get_key(url, width=None):
+        """
+        计算缓存标识，同时用作ETag
+        """
+        return hashlib.sha256(f"{url}@{width or ''}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_thumb_width(width):
+        """
+        缩略图宽度向上取档，超过最大一档时返回None（使用原图）
+        """
+        if not width:
+            return None
+        for thumb_width in IMAGE_THUMB_WIDTHS:
+            if int(width) <= thumb_width:
+                return thumb_width
+        return None
+
+    def __load(self):
+        """
+        加载磁盘上已有的缓存文件，按修改时间排序作为淘汰顺序
+        """
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self._cache_path, exist_ok=True)
+            files = []
+            for root, _, names in os.walk(self._cache_path):
+                for name in names:
+                    path = os.path.join(root, name)
+                    # 清理未写完的临时文件
+                    if name.endswith(".tmp"):
+                        self.__unlink(path)
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    key = os.path.splitext(name)[0]
+                    files.append(CachedImage(key=key, path=path, size=stat.st_size, mtime=stat.st_mtime))
+            for item in sorted(files, key=lambda x: x.mtime):
+                self._items[item.key] = item
+                self._total_size += item.size
+            self._loaded = True
+            self.__evict()
+
+    def get(self, key):
+        """
+        查询已缓存的图片
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if not item:
+                return None
+            self._items.move_to_end(key)
+        if not os.path.exists(item.path):
+            with self._lock:
+                if self._items.pop(key, None):
+                    self._total_size -= item.size
+            return None
+        return item
+
+    async def fetch(self, url, headers=None, width=None):
+        """
+        获取图片，未缓存时下载并保存，同一图片同时只下载一次
+        :param url: 图片地址
+        :param headers: 请求头
+        :param width: 缩略图宽度，为空时返回原图
+        :return: CachedImage，获取失败时返回None
+        """
+        if not url:
+            return None
+        if not self._loaded:
+            await run_in_threadpool(self.__load)
+        width = self.get_thumb_width(width)
+        key = self.get_key(url, width)
+        item = self.get(key)
+        if item:
+            return item
+        task = self._inflight.get(key)
+        if not task:
+            # 下载在独立的任务中执行，发起请求的连接被取消时不影响其它等待同一图片的请求
+            task = asyncio.ensure_future(self.__fetch(key, url, headers, width))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def __fetch(self, key, url, headers, width):
+        try:
+            if width:
+                return await self.__fetch_thumb(key, url, headers, width)
+            return await self.__fetch_origin(key, url, headers)
+        except Exception as e:
+            log.error(f"【ImageCache】获取图片 {url} 出错：{str(e)}")
+            return None
+
+    async def __fetch_origin(self, key, url, headers):
+        content, content_type = await self.__download(url, headers)
+        if not content:
+            return None
+        ext = mimetypes.guess_extension(content_type or "") or ".jpg"
+        return await run_in_threadpool(self.__save, key, ext, content)
+
+    async def __fetch_thumb(self, key, url, headers, width):
+        origin = await self.fetch(url, headers)
+        if not origin:
+            return None
+        content = await run_in_threadpool(self.__make_thumb, origin.path, width)
+        if not content:
+            # 无法生成缩略图时使用原图
+            return origin
+        return await run_in_threadpool(self.__save, key, ".webp", content)
+
+    @staticmethod
+    async def __download(url, headers):
+        """
+        下载图片
+        :return: 图片内容, 类型
+        """
+        if AsyncRequestUtils.http_session is None:
+            res = await run_in_threadpool(RequestUtils(headers=headers, timeout=IMAGE_FETCH_TIMEOUT).get_res, url)
+            if res is None or res.status_code != 200:
+                return None, None
+            content, content_type = res.content, res.headers.get("Content-Type")
+        else:
+            async with AsyncRequestUtils.http_session.get(url,
+                                                          headers=headers,
+                                                          timeout=aiohttp.ClientTimeout(
+                                                              total=IMAGE_FETCH_TIMEOUT)) as res:
+                if res.status != 200:
+                    return None, None
+                content, content_type = await res.read(), res.headers.get("Content-Type")
+        content_type = (content_type or "").split(";")[0].strip().lower()
+        # 不缓存错误页面
+        if content_type.startswith("text/") or content_type == "application/json":
+            return None, None
+        return content, content_type
+
+    @staticmethod
+    def __make_thumb(path, width):
+        """
+        生成WebP缩略图，比原图小时才返回
+        """
+        try:
+            with Image.open(path) as image:
+                if image.width <= width:
+                    return None
+                image.thumbnail((width, round(image.height * width / image.width)))
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+                buffer = io.BytesIO()
+                image.save(buffer, format="WEBP", quality=IMAGE_THUMB_QUALITY)
+                return buffer.getvalue()
+        except Exception as e:
+            log.warn(f"【ImageCache】生成缩略图失败：{str(e)}")
+            return None
+
+    def __save(self, key, ext, content):
+        """
+        写入缓存文件，先写临时文件再替换，避免读到不完整的文件
+        """
+        path = os.path.join(self._cache_path, key[:2], f"{key}{ext}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        item = CachedImage(key=key, path=path, size=len(content), mtime=time.time())
+        with self._lock:
+            exists = self._items.pop(key, None)
+            if exists:
+                self._total_size -= exists.size
+            self._items[key] = item
+            self._total_size += item.size
+            self.__evict()
+        return item
+
+    def __evict(self):
+        """
+        淘汰最久未使用的文件直到不超过上限，需在锁内调用
+        """
+        while self._total_size > self._max_size and len(self._items) > 1:
+            _, item = self._items.popitem(last=False)
+            self._total_size -= item.size
+            self.__unlink(item.path)
+
+    @staticmethod
+    def __unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """
+        缓存统计
+        """
+        with self._lock:
+            return {
+                "files": len(self._items),
+                "size": self._total_size,
+                "max_size": self._max_size,
+                "inflight": len(self._inflight)
+            }
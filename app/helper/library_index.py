@@ -0,0 +1,176 @@
+import os
+import threading
+
+from cachetools import TTLCache
+
+from app.utils.commons import singleton
+
+# 目录清单缓存时间（秒），媒体库在网络存储上时其它客户端的变化无法通过文件监控感知，只能按时间过期
+LIBRARY_INDEX_TTL = 60
+# 缓存的目录数量上限
+LIBRARY_INDEX_SIZE = 4096
+
+
+class _DirListing(object):
+    """
+    单个目录的文件清单，文件系统不区分大小写时（SMB、NTFS等）按忽略大小写的名称查找
+    """
+    __slots__ = ("names", "stems", "ignore_case")
+
+    def __init__(self, dir_path, names):
+        self.ignore_case = self.__is_case_insensitive(dir_path, names)
+        # 规范化的文件名 -> 文件名
+        self.names = {}
+        # 规范化的不含后缀的文件名 -> 文件名列表
+        self.stems = {}
+        for name in names:
+            self.names[self.key(name)] = name
+            self.stems.setdefault(self.key(os.path.splitext(name)[0]), []).append(name)
+
+    def key(self, name):
+        """
+        规范化文件名，用于查找
+        """
+        return name.casefold() if self.ignore_case else name
+
+    @staticmethod
+    def __is_case_insensitive(dir_path, names):
+        """
+        用一个文件名的大小写互换形式探测文件系统是否区分大小写
+        """
+        for name in names:
+            swapped = name.swapcase()
+            if swapped == name:
+                continue
+            if swapped in names:
+                return False
+            return os.path.exists(os.path.join(dir_path, swapped))
+        # 目录中没有可用于判断的文件名时，用目录名判断
+        parent, dir_name = os.path.split(dir_path)
+        if dir_name and dir_name.swapcase() != dir_name:
+            return os.path.exists(os.path.join(parent, dir_name.swapcase()))
+        return False
+
+
+@singleton
+class LibraryIndex(object):
+    """
+    媒体库目录清单缓存
+    每个目录只列出一次，存在性判断转为字典查找，本程序写入的目录在写入后立即失效
+    """
+    _lock = threading.Lock()
+    _listings = None
+
+    _hits = 0
+    _misses = 0
+    _saved_stats = 0
+
+    def __init__(self):
+        self._listings = TTLCache(maxsize=LIBRARY_INDEX_SIZE, ttl=LIBRARY_INDEX_TTL)
+
+    @staticmethod
+    def __normalize(path):
+        return os.path.normpath(str(path))
+
+    def __get_listing(self, dir_path):
+        """
+        获取目录清单，目录不存在时返回None，结果均会缓存
+        """
+        dir_path = self.__normalize(dir_path)
+        with self._lock:
+            if dir_path in self._listings:
+                self._hits += 1
+                return self._listings[dir_path]
+            self._misses += 1
+        try:
+            with os.scandir(dir_path) as entries:
+                listing = _DirListing(dir_path, {entry.name for entry in entries})
+        except (FileNotFoundError, NotADirectoryError):
+            listing = None
+        except OSError:
+            # 无权限等异常不缓存
+            return None
+        with self._lock:
+            self._listings[dir_path] = listing
+        return listing
+
+    def exists(self, path):
+        """
+        判断文件或目录是否存在
+        """
+        if not path:
+            return False
+        path = self.__normalize(path)
+        parent, name = os.path.split(path)
+        if not name:
+            return os.path.exists(path)
+        listing = self.__get_listing(parent)
+        self.__count_saved(1)
+        return listing is not None and listing.key(name) in listing.names
+
+    def find_media_file(self, file_path, exts):
+        """
+        按后缀顺序查找已存在的同名媒体文件
+        :param file_path: 不含后缀的文件路径
+        :param exts: 后缀列表
+        :return: 已存在的文件路径，不存在时返回None
+        """
+        if not file_path:
+            return None
+        file_path = self.__normalize(file_path)
+        parent, stem = os.path.split(file_path)
+        listing = self.__get_listing(parent)
+        self.__count_saved(len(exts))
+        if not listing:
+            return None
+        names = listing.stems.get(listing.key(stem))
+        if not names:
+            return None
+        names = {listing.key(name): name for name in names}
+        for ext in exts:
+            name = names.get(listing.key("%s%s" % (stem, ext)))
+            if name:
+                return os.path.join(parent, name)
+        return None
+
+    def invalidate(self, path):
+        """
+        路径发生变化后清除相关缓存：自身、所有上级目录及下级目录
+        """
+        if not path:
+            return
+        path = self.__normalize(path)
+        with self._lock:
+            parent = path
+            while True:
+                self._listings.pop(parent, None)
+                next_parent = os.path.dirname(parent)
+                if next_parent == parent:
+                    break
+                parent = next_parent
+            prefix = path.rstrip(os.sep) + os.sep
+            for key in [k for k in self._listings.keys() if k.startswith(prefix)]:
+                self._listings.pop(key, None)
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._listings.clear()
+
+    def __count_saved(self, count):
+        with self._lock:
+            self._saved_stats += count
+
+    def stats(self):
+        """
+        缓存统计，saved_stats为查询次数（原本需要的文件系统调用次数）减去实际列目录次数
+        """
+        with self._lock:
+            return {
+                "dirs": len(self._listings),
+                "hits": self._hits,
+                "misses": self._misses,
+                "saved_stats": max(self._saved_stats - self._misses, 0)
+            }
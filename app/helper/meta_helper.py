@@ -1,15 +1,20 @@
+import json
 import os
 import pickle
-import random
+import sqlite3
+import threading
 import time
 
 from app.utils.commons import singleton
+from app.utils.types import MediaType
 from config import Config
 
 import log
 
 CACHE_EXPIRE_TIMESTAMP_STR = "cache_expire_timestamp"
 EXPIRE_TIMESTAMP = 7 * 24 * 3600
+# 剩余有效期低于该值时访问才会刷新过期时间，避免每次读取都写库
+EXPIRE_REFRESH_THRESHOLD = EXPIRE_TIMESTAMP // 2
 
 
 @singleton
@@ -21,10 +26,13 @@ class MetaHelper(object):
         "year": '',
         "type": MediaType
     }
+    缓存保存在配置目录下的tmdb_meta.db中，按条目增量写入，首次使用时才打开
     """
-    _meta_data = {}
+    _lock = threading.RLock()
+    _conn = None
 
-    _meta_path = None
+    _db_path = None
+    _legacy_path = None
     _tmdb_cache_expire = False
 
     def __init__(self):
@@ -34,250 +42,250 @@ class MetaHelper(object):
         laboratory = Config().get_config('laboratory')
         if laboratory:
             self._tmdb_cache_expire = laboratory.get("tmdb_cache_expire")
-        self._meta_path = os.path.join(Config().get_config_path(), 'tmdb.dat')
-        self._meta_data = self.__load_meta_data(self._meta_path)
+        db_path = os.path.join(Config().get_config_path(), 'tmdb_meta.db')
+        with self._lock:
+            if self._conn and db_path != self._db_path:
+                self._conn.close()
+                self._conn = None
+            self._db_path = db_path
+            self._legacy_path = os.path.join(Config().get_config_path(), 'tmdb.dat')
+
+    @property
+    def conn(self):
+        """
+        延迟打开缓存数据库
+        """
+        if not self._conn:
+            with self._lock:
+                if not self._conn:
+                    self._conn = self.__open_db()
+        return self._conn
+
+    def __open_db(self):
+        conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS META_DATA ("
+                     "KEY TEXT PRIMARY KEY, "
+                     "TMDBID TEXT, "
+                     "TYPE TEXT, "
+                     "TITLE TEXT, "
+                     "YEAR TEXT, "
+                     "POSTER_PATH TEXT, "
+                     "BACKDROP_PATH TEXT, "
+                     "ALIAS TEXT, "
+                     "EXPIRE_AT INTEGER)")
+        conn.execute("CREATE INDEX IF NOT EXISTS INDX_META_DATA_TMDBID ON META_DATA (TMDBID)")
+        conn.execute("CREATE INDEX IF NOT EXISTS INDX_META_DATA_TITLE ON META_DATA (TITLE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS INDX_META_DATA_EXPIRE ON META_DATA (EXPIRE_AT)")
+        # 未识别记录不跨进程保留
+        conn.execute("DELETE FROM META_DATA WHERE TMDBID = '0'")
+        self.__import_legacy_data(conn)
+        return conn
+
+    def __import_legacy_data(self, conn):
+        """
+        导入旧版本的tmdb.dat缓存文件，导入后重命名备份
+        """
+        if not os.path.exists(self._legacy_path):
+            return
+        try:
+            with open(self._legacy_path, 'rb') as f:
+                data = pickle.load(f)
+            if data:
+                conn.execute("BEGIN")
+                conn.executemany(self.__upsert_sql(),
+                                 [self.__to_row(key, item) for key, item in data.items()
+                                  if str(item.get("id")) != '0'])
+                conn.execute("COMMIT")
+            os.replace(self._legacy_path, "%s.bak" % self._legacy_path)
+            log.info("【Meta】已导入旧版TMDB缓存 %s 条" % len(data or {}))
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            log.error("【Meta】导入旧版TMDB缓存出错：%s" % str(e))
+
+    @staticmethod
+    def __upsert_sql():
+        return "INSERT INTO META_DATA " \
+               "(KEY, TMDBID, TYPE, TITLE, YEAR, POSTER_PATH, BACKDROP_PATH, ALIAS, EXPIRE_AT) " \
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) " \
+               "ON CONFLICT(KEY) DO NOTHING"
+
+    @staticmethod
+    def __to_row(key, item):
+        """
+        缓存条目转换为数据库记录
+        """
+        mtype = item.get("type")
+        alias = item.get("alias")
+        return (key,
+                str(item.get("id") or 0),
+                mtype.name if isinstance(mtype, MediaType) else mtype,
+                item.get("title"),
+                item.get("year"),
+                item.get("poster_path"),
+                item.get("backdrop_path"),
+                json.dumps(alias, ensure_ascii=False) if alias else None,
+                item.get(CACHE_EXPIRE_TIMESTAMP_STR) or int(time.time()) + EXPIRE_TIMESTAMP)
+
+    @staticmethod
+    def __to_item(row):
+        """
+        数据库记录转换为缓存条目
+        """
+        tmdbid = row["TMDBID"]
+        if tmdbid == '0':
+            return {"id": 0, CACHE_EXPIRE_TIMESTAMP_STR: row["EXPIRE_AT"]}
+        mtype = row["TYPE"]
+        return {
+            "id": int(tmdbid) if tmdbid.isdigit() else tmdbid,
+            "type": MediaType[mtype] if mtype in MediaType.__members__ else None,
+            "year": row["YEAR"],
+            "title": row["TITLE"],
+            "poster_path": row["POSTER_PATH"],
+            "backdrop_path": row["BACKDROP_PATH"],
+            "alias": json.loads(row["ALIAS"]) if row["ALIAS"] else None,
+            CACHE_EXPIRE_TIMESTAMP_STR: row["EXPIRE_AT"]
+        }
+
+    def __execute(self, sql, params=()):
+        """
+        执行写操作，返回影响行数
+        """
+        with self._lock:
+            return self.conn.execute(sql, params).rowcount
+
+    def __fetchone(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def __fetchall(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
 
     def clear_meta_data(self):
         """
         清空所有TMDB缓存
         """
-        # 直接赋值为空字典（原子操作）
-        self._meta_data = {}
+        self.__execute("DELETE FROM META_DATA")
 
     def get_meta_data_path(self):
         """
         返回TMDB缓存文件路径
         """
-        return self._meta_path
+        return self._db_path
 
     def get_meta_data_by_key(self, key):
         """
         根据KEY值获取缓存值
         """
-        # 字典 get 是线程安全的
-        info: dict = self._meta_data.get(key)
-        if info:
-            expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-            if not expire or int(time.time()) < expire:
-                # 修改字典中的嵌套对象可能会有并发风险，但在简单缓存场景下通常可接受
-                info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                # 这里调用 update 本质上是重复赋值，为了触发所谓的“更新”逻辑
-                self.update_meta_data({key: info})
-            elif expire and self._tmdb_cache_expire:
-                self.delete_meta_data(key)
-        return info or {}
+        row = self.__fetchone("SELECT * FROM META_DATA WHERE KEY = ?", (key,))
+        if not row:
+            return {}
+        info = self.__to_item(row)
+        now = int(time.time())
+        expire = row["EXPIRE_AT"]
+        if expire and now >= expire and self._tmdb_cache_expire:
+            self.delete_meta_data(key)
+        elif not expire or expire - now < EXPIRE_REFRESH_THRESHOLD:
+            # 访问时续期
+            info[CACHE_EXPIRE_TIMESTAMP_STR] = now + EXPIRE_TIMESTAMP
+            self.__execute("UPDATE META_DATA SET EXPIRE_AT = ? WHERE KEY = ?",
+                           (info[CACHE_EXPIRE_TIMESTAMP_STR], key))
+        return info
 
     def dump_meta_data(self, search, page, num):
         """
         分页获取当前缓存列表
         """
-        if page == 1:
-            begin_pos = 0
+        begin_pos = (page - 1) * num if page > 1 else 0
+        if not search:
+            where, params = "TMDBID != '0'", ()
         else:
-            begin_pos = (page - 1) * num
-
+            where, params = "TMDBID != '0' AND (KEY LIKE ? OR TITLE LIKE ?)", ("%%%s%%" % search,) * 2
+        total_count = self.__fetchone("SELECT COUNT(*) FROM META_DATA WHERE %s" % where, params)[0]
+        rows = self.__fetchall("SELECT * FROM META_DATA WHERE %s ORDER BY rowid LIMIT ? OFFSET ?" % where,
+                               params + (num, begin_pos))
         page_metas = []
-        
-        # 为了防止遍历时字典大小改变，先生成一个列表快照
-        # list() 操作在 CPython 中相对安全，能迅速生成副本
-        all_items_snapshot = list(self._meta_data.items())
-        
-        total_count = 0
-
-        if not search:  # search 为空，直接按分页取数据
-            total_count = len(all_items_snapshot)
-            # 对快照进行切片
-            items = all_items_snapshot[begin_pos: begin_pos + num]
-            for k, v in items:
-                if v.get("id") == 0:
-                    continue
-                page_metas.append({
-                    "key": k,
-                    "meta": {
-                        "id": v.get("id"),
-                        "title": v.get("title"),
-                        "year": v.get("year"),
-                        "media_type": v.get("type").value,
-                        "poster_path": v.get("poster_path"),
-                        "backdrop_path": v.get("backdrop_path")
-                    }
-                })
-        else:  # search 不为空，按匹配处理
-            current_index = 0
-            start_index = begin_pos
-            end_index = begin_pos + num
-            search_key = search.lower()
-
-            # 遍历快照，而不是 self._meta_data
-            for k, v in all_items_snapshot:
-                if search_key in k.lower() and v.get("id") != 0:
-                    total_count += 1
-                    if start_index <= current_index < end_index:
-                        page_metas.append({
-                            "key": k,
-                            "meta": {
-                                "id": v.get("id"),
-                                "title": v.get("title"),
-                                "year": v.get("year"),
-                                "media_type": v.get("type").value,
-                                "poster_path": v.get("poster_path"),
-                                "backdrop_path": v.get("backdrop_path")
-                            }
-                        })
-                    current_index += 1
-
+        for row in rows:
+            item = self.__to_item(row)
+            page_metas.append({
+                "key": row["KEY"],
+                "meta": {
+                    "id": item.get("id"),
+                    "title": item.get("title"),
+                    "year": item.get("year"),
+                    "media_type": item.get("type").value if item.get("type") else None,
+                    "poster_path": item.get("poster_path"),
+                    "backdrop_path": item.get("backdrop_path")
+                }
+            })
         return total_count, page_metas
 
     def delete_meta_data(self, key):
         """
         删除缓存信息
         """
-        # pop 是原子操作，无需锁
-        return self._meta_data.pop(key, None)
+        return self.__execute("DELETE FROM META_DATA WHERE KEY = ?", (key,)) > 0
 
     def delete_meta_data_by_tmdbid(self, tmdbid):
         """
         清空对应TMDBID的所有缓存记录
         """
-        # 使用 list(keys) 创建键的副本进行遍历，防止遍历时删除报错
-        for key in list(self._meta_data.keys()):
-            # 为了防止 key 在此时被删，使用 .get 安全获取
-            item = self._meta_data.get(key)
-            if item and str(item.get("id")) == str(tmdbid):
-                self._meta_data.pop(key, None)
+        self.__execute("DELETE FROM META_DATA WHERE TMDBID = ?", (str(tmdbid),))
 
     def delete_unknown_meta(self):
         """
         清除未识别的缓存记录
         """
-        # 同样使用 list(keys) 创建副本
-        for key in list(self._meta_data.keys()):
-            item = self._meta_data.get(key)
-            if item and str(item.get("id")) == '0':
-                self._meta_data.pop(key, None)
+        self.__execute("DELETE FROM META_DATA WHERE TMDBID = '0'")
 
     def modify_meta_data(self, key, title):
         """
         修改缓存信息
         """
-        if self._meta_data.get(key):
-            self._meta_data[key]['title'] = title
-            self._meta_data[key][CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-        return self._meta_data.get(key)
-
-    @staticmethod
-    def __load_meta_data(path):
-        """
-        从文件中加载缓存
-        """
-        try:
-            if os.path.exists(path):
-                with open(path, 'rb') as f:
-                    data = pickle.load(f)
-                return data
-            return {}
-        except Exception as e:
-            log.exception("从文件中加载缓存: ")
-            return {}
+        self.__execute("UPDATE META_DATA SET TITLE = ?, EXPIRE_AT = ? WHERE KEY = ?",
+                       (title, int(time.time()) + EXPIRE_TIMESTAMP, key))
+        row = self.__fetchone("SELECT * FROM META_DATA WHERE KEY = ?", (key,))
+        return self.__to_item(row) if row else None
 
     def update_meta_data(self, meta_data):
         """
-        新增或更新缓存条目
+        新增缓存条目，已存在的条目不覆盖
         """
         if not meta_data:
             return
-        # 字典的 update 并不完全保证并发时的原子性（如果是大批量），但逐个赋值是安全的
-        # 这里为了保持逻辑一致，直接遍历
+        expire_at = int(time.time()) + EXPIRE_TIMESTAMP
+        rows = []
         for key, item in meta_data.items():
-            if not self._meta_data.get(key):
-                item[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                self._meta_data[key] = item
-            else:
-                # 原始逻辑里，如果 exist 就不更新整个 item，这里保持原逻辑
-                pass
+            item[CACHE_EXPIRE_TIMESTAMP_STR] = expire_at
+            rows.append(self.__to_row(key, item))
+        with self._lock:
+            self.conn.executemany(self.__upsert_sql(), rows)
 
     def save_meta_data(self, force=False):
         """
-        保存缓存数据到文件
-        """
-        # 加载旧数据用于比对
-        old_meta_data_on_disk = self.__load_meta_data(self._meta_path)
-        
-        # 使用 copy() 创建当前内存数据的副本
-        # 这样在后续筛选和 pickle.dump 时，即使主 _meta_data 发生变化也不会崩溃
-        current_data_snapshot = self._meta_data.copy()
-        
-        # 基于副本进行过滤
-        new_meta_data = {k: v for k, v in current_data_snapshot.items() if str(v.get("id")) != '0'}
-
-        # 对比逻辑保持不变
-        if not force \
-                and not self._random_sample(new_meta_data) \
-                and old_meta_data_on_disk.keys() == new_meta_data.keys():
-            return
-
-        with open(self._meta_path, 'wb') as f:
-            # 这里的 pickle.dump 操作的是 new_meta_data（局部变量），完全线程安全
-            pickle.dump(new_meta_data, f, pickle.HIGHEST_PROTOCOL)
-
-    def _random_sample(self, new_meta_data):
-        """
-        采样分析是否需要保存
-        注意：传入的 new_meta_data 必须是局部变量副本，否则 pop 操作会影响缓存
-        """
-        ret = False
-        # 获取 keys 列表副本
-        all_keys = list(new_meta_data.keys())
-        
-        if len(new_meta_data) < 25:
-            for k in all_keys:
-                info = new_meta_data.get(k)
-                if not info: continue 
-                
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k, None)
-        else:
-            count = 0
-            # random.sample 是安全的
-            keys = random.sample(all_keys, 25)
-            for k in keys:
-                info = new_meta_data.get(k)
-                if not info: continue
-
-                expire = info.get(CACHE_EXPIRE_TIMESTAMP_STR)
-                if not expire:
-                    ret = True
-                    info[CACHE_EXPIRE_TIMESTAMP_STR] = int(time.time()) + EXPIRE_TIMESTAMP
-                elif int(time.time()) >= expire:
-                    ret = True
-                    if self._tmdb_cache_expire:
-                        new_meta_data.pop(k, None)
-                        count += 1
-            if count >= 5:
-                # 递归调用
-                ret |= self._random_sample(new_meta_data)
-        return ret
+        定时维护缓存：按过期时间清理条目并回写WAL日志
+        数据已在变更时增量写入，无需整体保存
+        """
+        with self._lock:
+            if self._tmdb_cache_expire:
+                self.conn.execute("DELETE FROM META_DATA WHERE EXPIRE_AT < ?", (int(time.time()),))
+            self.conn.execute("PRAGMA wal_checkpoint(%s)" % ("TRUNCATE" if force else "PASSIVE"))
 
     def get_cache_title(self, key):
         """
         获取缓存的标题
         """
-        cache_media_info = self._meta_data.get(key)
-        if not cache_media_info or not cache_media_info.get("id"):
+        row = self.__fetchone("SELECT TMDBID, TITLE FROM META_DATA WHERE KEY = ?", (key,))
+        if not row or row["TMDBID"] == '0':
             return None
-        return cache_media_info.get("title")
+        return row["TITLE"]
 
     def set_cache_title(self, key, cn_title):
         """
         重新设置缓存标题
         """
-        cache_media_info = self._meta_data.get(key)
-        if not cache_media_info:
-            return
-        self._meta_data[key]['title'] = cn_title
\ No newline at end of file
+        self.__execute("UPDATE META_DATA SET TITLE = ? WHERE KEY = ?", (cn_title, key))
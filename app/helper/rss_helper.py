@@ -1,19 +1,28 @@
-import xml.dom.minidom
+import re
+import threading
 
+from io import BytesIO
 from urllib.parse import urljoin
+from cachetools import LRUCache
 from lxml import etree
 
 from app.db.main_db import MainDb, DbPersist
 from app.db.models import RSSTORRENTS
-from app.utils import RssTitleUtils, StringUtils, RequestUtils, DomUtils, SiteUtils
+from app.utils import RssTitleUtils, StringUtils, RequestUtils, SiteUtils
 
 from config import Config
 
 import log
 
+# 单次IN查询的链接数量，低于SQLite变量数限制
+ENCLOSURE_QUERY_CHUNK = 500
+
 
 class RssHelper:
     _db = MainDb()
+    # 已处理过的下载链接，命中时无需再查询数据库
+    _rssd_cache = LRUCache(maxsize=50000)
+    _rssd_lock = threading.Lock()
 
     """
       RSS帮助类，解析RSS报文、获取RSS地址等
@@ -271,92 +280,162 @@ class RssHelper:
 
 
     @staticmethod
-    def parse_rssxml(url, proxy=False):
+    def parse_rssxml(url, proxy=False, timeout=None, limit=None, since=None):
         """
         解析RSS订阅URL，获取RSS中的种子信息
         :param url: RSS地址
         :param proxy: 是否使用代理
+        :param timeout: 请求超时时间（秒）
+        :param limit: 最多解析的条目数
+        :param since: 发布时间不晚于该时间（datetime）的条目不再解析，RSS按时间倒序时可跳过已处理部分
         :return: 种子信息列表，如为None代表Rss过期
         """
-        _special_title_sites = {
-            'pt.keepfrds.com': RssTitleUtils.keepfriends_title
-        }
-
         _rss_expired_msg = [
             "RSS 链接已过期, 您需要获得一个新的!",
             "RSS Link has expired, You need to get a new one!"
         ]
 
-        # 开始处理
-        ret_array = []
         if not url:
             return []
-        site_domain = SiteUtils.get_url_domain(url)
         try:
-            ret = RequestUtils(proxies=Config().get_proxies() if proxy else None).get_res(url)
+            ret = RequestUtils(proxies=Config().get_proxies() if proxy else None, timeout=timeout).get_res(url)
             if not ret:
                 return []
-            ret.encoding = ret.apparent_encoding
         except Exception as e2:
             log.exception("解析RSS订阅URL异常: ")
             return []
-        if ret:
-            ret_xml = ret.text
+        site_domain = SiteUtils.get_url_domain(url)
+        content = ret.content
+        # 优先使用XML声明的编码，其次是响应头中的编码，都没有时由解析器按UTF-8处理
+        encoding = None if RssHelper.__get_prolog_encoding(content) \
+            else RssHelper.__get_header_encoding(ret.headers.get("Content-Type"))
+        ret_array = []
+        try:
+            for article in RssHelper.iter_rssxml(content, encoding=encoding, site_domain=site_domain,
+                                                 limit=limit, since=since):
+                ret_array.append(article)
+        except etree.XMLSyntaxError:
+            if ret_array:
+                log.warn(f"【Rss】{site_domain} RSS报文不完整，已解析 {len(ret_array)} 条")
+                return ret_array
+            # 声明的编码不正确时，检测编码后重新解析
+            ret_text = content.decode(ret.apparent_encoding or "utf-8", errors="replace")
+            # RSS过期 观众RSS 链接已过期，您需要获得一个新的！  pthome RSS Link has expired, You need to get a new one!
+            if ret_text.strip() in _rss_expired_msg:
+                return None
             try:
-                # 解析XML
-                dom_tree = xml.dom.minidom.parseString(ret_xml)
-                rootNode = dom_tree.documentElement
-                items = rootNode.getElementsByTagName("item")
-                for item in items:
-                    try:
-                        # 标题
-                        title = DomUtils.tag_value(item, "title", default="")
-                        if not title:
-                            continue
-                        # 标题特殊处理
-                        if site_domain and site_domain in _special_title_sites:
-                            title = _special_title_sites.get(site_domain)(title)
-                        # 描述
-                        description = DomUtils.tag_value(item, "description", default="")
-                        # 种子页面
-                        link = DomUtils.tag_value(item, "link", default="")
-                        # 种子链接
-                        enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
-                        if not enclosure and not link:
-                            continue
-                        # 部分RSS只有link没有enclosure
-                        if not enclosure and link:
-                            enclosure = link
-                            link = None
-                        # 大小
-                        size = DomUtils.tag_value(item, "enclosure", "length", default=0)
-                        if size and str(size).isdigit():
-                            size = int(size)
-                        else:
-                            size = 0
-                        # 发布日期
-                        pubdate = DomUtils.tag_value(item, "pubDate", default="")
-                        if pubdate:
-                            # 转换为时间
-                            pubdate = StringUtils.get_time_stamp(pubdate)
-                        # 返回对象
-                        tmp_dict = {'title': title,
-                                    'enclosure': enclosure,
-                                    'size': size,
-                                    'description': description,
-                                    'link': link,
-                                    'pubdate': pubdate}
-                        ret_array.append(tmp_dict)
-                    except Exception as e1:
-                        log.exception("RSS订阅结果解析异常: ")
-                        continue
+                ret_array = list(RssHelper.iter_rssxml(ret_text.encode("utf-8"), encoding="utf-8",
+                                                       site_domain=site_domain, limit=limit, since=since))
             except Exception as e2:
-                # RSS过期 观众RSS 链接已过期，您需要获得一个新的！  pthome RSS Link has expired, You need to get a new one!
-                if ret_xml in _rss_expired_msg:
-                    return None
                 log.exception("RSS解析异常: ")
+        except Exception as e2:
+            log.exception("RSS解析异常: ")
         return ret_array
 
+    @staticmethod
+    def iter_rssxml(content, encoding=None, site_domain=None, limit=None, since=None):
+        """
+        流式解析RSS报文，每解析完一个item即返回，并释放已处理的节点
+        :param content: RSS报文（bytes）
+        :param encoding: 强制使用的编码，为空时按XML声明处理
+        :param site_domain: 站点域名，用于标题特殊处理
+        :param limit: 最多解析的条目数
+        :param since: 发布时间不晚于该时间（datetime）时停止解析
+        :return: 种子信息生成器
+        """
+        _special_title_sites = {
+            'pt.keepfrds.com': RssTitleUtils.keepfriends_title
+        }
+        since_ts = since.timestamp() if since else None
+        count = 0
+        for _, item in etree.iterparse(BytesIO(content), events=("end",), encoding=encoding,
+                                       recover=False, huge_tree=True, resolve_entities=False):
+            # 按本地名称匹配，兼容带命名空间的item（如RSS 1.0/RDF）
+            if not isinstance(item.tag, str) or etree.QName(item).localname != "item":
+                continue
+            try:
+                # 标题
+                title = RssHelper.__tag_value(item, "title", default="")
+                if not title:
+                    continue
+                # 标题特殊处理
+                if site_domain and site_domain in _special_title_sites:
+                    title = _special_title_sites.get(site_domain)(title)
+                # 描述
+                description = RssHelper.__tag_value(item, "description", default="")
+                # 种子页面
+                link = RssHelper.__tag_value(item, "link", default="")
+                # 种子链接
+                enclosure = RssHelper.__tag_value(item, "enclosure", "url", default="")
+                if not enclosure and not link:
+                    continue
+                # 部分RSS只有link没有enclosure
+                if not enclosure and link:
+                    enclosure = link
+                    link = None
+                # 大小
+                size = RssHelper.__tag_value(item, "enclosure", "length", default=0)
+                if size and str(size).isdigit():
+                    size = int(size)
+                else:
+                    size = 0
+                # 发布日期
+                pubdate = RssHelper.__tag_value(item, "pubDate", default="")
+                if pubdate:
+                    # 转换为时间
+                    pubdate = StringUtils.get_time_stamp(pubdate)
+                    # 已处理过的时间范围，停止解析
+                    if since_ts and pubdate and pubdate.timestamp() <= since_ts:
+                        break
+                # 返回对象
+                yield {'title': title,
+                       'enclosure': enclosure,
+                       'size': size,
+                       'description': description,
+                       'link': link,
+                       'pubdate': pubdate}
+                count += 1
+                if limit and count >= limit:
+                    break
+            except Exception as e1:
+                log.exception("RSS订阅结果解析异常: ")
+                continue
+            finally:
+                # 释放已处理的节点
+                item.clear()
+                while item.getprevious() is not None:
+                    del item.getparent()[0]
+
+    @staticmethod
+    def __tag_value(item, tag_name, attname="", default=None):
+        """
+        获取节点下第一个指定标签的文本或属性值，按本地名称匹配，忽略命名空间
+        """
+        tag = item.find(".//{*}%s" % tag_name)
+        if tag is None:
+            return default
+        if attname:
+            return tag.get(attname) or default
+        return tag.text or default
+
+    @staticmethod
+    def __get_prolog_encoding(content):
+        """
+        获取XML声明中的编码
+        """
+        match = re.match(rb'^\s*(?:\xef\xbb\xbf)?<\?xml[^>]*encoding=["\']([\w.:-]+)["\']', content[:200])
+        return match.group(1).decode() if match else None
+
+    @staticmethod
+    def __get_header_encoding(content_type):
+        """
+        获取响应头中声明的编码
+        """
+        if not content_type:
+            return None
+        match = re.search(r'charset=["\']?([\w.:-]+)', content_type, re.IGNORECASE)
+        return match.group(1) if match else None
+
     @DbPersist(_db)
     def insert_rss_torrents(self, media_info):
         """
@@ -365,7 +444,7 @@ class RssHelper:
         self._db.insert(
             RSSTORRENTS(
                 TORRENT_NAME=media_info.org_string,
-                ENCLOSURE=media_info.enclosure,
+                ENCLOSURE=self.__normalize_enclosure(media_info.enclosure),
                 TYPE=media_info.type.value,
                 TITLE=media_info.title,
                 YEAR=media_info.year,
@@ -373,16 +452,62 @@ class RssHelper:
                 EPISODE=media_info.get_episode_string()
             ))
 
+    @DbPersist(_db)
+    def insert_rss_torrents_batch(self, media_infos: list):
+        """
+        将一批RSS记录一次性插入数据库
+        """
+        if not media_infos:
+            return
+        self._db.bulk_insert(RSSTORRENTS, [{
+            "TORRENT_NAME": media_info.org_string,
+            "ENCLOSURE": self.__normalize_enclosure(media_info.enclosure),
+            "TYPE": media_info.type.value,
+            "TITLE": media_info.title,
+            "YEAR": media_info.year,
+            "SEASON": media_info.get_season_string(),
+            "EPISODE": media_info.get_episode_string()
+        } for media_info in media_infos])
+
+    @staticmethod
+    def __normalize_enclosure(enclosure):
+        """
+        规范化下载链接，作为查重的KEY
+        """
+        return str(enclosure).strip() if enclosure else None
+
+    def get_unrssd_enclosures(self, enclosures):
+        """
+        批量查询未处理过的下载链接，先查内存缓存，剩余的一次性查询数据库
+        :param enclosures: 下载链接列表
+        :return: 未处理过的下载链接集合（原始值）
+        """
+        keys = {}
+        for enclosure in enclosures or []:
+            key = self.__normalize_enclosure(enclosure)
+            if key:
+                keys.setdefault(key, []).append(enclosure)
+        with self._rssd_lock:
+            unknown = [key for key in keys if key not in self._rssd_cache]
+        if not unknown:
+            return set()
+        rssd = set()
+        for i in range(0, len(unknown), ENCLOSURE_QUERY_CHUNK):
+            chunk = unknown[i:i + ENCLOSURE_QUERY_CHUNK]
+            rssd.update(row[0] for row in self._db.query(RSSTORRENTS.ENCLOSURE).filter(
+                RSSTORRENTS.ENCLOSURE.in_(chunk)).distinct())
+        with self._rssd_lock:
+            for key in rssd:
+                self._rssd_cache[key] = True
+        return {enclosure for key in unknown if key not in rssd for enclosure in keys[key]}
+
     def is_rssd_by_enclosure(self, enclosure):
         """
         查询RSS是否处理过，根据下载链接
         """
         if not enclosure:
             return True
-        if self._db.query(RSSTORRENTS).filter(RSSTORRENTS.ENCLOSURE == enclosure).count() > 0:
-            return True
-        else:
-            return False
+        return not self.get_unrssd_enclosures([enclosure])
 
     def is_rssd_by_simple(self, torrent_name, enclosure):
         """
@@ -391,9 +516,8 @@ class RssHelper:
         if not torrent_name and not enclosure:
             return True
         if enclosure:
-            ret = self._db.query(RSSTORRENTS).filter(RSSTORRENTS.ENCLOSURE == enclosure).count()
-        else:
-            ret = self._db.query(RSSTORRENTS).filter(RSSTORRENTS.TORRENT_NAME == torrent_name).count()
+            return not self.get_unrssd_enclosures([enclosure])
+        ret = self._db.query(RSSTORRENTS).filter(RSSTORRENTS.TORRENT_NAME == torrent_name).count()
         return True if ret > 0 else False
 
     @DbPersist(_db)
@@ -404,7 +528,7 @@ class RssHelper:
         self._db.insert(
             RSSTORRENTS(
                 TORRENT_NAME=title,
-                ENCLOSURE=enclosure
+                ENCLOSURE=self.__normalize_enclosure(enclosure)
             ))
 
     @DbPersist(_db)
@@ -415,8 +539,13 @@ class RssHelper:
         if enclosure:
             self._db.query(RSSTORRENTS).filter(RSSTORRENTS.TORRENT_NAME == title,
                                                RSSTORRENTS.ENCLOSURE == enclosure).delete()
+            with self._rssd_lock:
+                self._rssd_cache.pop(self.__normalize_enclosure(enclosure), None)
         else:
             self._db.query(RSSTORRENTS).filter(RSSTORRENTS.TORRENT_NAME == title).delete()
+            # 无法确定删除了哪些链接，整体失效
+            with self._rssd_lock:
+                self._rssd_cache.clear()
 
     @DbPersist(_db)
     def truncate_rss_history(self):
@@ -424,3 +553,5 @@ class RssHelper:
         清空RSS历史记录
         """
         self._db.query(RSSTORRENTS).delete()
+        with self._rssd_lock:
+            self._rssd_cache.clear()
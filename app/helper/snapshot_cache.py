@@ -0,0 +1,159 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import log
+from app.utils.commons import singleton
+
+# 后台刷新线程数
+SNAPSHOT_WORKERS = 2
+# 首次加载时等待其它线程加载完成的最长时间（秒）
+SNAPSHOT_WAIT_TIMEOUT = 30
+# 刷新失败（出错或返回空数据）后的重试间隔（秒）
+SNAPSHOT_RETRY_INTERVAL = 30
+# 连续返回空数据达到该次数后才认为数据确实为空
+SNAPSHOT_EMPTY_ACCEPT = 3
+
+
+class _Snapshot(object):
+    """
+    单项数据快照
+    """
+    __slots__ = ("loader", "interval", "value", "loaded_at", "next_at", "empty_count", "stale", "refreshing",
+                 "loaded")
+
+    def __init__(self, loader, interval):
+        self.loader = loader
+        self.interval = interval
+        self.value = None
+        self.loaded_at = 0
+        # 下次刷新时间
+        self.next_at = 0
+        # 连续返回空数据的次数
+        self.empty_count = 0
+        self.stale = False
+        self.refreshing = False
+        # 首次加载完成事件
+        self.loaded = threading.Event()
+
+
+@singleton
+class SnapshotCache(object):
+    """
+    后台刷新的数据快照缓存
+    查询时直接返回上次的数据，过期或被通知失效后在后台刷新，同一项数据同时只有一个刷新任务，
+    刷新出错或返回空数据时保留上次的数据并提前重试；只有首次查询需要等待加载
+    """
+    _lock = threading.Lock()
+    _snapshots = {}
+    _executor = None
+
+    def __init__(self):
+        self._snapshots = {}
+        self._executor = ThreadPoolExecutor(max_workers=SNAPSHOT_WORKERS,
+                                            thread_name_prefix="snapshot")
+
+    def register(self, key, loader, interval):
+        """
+        注册数据项，已注册时不重复注册
+        :param key: 数据项标识
+        :param loader: 加载函数
+        :param interval: 刷新间隔（秒）
+        """
+        with self._lock:
+            if key not in self._snapshots:
+                self._snapshots[key] = _Snapshot(loader=loader, interval=interval)
+
+    def get(self, key):
+        """
+        查询数据，未注册时返回None
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if not snapshot:
+                return None
+            if snapshot.loaded.is_set():
+                if snapshot.stale or time.monotonic() >= snapshot.next_at:
+                    self.__schedule(key, snapshot)
+                return snapshot.value
+            # 首次加载，其它线程正在加载时等待其结果
+            load_now = not snapshot.refreshing
+            snapshot.refreshing = True
+        if load_now:
+            self.__refresh(key, snapshot)
+        else:
+            snapshot.loaded.wait(SNAPSHOT_WAIT_TIMEOUT)
+        return snapshot.value
+
+    def invalidate(self, *keys):
+        """
+        通知数据已变化，已加载过的数据项立即在后台刷新
+        """
+        with self._lock:
+            for key in keys:
+                snapshot = self._snapshots.get(key)
+                if not snapshot:
+                    continue
+                snapshot.stale = True
+                if snapshot.loaded.is_set():
+                    self.__schedule(key, snapshot)
+
+    def __schedule(self, key, snapshot):
+        """
+        提交后台刷新，需在锁内调用
+        """
+        if snapshot.refreshing:
+            return
+        snapshot.refreshing = True
+        self._executor.submit(self.__refresh, key, snapshot)
+
+    def __refresh(self, key, snapshot):
+        # 刷新过程中的失效通知需要再次刷新
+        with self._lock:
+            snapshot.stale = False
+        try:
+            value = snapshot.loader()
+        except Exception as e:
+            log.error(f"【Snapshot】刷新 {key} 出错，保留上次的数据：{str(e)}")
+            self.__retry_later(snapshot)
+            return
+        with self._lock:
+            # 加载函数出错时多返回空数据，已有数据时先保留，连续多次为空才更新
+            if not value and snapshot.value and snapshot.empty_count + 1 < SNAPSHOT_EMPTY_ACCEPT:
+                snapshot.empty_count += 1
+                empty = True
+            else:
+                snapshot.empty_count = 0
+                snapshot.value = value
+                snapshot.loaded_at = time.monotonic()
+                snapshot.next_at = snapshot.loaded_at + snapshot.interval
+                snapshot.refreshing = False
+                if snapshot.stale and snapshot.loaded.is_set():
+                    self.__schedule(key, snapshot)
+                empty = False
+        if empty:
+            log.warn(f"【Snapshot】刷新 {key} 返回空数据，保留上次的数据")
+            self.__retry_later(snapshot)
+            return
+        snapshot.loaded.set()
+
+    def __retry_later(self, snapshot):
+        """
+        刷新失败，保留上次的数据并在重试间隔后再次刷新
+        """
+        with self._lock:
+            snapshot.next_at = time.monotonic() + min(SNAPSHOT_RETRY_INTERVAL, snapshot.interval)
+            snapshot.refreshing = False
+        snapshot.loaded.set()
+
+    def stats(self):
+        """
+        缓存统计
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {getattr(key, "value", key): {
+                "age": round(now - snapshot.loaded_at, 1) if snapshot.loaded_at else None,
+                "stale": snapshot.stale,
+                "refreshing": snapshot.refreshing
+            } for key, snapshot in self._snapshots.items()}
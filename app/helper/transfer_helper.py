@@ -0,0 +1,155 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import log
+from app.utils.commons import singleton
+from app.utils.types import RmtMode
+
+# 同时处理的转移任务数
+TRANSFER_WORKERS = 4
+# 每个目的磁盘同时进行的复制/跨盘移动数
+COPY_PER_DEVICE = 2
+# 每个远程存储同时进行的上传数
+REMOTE_PER_TARGET = 2
+
+# 不占用磁盘IO的转移方式，不限制并发
+LINK_MODES = [RmtMode.LINK, RmtMode.SOFTLINK]
+RCLONE_MODES = [RmtMode.RCLONE, RmtMode.RCLONECOPY]
+MINIO_MODES = [RmtMode.MINIO, RmtMode.MINIOCOPY]
+
+
+@singleton
+class TransferLimiter(object):
+    """
+    文件转移并发控制
+    按路径加锁，避免同一文件被同时处理；复制按目的磁盘、Rclone/Minio按远程存储限制并发，硬链接/软链接不限制
+    """
+    _lock = threading.Lock()
+    _path_locks = {}
+    _slots = {}
+
+    def __init__(self):
+        self._path_locks = {}
+        self._slots = {}
+
+    @contextmanager
+    def path_lock(self, path):
+        """
+        路径锁，同一路径同一时间只有一个线程处理，不再使用时自动释放
+        """
+        key = os.path.normcase(os.path.normpath(str(path)))
+        with self._lock:
+            item = self._path_locks.get(key)
+            if not item:
+                item = self._path_locks[key] = [threading.RLock(), 0]
+            item[1] += 1
+        try:
+            with item[0]:
+                yield
+        finally:
+            with self._lock:
+                item[1] -= 1
+                if item[1] <= 0:
+                    self._path_locks.pop(key, None)
+
+    @staticmethod
+    def __get_device(path):
+        """
+        查询路径所在的磁盘，路径不存在时向上查找已存在的目录
+        """
+        path = os.path.abspath(path)
+        while not os.path.exists(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            return path
+
+    def __get_slot_key(self, rmt_mode, src, dest):
+        """
+        获取限制并发的分组，为None时不限制
+        """
+        if rmt_mode in LINK_MODES:
+            return None
+        if rmt_mode in RCLONE_MODES:
+            return "rclone:NASTOOL", REMOTE_PER_TARGET
+        if rmt_mode in MINIO_MODES:
+            return "minio:NASTOOL", REMOTE_PER_TARGET
+        dest_device = self.__get_device(dest)
+        # 同一磁盘内移动只是重命名
+        if rmt_mode == RmtMode.MOVE and self.__get_device(src) == dest_device:
+            return None
+        return f"device:{dest_device}", COPY_PER_DEVICE
+
+    @contextmanager
+    def slot(self, rmt_mode, src, dest):
+        """
+        占用一个转移并发名额
+        """
+        slot_key = self.__get_slot_key(rmt_mode, src, dest)
+        if not slot_key:
+            yield
+            return
+        key, limit = slot_key
+        with self._lock:
+            semaphore = self._slots.get(key)
+            if not semaphore:
+                semaphore = self._slots[key] = threading.BoundedSemaphore(limit)
+        with semaphore:
+            yield
+
+
+@singleton
+class TransferExecutor(object):
+    """
+    转移任务执行器
+    任务在线程池中并行处理，队列跨调度周期保留，已在队列或处理中的任务不会重复加入
+    """
+    _lock = threading.Lock()
+    _executor = None
+    _pending = {}
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=TRANSFER_WORKERS,
+                                            thread_name_prefix="transfer")
+        self._pending = {}
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        加入转移任务
+        :param key: 任务唯一标识
+        :return: 是否为新加入的任务
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending[key] = self._executor.submit(self.__run, key, func, args, kwargs)
+        return True
+
+    def __run(self, key, func, args, kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            log.exception(f"【Rmt】转移任务 {key} 处理出错：{str(e)}")
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def is_pending(self, key):
+        """
+        任务是否在队列或处理中
+        """
+        with self._lock:
+            return key in self._pending
+
+    def pending_count(self):
+        """
+        队列及处理中的任务数
+        """
+        with self._lock:
+            return len(self._pending)
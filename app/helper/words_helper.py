@@ -9,11 +9,62 @@ from app.utils.string_utils import StringUtils
 import log
 
 
+# 集数偏移中匹配集数的字符
+EPISODE_NUM_CHARS = "[0-9一二三四五六七八九十]+"
+
+
+class CompiledWord(object):
+    """
+    预编译的自定义识别词
+    """
+    __slots__ = ("wtype", "regex", "replaced", "replace", "front", "back", "offset",
+                 "replaced_re", "front_re", "back_re", "episode_re", "trigger")
+
+    def __init__(self, word_info):
+        self.wtype = word_info.TYPE
+        self.regex = bool(word_info.REGEX)
+        self.replaced = word_info.REPLACED
+        self.replace = word_info.REPLACE
+        self.front = word_info.FRONT
+        self.back = word_info.BACK
+        self.offset = word_info.OFFSET
+        self.replaced_re = self.front_re = self.back_re = self.episode_re = None
+        # 可能命中该识别词的必要条件（正则表达式），为空代表任何标题都可能命中
+        self.trigger = None
+        match self.wtype:
+            case 1 | 2:
+                if self.regex:
+                    self.replaced_re = re.compile(r'%s' % self.replaced)
+                    self.trigger = self.replaced
+                else:
+                    self.trigger = re.escape(self.replaced)
+            case 3:
+                self.replaced_re = re.compile(r'%s' % self.replaced)
+                self.trigger = self.replaced
+                self.__compile_offset()
+            case 4:
+                self.__compile_offset()
+                self.trigger = self.front or self.back
+
+    def __compile_offset(self):
+        if self.front:
+            self.front_re = re.compile(r'%s' % self.front)
+        if self.back:
+            self.back_re = re.compile(r'%s' % self.back)
+        self.episode_re = re.compile(r'(?<=%s.*?)%s(?=.*?%s)' % (self.front, EPISODE_NUM_CHARS, self.back))
+
+
 @singleton
 class WordsHelper:
     dbhelper = None
     # 识别词
     words_info = []
+    # 识别词版本，每次重新加载时递增，用于识别结果缓存失效
+    version = 0
+    # 预编译的识别词，顺序与words_info一致
+    _compiled_words = []
+    # 所有识别词命中条件的合并正则，标题不匹配时无需逐条处理
+    _trigger_re = None
 
     def __init__(self):
         self.init_config()
@@ -21,6 +72,41 @@ class WordsHelper:
     def init_config(self):
         self.dbhelper = DbHelper()
         self.words_info = self.dbhelper.get_custom_words(enabled=1)
+        self.__compile_words()
+        self.version += 1
+
+    def __compile_words(self):
+        """
+        预编译识别词，只在识别词变化时执行
+        """
+        compiled_words = []
+        triggers = []
+        always = False
+        for word_info in self.words_info:
+            if word_info.TYPE not in (1, 2, 3, 4):
+                continue
+            try:
+                word = CompiledWord(word_info)
+            except Exception as err:
+                log.warn(f"【Meta】自定义识别词 {word_info.REPLACED or ''} "
+                         f"{word_info.FRONT or ''} {word_info.BACK or ''} 格式有误：{str(err)}")
+                continue
+            compiled_words.append(word)
+            # 反向引用在合并后分组序号会变化，此类识别词无法预过滤
+            if word.trigger and not re.search(r'\\[1-9]|\(\?P=|\\g<', word.trigger):
+                triggers.append(word.trigger)
+            else:
+                always = True
+        trigger_re = None
+        if triggers and not always:
+            try:
+                trigger_re = re.compile("|".join("(?:%s)" % trigger for trigger in triggers))
+            except Exception as err:
+                # 含反向引用等无法合并的表达式时不做预过滤
+                log.debug(f"【Meta】自定义识别词无法合并预过滤：{str(err)}")
+                trigger_re = None
+        self._compiled_words = compiled_words
+        self._trigger_re = trigger_re if not always else None
 
     def process(self, title):
         # 应用屏蔽
@@ -29,66 +115,81 @@ class WordsHelper:
         used_replaced_words = []
         # 应用集偏移
         used_offset_words = []
+        used_info = {"ignored": used_ignored_words, "replaced": used_replaced_words, "offset": used_offset_words}
+        compiled_words = self._compiled_words
+        if not compiled_words or not title:
+            return title, used_info
+        # 所有识别词都不可能命中
+        trigger_re = self._trigger_re
+        if trigger_re is not None and not trigger_re.search(title):
+            return title, used_info
         # 应用识别词
-        for word_info in self.words_info:
-            match word_info.TYPE:
+        for word in compiled_words:
+            match word.wtype:
                 case 1:
                     # 屏蔽
-                    ignored = word_info.REPLACED
-                    ignored_word = ignored
-                    title, ignore_msg, ignore_flag = self.replace_regex(title, ignored, "") \
-                        if word_info.REGEX else self.replace_noregex(title, ignored, "")
+                    title, ignore_flag = self.__apply_replace(word, title, "")
                     if ignore_flag:
-                        used_ignored_words.append(ignored_word)
-                    elif ignore_msg:
-                        log.warn(f"【Meta】自定义屏蔽词 {ignored_word} 设置有误：{ignore_msg}")
+                        used_ignored_words.append(word.replaced)
                 case 2:
                     # 替换
-                    replaced, replace = word_info.REPLACED, word_info.REPLACE
-                    replaced_word = f"{replaced} ⇒ {replace}"
-                    title, replace_msg, replace_flag = self.replace_regex(title, replaced, replace) \
-                        if word_info.REGEX else self.replace_noregex(title, replaced, replace)
+                    title, replace_flag = self.__apply_replace(word, title, word.replace)
                     if replace_flag:
-                        used_replaced_words.append(replaced_word)
-                    elif replace_msg:
-                        log.warn(f"【Meta】自定义替换词 {replaced_word} 格式有误：{replace_msg}")
-
+                        used_replaced_words.append(f"{word.replaced} ⇒ {word.replace}")
                 case 3:
                     # 替换+集偏移
-                    replaced, replace, front, back, offset = \
-                        word_info.REPLACED, word_info.REPLACE, word_info.FRONT, word_info.BACK, word_info.OFFSET
-                    replaced_word = f"{replaced} ⇒ {replace}"
-                    offset_word = f"{front} + {back} >> {offset}"
-                    replaced_offset_word = f"{replaced_word} @@@ {offset_word}"
                     # 记录替换前title
                     title_cache = title
-                    # 替换
-                    title, replace_msg, replace_flag = self.replace_regex(title, replaced, replace)
+                    title, replace_flag = self.__apply_replace(word, title, word.replace)
                     # 替换应用成功进行集数偏移
                     if replace_flag:
-                        title, offset_msg, offset_flag = self.episode_offset(title, front, back, offset)
+                        title, offset_msg, offset_flag = self.__apply_offset(word, title)
                         # 集数偏移应用成功
                         if offset_flag:
-                            used_replaced_words.append(replaced_word)
-                            used_offset_words.append(offset_word)
+                            used_replaced_words.append(f"{word.replaced} ⇒ {word.replace}")
+                            used_offset_words.append(f"{word.front} + {word.back} >> {word.offset}")
                         elif offset_msg:
                             # 还原title
                             title = title_cache
-                            log.warn(f"【Meta】自定义替换+集偏移词 {replaced_offset_word} 集偏移部分格式有误：{offset_msg}")
-                    elif replace_msg:
-                        log.warn(f"【Meta】自定义替换+集偏移词 {replaced_offset_word} 替换部分格式有误：{replace_msg}")
+                            log.warn(f"【Meta】自定义替换+集偏移词 {word.replaced} ⇒ {word.replace} @@@ "
+                                     f"{word.front} + {word.back} >> {word.offset} 集偏移部分格式有误：{offset_msg}")
                 case 4:
                     # 集数偏移
-                    front, back, offset = word_info.FRONT, word_info.BACK, word_info.OFFSET
-                    offset_word = f"{front} + {back} >> {offset}"
-                    title, offset_msg, offset_flag = self.episode_offset(title, front, back, offset)
+                    title, offset_msg, offset_flag = self.__apply_offset(word, title)
                     if offset_flag:
-                        used_offset_words.append(offset_word)
+                        used_offset_words.append(f"{word.front} + {word.back} >> {word.offset}")
                     elif offset_msg:
-                        log.warn(f"【Meta】自定义集偏移词 {offset_word} 格式有误：{offset_msg}")
-                case _:
-                    pass
-        return title, {"ignored": used_ignored_words, "replaced": used_replaced_words, "offset": used_offset_words}
+                        log.warn(f"【Meta】自定义集偏移词 {word.front} + {word.back} >> {word.offset} "
+                                 f"格式有误：{offset_msg}")
+        return title, used_info
+
+    @staticmethod
+    def __apply_replace(word: CompiledWord, title, replace) -> Tuple[str, bool]:
+        """
+        应用屏蔽/替换
+        """
+        if word.replaced_re is None:
+            if title.find(word.replaced) == -1:
+                return title, False
+            return title.replace(word.replaced, replace), True
+        try:
+            title, count = word.replaced_re.subn(r'%s' % replace, title)
+            return title, count > 0
+        except Exception as err:
+            log.warn(f"【Meta】自定义识别词 {word.replaced} ⇒ {replace} 格式有误：{str(err)}")
+            return title, False
+
+    def __apply_offset(self, word: CompiledWord, title) -> Tuple[str, str, bool]:
+        """
+        应用集数偏移
+        """
+        if word.back_re and not word.back_re.search(title):
+            return title, "", False
+        if word.front_re and not word.front_re.search(title):
+            return title, "", False
+        if not word.episode_re.search(title):
+            return title, "", False
+        return self.episode_offset(title, word.front, word.back, word.offset)
 
     @staticmethod
     def replace_regex(title, replaced, replace) -> Tuple[str, str, bool]:
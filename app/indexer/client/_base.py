@@ -6,6 +6,8 @@ from typing import List, Optional
 
 import log
 
+from app.indexer.collector import SearchResultCollector
+from app.indexer.tmdb_matcher import TmdbMatchPool
 from app.modules.filter import Filter
 from app.media import Media
 from app.media.meta import MetaInfo
@@ -85,7 +87,7 @@ class _IIndexClient(metaclass=ABCMeta):
         """
 
         filter_time = datetime.datetime.now()
-        ret_array = []
+        collector = SearchResultCollector()
         index_sucess = 0
         index_rule_fail = 0
         index_match_fail = 0
@@ -100,6 +102,8 @@ class _IIndexClient(metaclass=ABCMeta):
         # 关键过滤参数解析
         target_years, target_names = self.build_filter_factor(target_tmdb_info, mtype, search_key_word)
 
+        # 第一阶段：解析名称、规则过滤，需要识别的资源提交到识别池
+        candidates = []
         for item in result_array:
             # 名称
             torrent_name = item.get('title')
@@ -166,12 +170,22 @@ class _IIndexClient(metaclass=ABCMeta):
                 index_rule_fail += 1
                 continue
 
+            # 需要识别的先提交到识别池，所有结果解析完成后再统一收取
+            pending = None
+            if search_media:
+                pending = self.start_tmdb_match(item_meta, search_media, target_years, target_names, indexer)
+            candidates.append((item_meta, res_order, pending, torrent_name, description, enclosure, size,
+                               seeders, peers, page_url, uploadvolumefactor, downloadvolumefactor))
+
+        # 第二阶段：收取识别结果并完成过滤
+        for item_meta, res_order, pending, torrent_name, description, enclosure, size, \
+                seeders, peers, page_url, uploadvolumefactor, downloadvolumefactor in candidates:
             # 识别媒体信息
             if not search_media:
                 # 不过滤
                 media_info = item_meta
             else:
-                media_info = self.match_tmdb_info_and_simple_filter(item_meta, search_media, target_years, target_names, indexer)
+                media_info = self.finish_tmdb_match(item_meta, search_media, pending, indexer)
                 if not media_info:
                     index_error += 1
                     continue
@@ -240,9 +254,8 @@ class _IIndexClient(metaclass=ABCMeta):
                                         page_url=page_url,
                                         upload_volume_factor=uploadvolumefactor,
                                         download_volume_factor=downloadvolumefactor)
-            if media_info not in ret_array:
+            if collector.add(media_info):
                 index_sucess += 1
-                ret_array.append(media_info)
             else:
                 index_rule_fail += 1
 
@@ -256,7 +269,7 @@ class _IIndexClient(metaclass=ABCMeta):
         if SearchType.WEB == in_from:
             self.update_process(task_id, text=text_info)
 
-        return ret_array
+        return collector.get_results()
     
 
     def build_filter_factor(self, target_tmdb_info, mtype, search_key_word):
@@ -324,6 +337,14 @@ class _IIndexClient(metaclass=ABCMeta):
         """
         匹配tmdb信息并进行基础过滤
         """
+        pending = self.start_tmdb_match(item_meta, search_media, target_years, target_names, indexer)
+        return self.finish_tmdb_match(item_meta, search_media, pending, indexer)
+
+    def start_tmdb_match(self, item_meta:MetaInfo, search_media:MetaInfo, target_years: List[str], target_names: List[str], indexer):
+        """
+        匹配tmdb信息第一步：能直接判定的直接返回结果，否则将识别请求提交到识别池
+        :return: (直接判定的结果, 识别关键字, 识别Future)，Future为空时以直接判定的结果为准
+        """
         media = Media()
 
         # 0-识别并模糊匹配；1-识别并精确匹配
@@ -331,24 +352,24 @@ class _IIndexClient(metaclass=ABCMeta):
                 and search_media.imdb_id \
                 and str(item_meta.imdb_id) == str(search_media.imdb_id):
             # IMDBID匹配，合并媒体数据
-            return media.merge_media_info(item_meta, search_media)
+            return media.merge_media_info(item_meta, search_media), None, None
 
         # 查询缓存
         cache_info = media.get_cache_info(item_meta)
         if str(cache_info.get("id")) == str(search_media.tmdb_id):
             # 缓存匹配，合并媒体数据
-            return media.merge_media_info(item_meta, search_media)
+            return media.merge_media_info(item_meta, search_media), None, None
         
         # 年份不匹配, 直接跳过
         if target_years and item_meta.year:
             # 年份不匹配
             if item_meta.year not in target_years:
                 log.warn("【%s】[%s] %s 资源年份不匹配", self.client_name, indexer.name,item_meta.get_name())
-                return None
+                return None, None, None
             
             # 名称、年份 都匹配时，不再额外请求tmdb进行比对
             if self.is_result_item_name_match(target_names, item_meta):
-                return media.merge_media_info(item_meta, search_media)
+                return media.merge_media_info(item_meta, search_media), None, None
 
         # 识别搜索结果的tmdb信息
         search_kw = item_meta.get_name()
@@ -357,20 +378,31 @@ class _IIndexClient(metaclass=ABCMeta):
         if not item_meta.year and en_name and en_name != search_kw:
             search_kw = '{} {}'.format(search_kw, en_name)
 
+        # 提交到识别池，相同的识别请求只查询一次
+        future = TmdbMatchPool().submit(search_kw,
+                                        item_meta.type,
+                                        item_meta.year,
+                                        item_meta.begin_season,
+                                        chinese=StringUtils.contain_chinese(search_kw))
+        return None, search_kw, future
+
+    def finish_tmdb_match(self, item_meta:MetaInfo, search_media:MetaInfo, pending, indexer):
+        """
+        匹配tmdb信息第二步：收取识别结果并比对TMDBID
+        """
+        media_info, search_kw, future = pending
+        if not future:
+            return media_info
+
         # 查询tmdb数据
-        file_tmdb_info = media.query_tmdb_info(search_kw,
-                                               item_meta.type,
-                                               item_meta.year,
-                                               item_meta.begin_season,
-                                               append_to_response=None,
-                                               chinese=StringUtils.contain_chinese(search_kw))
+        file_tmdb_info = TmdbMatchPool.result(future)
         # 查询失败
         if not file_tmdb_info:
             log.warn("【%s】[%s] %s 识别媒体信息出错！", self.client_name, indexer.name, search_kw)
             return None
         
         # 资源匹配，合并媒体数据
-        target_info = media.merge_media_info(item_meta, search_media)
+        target_info = Media().merge_media_info(item_meta, search_media)
 
         # TMDBID是否匹配
         if str(file_tmdb_info.id) != str(search_media.tmdb_id):
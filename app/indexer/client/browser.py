@@ -1,5 +1,12 @@
 import os
+import queue
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+import psutil
 import log
 
 from config import Config
@@ -8,6 +15,18 @@ from typing import Callable, Any
 from playwright.sync_api import sync_playwright, Page
 
 from app.helper.cloudflare_helper import under_challenge
+from app.utils.commons import singleton
+
+# 常驻浏览器数量，即同时进行的页面操作数，可通过 laboratory.browser_pool_size 调整
+BROWSER_POOL_SIZE = 2
+# 站点上下文使用次数上限，超过后重建，可通过 laboratory.browser_context_max_uses 调整
+BROWSER_CONTEXT_MAX_USES = 50
+# 浏览器进程占用内存上限（MB），超过后重启浏览器，可通过 laboratory.browser_memory_limit 调整
+BROWSER_MEMORY_LIMIT = 1024
+# 每个浏览器保留的站点上下文数量，超过后关闭最久未使用的
+BROWSER_CONTEXT_MAX = 8
+# 浏览器空闲超过该时间（秒）后关闭，下次使用时重新启动
+BROWSER_IDLE_TIMEOUT = 1800
 
 
 class WaitElement:
@@ -20,6 +39,302 @@ class WaitElement:
         self.state = _state
 
 
+class _BrowserJob(object):
+    """
+    页面操作任务
+    """
+    __slots__ = ("url", "handler", "cookies", "ua", "proxy", "headless", "browser_type", "future")
+
+    def __init__(self, url, handler, cookies, ua, proxy, headless, browser_type):
+        self.url = url
+        self.handler = handler
+        self.cookies = cookies
+        self.ua = ua
+        self.proxy = proxy
+        self.headless = headless
+        self.browser_type = browser_type
+        self.future = Future()
+
+
+class _BrowserWorker(threading.Thread):
+    """
+    浏览器工作线程
+    Playwright同步接口只能在创建它的线程中使用，因此浏览器及上下文都由工作线程持有，页面操作在工作线程中执行
+    """
+    # 启动Playwright时用于识别新建的驱动进程
+    _start_lock = threading.Lock()
+
+    def __init__(self, pool, index):
+        super().__init__(name=f"browser-pool-{index}", daemon=True)
+        self._pool = pool
+        self._playwright = None
+        self._driver = None
+        # (浏览器类型, 无头模式) -> Browser
+        self._browsers = {}
+        # (浏览器类型, 无头模式, 站点, UA, 代理) -> [BrowserContext, 使用次数]
+        self._contexts = OrderedDict()
+        self.busy = False
+
+    def run(self):
+        while True:
+            try:
+                job = self._pool.jobs.get(timeout=BROWSER_IDLE_TIMEOUT)
+            except queue.Empty:
+                if self._playwright:
+                    log.info(f"【Browser】{self.name} 空闲，关闭浏览器")
+                    self.__shutdown()
+                continue
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            self.busy = True
+            try:
+                job.future.set_result(self.execute(job))
+            except Exception as e:
+                job.future.set_exception(e)
+            finally:
+                self.busy = False
+        self.__shutdown()
+
+    def execute(self, job):
+        """
+        在站点上下文中打开页面并执行操作
+        """
+        url_info = urlparse(job.url)
+        site = f"{url_info.scheme}://{url_info.netloc}"
+        key = (job.browser_type, job.headless, site, job.ua, job.proxy)
+        context = self.__get_context(key)
+        if job.cookies:
+            context.add_cookies(self.__parse_cookies(job.cookies, site))
+        page = context.new_page()
+        try:
+            return job.handler(page)
+        finally:
+            try:
+                page.close()
+            except Exception as e:
+                log.debug(f"【Browser】关闭页面出错：{str(e)}")
+            self.__release_context(key)
+
+    @staticmethod
+    def __parse_cookies(cookies, site):
+        """
+        解析cookie字符串，只按第一个等号拆分，值中可能包含等号
+        """
+        items = []
+        for cookie in cookies.split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name:
+                items.append({"name": name.strip(), "value": value.strip(), "url": site})
+        return items
+
+    def __start(self):
+        with self._start_lock:
+            children = {p.pid for p in psutil.Process().children()}
+            self._playwright = sync_playwright().start()
+            drivers = [p for p in psutil.Process().children() if p.pid not in children]
+            self._driver = drivers[0] if drivers else None
+
+    def __get_browser(self, browser_type, headless):
+        if not self._playwright:
+            self.__start()
+        browser = self._browsers.get((browser_type, headless))
+        if browser and browser.is_connected():
+            return browser
+        if browser:
+            # 浏览器已退出，丢弃其上下文
+            log.warn(f"【Browser】{self.name} 浏览器已断开，重新启动")
+            self.__close_contexts(browser_type, headless)
+        browser = self._playwright[browser_type].launch(headless=headless)
+        self._browsers[(browser_type, headless)] = browser
+        return browser
+
+    def __get_context(self, key):
+        browser_type, headless, _, ua, proxy = key
+        browser = self.__get_browser(browser_type, headless)
+        item = self._contexts.get(key)
+        if item:
+            self._contexts.move_to_end(key)
+            return item[0]
+        context = browser.new_context(user_agent=ua, proxy={'server': proxy} if proxy else None)
+        self._contexts[key] = [context, 0]
+        while len(self._contexts) > BROWSER_CONTEXT_MAX:
+            _, (expired, _) = self._contexts.popitem(last=False)
+            self.__close(expired)
+        return context
+
+    def __release_context(self, key):
+        """
+        累计上下文使用次数，达到上限或浏览器内存超限时回收
+        """
+        item = self._contexts.get(key)
+        if item:
+            item[1] += 1
+            if item[1] >= self._pool.context_max_uses:
+                self._contexts.pop(key, None)
+                self.__close(item[0])
+        memory = self.__get_memory()
+        if memory > self._pool.memory_limit:
+            log.info(f"【Browser】{self.name} 浏览器占用内存 {round(memory / 1024 / 1024)}MB 超过上限，重新启动")
+            self.__close_browsers()
+
+    def __get_memory(self):
+        """
+        浏览器进程占用的内存
+        """
+        if not self._driver:
+            return 0
+        memory = 0
+        try:
+            for process in self._driver.children(recursive=True):
+                try:
+                    memory += process.memory_info().rss
+                except psutil.Error:
+                    continue
+        except psutil.Error:
+            return 0
+        return memory
+
+    def __close_contexts(self, browser_type, headless):
+        for key in [key for key in self._contexts if key[:2] == (browser_type, headless)]:
+            context, _ = self._contexts.pop(key)
+            self.__close(context)
+
+    def __close_browsers(self):
+        for context, _ in self._contexts.values():
+            self.__close(context)
+        self._contexts.clear()
+        for browser in self._browsers.values():
+            self.__close(browser)
+        self._browsers.clear()
+
+    def __shutdown(self):
+        self.__close_browsers()
+        if self._playwright:
+            try:
+                self._playwright.stop()
+            except Exception as e:
+                log.debug(f"【Browser】关闭Playwright出错：{str(e)}")
+        self._playwright = None
+        self._driver = None
+
+    @staticmethod
+    def __close(obj):
+        try:
+            obj.close()
+        except Exception as e:
+            log.debug(f"【Browser】关闭浏览器出错：{str(e)}")
+
+
+@singleton
+class BrowserPool(object):
+    """
+    常驻浏览器池
+    保持若干个已启动的浏览器，按 站点、UA、代理 复用浏览器上下文（Cookie等随之保留），避免每次操作都重新启动浏览器；
+    同时进行的页面操作数不超过浏览器数量，上下文使用一定次数或浏览器内存超限后回收，并统计各站点的页面加载耗时
+    """
+    _lock = threading.Lock()
+    _workers = []
+    # 站点 -> 页面加载统计
+    _timings = {}
+
+    jobs = None
+    context_max_uses = BROWSER_CONTEXT_MAX_USES
+    memory_limit = BROWSER_MEMORY_LIMIT * 1024 * 1024
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self._workers = []
+        self._timings = {}
+
+    def __start_workers(self):
+        with self._lock:
+            if self._workers:
+                return
+            laboratory = Config().get_config('laboratory') or {}
+            try:
+                pool_size = max(int(laboratory.get('browser_pool_size') or BROWSER_POOL_SIZE), 1)
+                self.context_max_uses = int(laboratory.get('browser_context_max_uses') or BROWSER_CONTEXT_MAX_USES)
+                self.memory_limit = int(laboratory.get('browser_memory_limit') or BROWSER_MEMORY_LIMIT) * 1024 * 1024
+            except (TypeError, ValueError):
+                pool_size = BROWSER_POOL_SIZE
+            for index in range(pool_size):
+                worker = _BrowserWorker(self, index)
+                worker.start()
+                self._workers.append(worker)
+
+    def run(self,
+            url: str,
+            handler: Callable[[Page], Any],
+            cookies: str = None,
+            ua: str = None,
+            proxy: str = None,
+            headless: bool = True,
+            browser_type: str = "chromium") -> Any:
+        """
+        在浏览器池中打开页面并执行操作，浏览器都在使用中时排队等待
+        :param url: 网页地址，用于确定站点上下文
+        :param handler: 页面操作函数，接收page对象，在浏览器线程中执行
+        :param cookies: cookies
+        :param ua: user-agent
+        :param proxy: 代理地址
+        :param headless: 是否无头模式
+        :param browser_type: 浏览器类型
+        :return: 页面操作函数的返回值，出错时抛出异常
+        """
+        job = _BrowserJob(url=url, handler=handler, cookies=cookies, ua=ua, proxy=proxy,
+                          headless=headless, browser_type=browser_type)
+        current = threading.current_thread()
+        if isinstance(current, _BrowserWorker):
+            # 页面操作中再次打开页面，直接在当前浏览器线程中执行，避免等待自己
+            return current.execute(job)
+        self.__start_workers()
+        self.jobs.put(job)
+        return job.future.result()
+
+    def record_timing(self, url, elapsed):
+        """
+        记录页面加载耗时
+        """
+        site = urlparse(url).netloc
+        with self._lock:
+            timing = self._timings.get(site)
+            if timing is None:
+                timing = self._timings[site] = {"count": 0, "total": 0, "max": 0}
+            timing["count"] += 1
+            timing["total"] += elapsed
+            timing["max"] = max(timing["max"], elapsed)
+
+    def stop_service(self):
+        """
+        关闭浏览器池
+        """
+        with self._lock:
+            workers = self._workers
+            self._workers = []
+        for _ in workers:
+            self.jobs.put(None)
+        for worker in workers:
+            worker.join(timeout=10)
+
+    def stats(self):
+        """
+        浏览器池状态及各站点的平均、最大页面加载耗时（毫秒）
+        """
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "busy": len([worker for worker in self._workers if worker.busy]),
+                "queued": self.jobs.qsize(),
+                "pages": {site: {
+                    "count": timing["count"],
+                    "avg_ms": round(timing["total"] * 1000 / timing["count"]),
+                    "max_ms": round(timing["max"] * 1000)
+                } for site, timing in self._timings.items()}
+            }
+
+
 class PlaywrightHelper:
 
     def __init__(self, browser_type="chromium"):
@@ -44,38 +359,34 @@ class PlaywrightHelper:
         :param headless: 是否无头模式
         :param timeout: 超时时间
         """
+        def __page_handler(page: Page):
+            log.info(f'[Playwright] 开始访问 {url}')
+            started = time.monotonic()
+            page.goto(url)
+
+            if under_challenge(page.content()):
+                log.warn("cloudflare 防护中.....")
+                return callback(page)
+
+            # 等待页面自动跳转
+            if wait_item and wait_item.element and wait_item.state:
+                page.wait_for_selector(wait_item.element, state=wait_item.state, timeout=timeout * 1000)
+
+            # 等待网络空闲，即没有HTTP请求正在进行
+            page.wait_for_load_state("networkidle", timeout=timeout * 1000)
+            BrowserPool().record_timing(url, time.monotonic() - started)
+
+            # 回调函数
+            return callback(page)
+
         try:
-            proxies={
-                'server': Config().get_proxies().get('http')
-            } if proxy else None
-
-            with sync_playwright() as playwright:
-                browser = playwright[self.browser_type].launch(headless=headless)
-                context = browser.new_context(user_agent=ua, proxy=proxies)
-                page = context.new_page()
-                if cookies:
-                    page.set_extra_http_headers({"cookie": cookies}) 
-                try:
-                    log.info(f'[Playwright] 开始访问 {url}')
-                    page.goto(url)
-
-                    if under_challenge(page.content()):
-                        log.warn("cloudflare 防护中.....")
-                        return callback(page)
-
-                    # 等待页面自动跳转
-                    if wait_item and wait_item.element and wait_item.state:
-                        page.wait_for_selector(wait_item.element, state=wait_item.state, timeout=timeout * 1000)
-
-                    # 等待网络空闲，即没有HTTP请求正在进行
-                    page.wait_for_load_state("networkidle", timeout=timeout * 1000)
-
-                    # 回调函数
-                    return callback(page)
-                except Exception as e:
-                    log.error(f"网页操作失败: {str(e)}")
-                finally:
-                    browser.close()
+            return BrowserPool().run(url=url,
+                                     handler=__page_handler,
+                                     cookies=cookies,
+                                     ua=ua,
+                                     proxy=Config().get_proxies().get('http') if proxy else None,
+                                     headless=headless,
+                                     browser_type=self.browser_type)
         except Exception as e:
             log.error(f"网页操作失败: {str(e)}")
         return None
@@ -124,60 +435,51 @@ class PlaywrightHelper:
         :param save_path: 文件保存目录
         :param save_name: 文件名
         """
-        try:
-            proxies={
-                'server': Config().get_proxies().get('http')
-            } if proxy else None
-            
-            with sync_playwright() as playwright:
-                browser = playwright[self.browser_type].launch(headless=headless, downloads_path=save_path)
-                context = browser.new_context(user_agent=ua, proxy=proxies)
-                page = context.new_page()
-
-                if cookies:
-                    page.set_extra_http_headers({"cookie": cookies})
+        def __download_handler(page: Page):
+            # 监听下载事件
+            def handle_download(download):
+                # 设置保存路径
+                save_folder = save_path or os.getcwd()
+                target_path = os.path.join(save_folder, download.suggested_filename)
+                # 文件重复下载
+                if os.path.exists(target_path):
+                    timestamp = time.strftime("%Y%m%d%H%M%S")
+                    name, ext = os.path.splitext(download.suggested_filename)
+                    target_path = os.path.join(save_folder, f"{name}_{timestamp}{ext}")
+                download.save_as(target_path)
+                setattr(download, 'save_path', target_path)
 
-                try:
-                                       
-                    # 监听下载事件
-                    def handle_download(download):
-                        # 设置保存路径
-                        save_folder = save_path or os.getcwd()
-                        target_path = os.path.join(save_folder, download.suggested_filename)
-                        # 文件重复下载
-                        if os.path.exists(target_path):
-                            timestamp = time.strftime("%Y%m%d%H%M%S")
-                            name, ext = os.path.splitext(download.suggested_filename)
-                            target_path = os.path.join(save_folder, f"{name}_{timestamp}{ext}")
-                        download.save_as(target_path)
-                        setattr(download, 'save_path', target_path)
-
-                    # 绑定下载事件
-                    page.on("download", handle_download)
-                    # 访问 URL，开始下载
-                    with page.expect_download() as download_info:
-                        page.goto(url, wait_until="networkidle", timeout=timeout * 1000)
-
-                    download = download_info.value                  
-                        
-                    # 检查下载是否失败
-                    if download:
-                        if download.failure():
-                            log.warn(f"Download failed: {download_info.failure}")
-                            return None
-                        return download.save_path
+            # 绑定下载事件
+            page.on("download", handle_download)
+            # 访问 URL，开始下载
+            started = time.monotonic()
+            with page.expect_download() as download_info:
+                page.goto(url, wait_until="networkidle", timeout=timeout * 1000)
+            BrowserPool().record_timing(url, time.monotonic() - started)
 
+            download = download_info.value
+
+            # 检查下载是否失败
+            if download:
+                if download.failure():
+                    log.warn(f"Download failed: {download_info.failure}")
                     return None
-                except Exception as e:
-                    log.error(f"Playwright下载文件失败: {str(e)}")
-                    return None
-                finally:
-                    browser.close()
+                return download.save_path
+
+            return None
+
+        try:
+            return BrowserPool().run(url=url,
+                                     handler=__download_handler,
+                                     cookies=cookies,
+                                     ua=ua,
+                                     proxy=Config().get_proxies().get('http') if proxy else None,
+                                     headless=headless,
+                                     browser_type=self.browser_type)
         except Exception as e:
-            log.error(f"Playwright下载失败: {str(e)}")
+            log.error(f"Playwright下载文件失败: {str(e)}")
             return None
-        
-    
+
     def initiate_download(self, page, url, timeout):
         # 启动下载并等待完成
         with page.expect_download(timeout=timeout * 1000) as download_info:
@@ -0,0 +1,83 @@
+import regex as re
+
+from typing import Dict, List, Optional
+
+from app.media.meta.metainfo import MetaInfo
+
+
+class SearchResultCollector(object):
+    """
+    搜索结果收集器
+    按种子指纹去重，同一资源被多个索引器/关键字命中时只保留优先级最高的一条
+    """
+
+    def __init__(self):
+        self._results: Dict[tuple, MetaInfo] = {}
+        self._duplicates = 0
+
+    @staticmethod
+    def fingerprint(media_info: MetaInfo) -> Optional[tuple]:
+        """
+        生成种子指纹：优先使用下载链接，没有链接时使用 标准化名称+大小+站点
+        """
+        enclosure = (media_info.enclosure or "").strip()
+        if enclosure:
+            return "enclosure", enclosure
+        title = re.sub(r"[\W_]+", "", str(media_info.org_string or "")).lower()
+        if not title:
+            return None
+        return "title", title, int(media_info.size or 0), media_info.site
+
+    @staticmethod
+    def _rank(media_info: MetaInfo) -> tuple:
+        """
+        重复资源的取舍顺序：站点优先级 > 资源优先级 > 做种数
+        """
+        return (int(media_info.site_order or 0),
+                int(media_info.res_order or 0),
+                int(media_info.seeders or 0))
+
+    def add(self, media_info: MetaInfo) -> bool:
+        """
+        加入一条结果，返回是否为新资源
+        """
+        key = self.fingerprint(media_info)
+        if key is None:
+            key = ("object", id(media_info))
+        exists = self._results.get(key)
+        if exists is None:
+            self._results[key] = media_info
+            return True
+        self._duplicates += 1
+        if exists is not media_info and self._rank(media_info) > self._rank(exists):
+            self._results[key] = media_info
+        return False
+
+    def merge(self, media_infos: List[MetaInfo]):
+        """
+        合并其它索引器的结果
+        """
+        for media_info in media_infos or []:
+            self.add(media_info)
+
+    @property
+    def duplicates(self) -> int:
+        return self._duplicates
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, media_info: MetaInfo):
+        return self.fingerprint(media_info) in self._results
+
+    def get_results(self) -> List[MetaInfo]:
+        """
+        按收集顺序返回去重后的结果
+        """
+        return list(self._results.values())
+
+    def get_sorted_results(self) -> List[MetaInfo]:
+        """
+        按排序字符倒序返回去重后的结果，最优资源在前
+        """
+        return sorted(self._results.values(), key=lambda x: x.get_sort_str(), reverse=True)
@@ -7,6 +7,7 @@ from typing import List, Optional
 import log
 
 from app.indexer.client.builtin import BuiltinIndexer
+from app.indexer.collector import SearchResultCollector
 from app.models.model import IndexerInfo
 from app.media import Media
 from app.media.meta._base import MetaBase
@@ -100,7 +101,7 @@ class Indexer(object):
                             sp_state: 为UL DL，* 代表不关心，
         :param match_media: 需要匹配的媒体信息
         :param in_from: 搜索渠道
-        :return: 命中的资源媒体信息列表
+        :return: 命中的资源媒体信息列表，已去重并按优先级倒序排列
         """
         if not key_word:
             return []
@@ -138,7 +139,8 @@ class Indexer(object):
         # 设置进度参数
         self._client.set_step_fator(int(30 / len(search_indexers)))
 
-        ret_array = exec_search_by_threads(self._client, search_indexers, key_word, filter_args, match_media, in_from, task_id)
+        collector = exec_search_by_threads(self._client, search_indexers, key_word, filter_args, match_media, in_from, task_id)
+        ret_array = collector.get_sorted_results()
 
         # ret_array = []
         # cpu_cores = max(1, multiprocessing.cpu_count() - 2)
@@ -164,7 +166,7 @@ class Indexer(object):
         
         # 计算耗时
         end_time = datetime.datetime.now()
-        txt_summary = f'所有站点搜索完成，有效资源数：{len(ret_array)} , 总耗时 {(end_time - start_time).seconds} 秒'            
+        txt_summary = f'所有站点搜索完成，有效资源数：{len(ret_array)}，重复：{collector.duplicates}，总耗时 {(end_time - start_time).seconds} 秒'            
         log.info(f"【{self._client_type.value}】{txt_summary}")
         # 页面搜索, 更新进度
         if SearchType.WEB == in_from:
@@ -193,11 +195,11 @@ def exec_search_by_threads(client_instance: BuiltinIndexer,
                            filter_args: dict,
                            match_media: Optional[MetaBase]=None,
                            in_from: Optional[SearchType]=None,
-                           task_id: Optional[str]=None):
+                           task_id: Optional[str]=None) -> SearchResultCollector:
     """
-    接收一组索引器，使用线程池并发执行
+    接收一组索引器，使用线程池并发执行，结果按种子指纹合并
     """
-    process_results = []
+    collector = SearchResultCollector()
     all_tasks = []
 
     def get_media_en_name(media_info: MetaBase):
@@ -241,8 +243,8 @@ def exec_search_by_threads(client_instance: BuiltinIndexer,
             try:
                 result = future.result()
                 if result:
-                    process_results.extend(result) # 聚合当前进程内所有线程的结果
+                    collector.merge(result) # 聚合当前进程内所有线程的结果
             except Exception as e:
                 log.error("【Indexer】搜索结果处理失败 %s", str(e))
                 
-    return process_results
\ No newline at end of file
+    return collector
\ No newline at end of file
@@ -0,0 +1,104 @@
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cachetools import TTLCache
+
+import log
+
+from app.media import Media
+from app.utils.commons import singleton
+
+# 同时查询TMDB的最大线程数，所有索引器共用
+TMDB_MATCH_WORKERS = 8
+# 识别结果在内存中保留的时间（秒），覆盖一次完整搜索即可
+TMDB_MATCH_TTL = 600
+# 等待单个识别结果的最长时间（秒）
+TMDB_MATCH_TIMEOUT = 60
+
+
+@singleton
+class TmdbMatchPool(object):
+    """
+    搜索结果TMDB识别池
+    相同 名称/类型/年份/季 的识别请求只查询一次，正在查询中的请求直接复用，
+    查询线程数有上限，避免多个索引器同时识别时打满TMDB接口配额
+    """
+    _lock = threading.Lock()
+    _executor = None
+    _inflight = {}
+    _results = None
+
+    _requests = 0
+    _coalesced = 0
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=TMDB_MATCH_WORKERS,
+                                            thread_name_prefix="tmdb-match")
+        self._inflight = {}
+        self._results = TTLCache(maxsize=4096, ttl=TMDB_MATCH_TTL)
+
+    def submit(self, name, mtype, year=None, begin_season=None, chinese=True) -> Future:
+        """
+        提交识别请求，返回Future，结果为TMDB信息或None
+        """
+        key = (name, mtype, year, begin_season, chinese)
+        with self._lock:
+            self._requests += 1
+            if key in self._results:
+                self._coalesced += 1
+                future = Future()
+                future.set_result(self._results[key])
+                return future
+            future = self._inflight.get(key)
+            if future:
+                self._coalesced += 1
+                return future
+            future = self._executor.submit(self.__query, key)
+            self._inflight[key] = future
+        return future
+
+    def __query(self, key):
+        name, mtype, year, begin_season, chinese = key
+        try:
+            tmdb_info = Media().query_tmdb_info(name,
+                                                mtype,
+                                                year,
+                                                begin_season,
+                                                append_to_response=None,
+                                                chinese=chinese)
+        except Exception as e:
+            log.error("【Indexer】%s 识别媒体信息出错：%s", name, str(e))
+            # 出错的结果不缓存，下次搜索时重新识别
+            with self._lock:
+                self._inflight.pop(key, None)
+            return None
+        with self._lock:
+            # 查询失败时返回None，不缓存；未找到时返回空字典，可以缓存
+            if tmdb_info is not None:
+                self._results[key] = tmdb_info
+            self._inflight.pop(key, None)
+        return tmdb_info
+
+    @staticmethod
+    def result(future: Future):
+        """
+        获取识别结果，超时或出错时返回None
+        """
+        try:
+            return future.result(timeout=TMDB_MATCH_TIMEOUT)
+        except Exception as e:
+            log.warn("【Indexer】等待媒体识别结果失败：%s", str(e))
+            return None
+
+    def stats(self):
+        """
+        识别请求统计
+        """
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "coalesced": self._coalesced,
+                "inflight": len(self._inflight),
+                "cached": len(self._results)
+            }
@@ -9,6 +9,8 @@ class CustomizationMatcher(object):
     """
     customization = None
     custom_separator = None
+    # 配置版本，变更时递增，用于识别结果缓存失效
+    version = 0
 
     def __init__(self):
         self.customization = None
@@ -42,3 +44,4 @@ class CustomizationMatcher(object):
         """
         self.customization = customization
         self.custom_separator = separator
+        self.version += 1
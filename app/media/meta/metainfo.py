@@ -1,10 +1,16 @@
+import copy
 import os.path
+import threading
+
 import regex as re
 
 import anitopy
 
+from cachetools import LRUCache
+
 from app.conf import ModuleConf
 from app.helper import WordsHelper
+from app.media.meta.customization import CustomizationMatcher
 from app.media.meta.metaanime import MetaAnime
 from app.media.meta.metavideo import MetaVideo
 from app.utils import StringUtils, ReleaseGroupsMatcher, MediaUtils
@@ -15,16 +21,80 @@ from app.utils.types import MediaType
 NAME_NOSTRING_RE = r"高清影视之家发布|连载|日剧|美剧|电视剧|动画片|动漫|欧美|西德|日韩|超高清|高清|蓝光|翡翠台|梦幻天堂·龙网|★?\d?\+?\d*月?新?番★?|[日美国][漫剧]" \
                    r"|高码版|最终季|全集|合集|[多中国英葡法俄日韩德意西印泰台港粤双文语简繁体特效内封官译外挂]+[字|幕|配|音|轨]+|版本|出品|台版|港版|未删减版"
 
+# 识别结果缓存条数
+META_CACHE_SIZE = 4096
+
+_meta_cache = LRUCache(maxsize=META_CACHE_SIZE)
+_meta_cache_lock = threading.Lock()
+_meta_cache_stats = {"hits": 0, "misses": 0}
+
 
 def MetaInfo(title, subtitle=None, mtype=None, no_extra=False):
     """
     媒体整理入口，根据名称和副标题，判断是哪种类型的识别，返回对应对象
+    相同的标题会反复经过RSS、刷流、搜索等流程，解析结果按标题缓存，每次返回独立的副本
     :param title: 标题、种子名、文件名
     :param subtitle: 副标题、描述
     :param mtype: 指定识别类型，为空则自动识别类型
     :param mtype: 不包含除名称、季集、年份之外的其他信息
     :return: MetaAnime、MetaVideo
     """
+    if not title:
+        return _parse_meta_info(title, subtitle, mtype, no_extra)
+    # 识别词、制作组、自定义占位符变更后旧的结果自动失效
+    key = (title, subtitle, mtype, no_extra,
+           WordsHelper().version, ReleaseGroupsMatcher().version, CustomizationMatcher().version)
+    with _meta_cache_lock:
+        meta_info = _meta_cache.get(key)
+        if meta_info is not None:
+            _meta_cache_stats["hits"] += 1
+        else:
+            _meta_cache_stats["misses"] += 1
+    if meta_info is None:
+        meta_info = _parse_meta_info(title, subtitle, mtype, no_extra)
+        with _meta_cache_lock:
+            _meta_cache[key] = meta_info
+    return _copy_meta_info(meta_info)
+
+
+def _copy_meta_info(meta_info):
+    """
+    复制识别结果，容器类型的属性单独复制，调用方修改副本不影响缓存
+    """
+    meta_copy = copy.copy(meta_info)
+    for name, value in meta_copy.__dict__.items():
+        if isinstance(value, (list, dict, set)):
+            meta_copy.__dict__[name] = copy.copy(value)
+    return meta_copy
+
+
+def get_meta_cache_stats():
+    """
+    识别结果缓存命中统计
+    """
+    with _meta_cache_lock:
+        total = _meta_cache_stats["hits"] + _meta_cache_stats["misses"]
+        return {
+            "size": len(_meta_cache),
+            "maxsize": _meta_cache.maxsize,
+            "hits": _meta_cache_stats["hits"],
+            "misses": _meta_cache_stats["misses"],
+            "hit_rate": round(_meta_cache_stats["hits"] / total, 4) if total else 0
+        }
+
+
+def clear_meta_cache():
+    """
+    清空识别结果缓存
+    """
+    with _meta_cache_lock:
+        _meta_cache.clear()
+
+
+def _parse_meta_info(title, subtitle=None, mtype=None, no_extra=False):
+    """
+    解析标题，不使用缓存
+    """
 
     # 记录原始名称
     org_title = title
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Optional
+
+from app.utils.commons import singleton
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 缓存有效期（秒），按接口路径依次匹配，命中第一条即生效
+TTL_RULES = [
+    # 搜索结果变化较快
+    (re.compile(r"^/search/"), 6 * 3600),
+    # 榜单、发现等列表类接口
+    (re.compile(r"^/(trending|discover)/|/(popular|now_playing|upcoming|on_the_air|airing_today|top_rated|latest)$"),
+     3600),
+    # 外部ID查找
+    (re.compile(r"^/find/"), 24 * 3600),
+    # 类型列表基本不变
+    (re.compile(r"^/genre/"), 7 * 24 * 3600),
+    # 详情类接口
+    (re.compile(r"^/(movie|tv|person|collection)/\d+"), 3 * 24 * 3600),
+]
+DEFAULT_TTL = 24 * 3600
+
+
+@singleton
+class TMDbCache(object):
+    """
+    进程级TMDB响应缓存，所有TMDb实例共用
+    内存中按LRU淘汰，可选持久化到配置目录下的SQLite文件，重启后不必重新请求TMDB
+    """
+    _lock = threading.RLock()
+    _memory: OrderedDict = None
+    _maxsize = 2048
+
+    _persist = False
+    _db_path = None
+    _conn: Optional[sqlite3.Connection] = None
+
+    _hits = 0
+    _disk_hits = 0
+    _misses = 0
+    _evictions = 0
+
+    def __init__(self):
+        self._memory = OrderedDict()
+        self.init_config()
+
+    def init_config(self):
+        laboratory = Config().get_config('laboratory') or {}
+        self._persist = laboratory.get("tmdb_api_cache_persist", True)
+        self._maxsize = int(laboratory.get("tmdb_api_cache_size") or 2048)
+        self._db_path = os.path.join(Config().get_config_path(), 'tmdb_api.db')
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+            if self._persist:
+                self.__open_db()
+
+    def __open_db(self):
+        """
+        打开持久化存储并清理过期记录
+        """
+        try:
+            self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS TMDB_API_CACHE ("
+                               "KEY TEXT PRIMARY KEY, "
+                               "ACTION TEXT, "
+                               "VALUE TEXT, "
+                               "EXPIRE_AT INTEGER)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS INDX_TMDB_API_CACHE_EXPIRE "
+                               "ON TMDB_API_CACHE (EXPIRE_AT)")
+            self._conn.execute("DELETE FROM TMDB_API_CACHE WHERE EXPIRE_AT < ?", (int(time.time()),))
+        except Exception as e:
+            logger.error("TMDB缓存数据库打开失败：%s" % str(e))
+            self._conn = None
+
+    @staticmethod
+    def get_ttl(action):
+        """
+        按接口路径获取缓存有效期
+        """
+        for pattern, ttl in TTL_RULES:
+            if pattern.search(action):
+                return ttl
+        return DEFAULT_TTL
+
+    @staticmethod
+    def make_key(action, params, language):
+        """
+        生成缓存KEY，由接口、参数和语言组成
+        """
+        return hashlib.sha1(f"{action}|{params}|{language}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        查询缓存，内存未命中时查询持久化存储
+        缓存中保存的是序列化后的文本，每次返回新的对象，调用方修改不会污染缓存
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expire_at, text = entry
+                if expire_at > now:
+                    self._memory.move_to_end(key)
+                    self._hits += 1
+                    return json.loads(text)
+                self._memory.pop(key, None)
+                self._evictions += 1
+            if self._conn:
+                try:
+                    row = self._conn.execute("SELECT VALUE, EXPIRE_AT FROM TMDB_API_CACHE WHERE KEY = ?",
+                                             (key,)).fetchone()
+                except Exception as e:
+                    logger.error("TMDB缓存读取失败：%s" % str(e))
+                    row = None
+                if row and row[1] > now:
+                    self.__set_memory(key, row[0], row[1])
+                    self._disk_hits += 1
+                    return json.loads(row[0])
+            self._misses += 1
+        return None
+
+    def set(self, key, action, value):
+        """
+        写入缓存
+        """
+        if value is None:
+            return
+        expire_at = int(time.time()) + self.get_ttl(action)
+        text = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self.__set_memory(key, text, expire_at)
+            if self._conn:
+                try:
+                    self._conn.execute("INSERT OR REPLACE INTO TMDB_API_CACHE (KEY, ACTION, VALUE, EXPIRE_AT) "
+                                       "VALUES (?, ?, ?, ?)",
+                                       (key, action, text, expire_at))
+                except Exception as e:
+                    logger.error("TMDB缓存写入失败：%s" % str(e))
+
+    def __set_memory(self, key, text, expire_at):
+        self._memory[key] = (expire_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._maxsize:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._conn:
+                try:
+                    self._conn.execute("DELETE FROM TMDB_API_CACHE")
+                except Exception as e:
+                    logger.error("TMDB缓存清理失败：%s" % str(e))
+
+    def stats(self):
+        """
+        缓存命中统计
+        """
+        with self._lock:
+            total = self._hits + self._disk_hits + self._misses
+            return {
+                "size": len(self._memory),
+                "maxsize": self._maxsize,
+                "persist": bool(self._conn),
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round((self._hits + self._disk_hits) / total, 4) if total else 0
+            }
@@ -1,9 +1,8 @@
 # -*- coding: utf-8 -*-
 import logging
+import threading
 import time
 
-from cachetools import TTLCache, cachedmethod
-from operator import attrgetter
 from requests import Session, Response
 from typing import Dict, Optional
 from urllib3.util.retry import Retry
@@ -12,13 +11,21 @@ from app.models.model import SSLAdapter
 from config import Config
 
 from .as_obj import AsObj
+from .cache import TMDbCache
 from .exceptions import TMDbException
 
 logger = logging.getLogger(__name__)
 
+# 共享连接池的并发连接数
+POOL_MAXSIZE = 16
+
 
 class TMDb(object):
 
+    # 进程内所有实例共用的长连接会话
+    _shared_session : Optional[Session] = None
+    _shared_lock = threading.Lock()
+
     _session : Optional[Session] = None
 
     _proxies = {}
@@ -26,19 +33,13 @@ class TMDb(object):
     _domain = 'https://api.themoviedb.org/3'
     _api_key = ''
 
-    _cache : Optional[TTLCache] = None
     _debug = False
     _wait_on_rate_limit = False
 
-    def __init__(self, 
-                 session: Optional[Session] = None,
-                 cache_ttl: int = 3600,
-                 cache_size: int = 512,
-        ):
+    def __init__(self, session: Optional[Session] = None):
 
-        self._session = self._create_session() if session is None else session
+        self._session = self._get_shared_session() if session is None else session
 
-        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
         self._remaining = 40
         self._reset = None
         
@@ -66,7 +67,19 @@ class TMDb(object):
             self._proxies[key] = value
 
 
-    def _create_session(self) -> Session:
+    @classmethod
+    def _get_shared_session(cls) -> Session:
+        """
+        获取共享会话，首次使用时创建
+        """
+        if cls._shared_session is None:
+            with cls._shared_lock:
+                if cls._shared_session is None:
+                    TMDb._shared_session = cls._create_session()
+        return cls._shared_session
+
+    @staticmethod
+    def _create_session() -> Session:
 
         s = Session()
         s.trust_env = False
@@ -81,7 +94,7 @@ class TMDb(object):
             raise_on_status=False,
         )
 
-        adapter = SSLAdapter(pool_connections=1, pool_maxsize=1, max_retries=retry_strategy)
+        adapter = SSLAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=retry_strategy)
 
         s.mount("https://", adapter)
         s.mount("http://", adapter)
@@ -103,13 +116,9 @@ class TMDb(object):
         """
         实际请求方法
         """
-        headers = {}
-        if method.upper() == "GET":
-            headers["Connection"] = "close"
         resp = self._session.request(
             method,
             url,
-            headers=headers,
             data=data,
             proxies=self._proxies,
             timeout=(10, 20),
@@ -118,18 +127,12 @@ class TMDb(object):
         resp.raise_for_status()
         return resp
     
-    @cachedmethod(cache=attrgetter('_cache'),
-                  key=lambda self, method, url, data: (
-                      method.upper(),
-                      url,
-                      frozenset(data.items()) if data else None
-                    )
-                )
-    def _cache_request(self, method: str, url: str, data: Optional[Dict] = None) -> Response:
+    @staticmethod
+    def cache_stats() -> Dict:
         """
-        缓存请求
+        共享响应缓存的命中统计
         """
-        return self._do_request(method, url, data)
+        return TMDbCache().stats()
 
     def _call(self,
               action: str,
@@ -153,10 +156,16 @@ class TMDb(object):
         )
 
         use_cache = call_cached and method.upper() != "POST"
+        cache_key = None
         if use_cache:
-            req = self._cache_request(method, url, data)
-        else:
-            req = self._do_request(method, url, data)
+            cache_key = TMDbCache().make_key(action,
+                                             "%s&include_adult=%s" % (append_to_response, include_adult),
+                                             self._language)
+            json = TMDbCache().get(cache_key)
+            if json is not None:
+                return json
+
+        req = self._do_request(method, url, data)
 
         headers = req.headers
         if "X-RateLimit-Remaining" in headers:
@@ -187,5 +196,8 @@ class TMDb(object):
         if "errors" in json:
             raise TMDbException(json["errors"])
 
+        if use_cache and not ("success" in json and json["success"] is False):
+            TMDbCache().set(cache_key, action, json)
+
         return json
     
\ No newline at end of file
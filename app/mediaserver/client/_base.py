@@ -139,6 +139,43 @@ class _IMediaClient(metaclass=ABCMeta):
         """
         pass
 
+    def get_library_items(self, parent, since=None):
+        """
+        同步用：获取媒体库中的所有电影和剧集，默认逐级查询，支持分页批量查询的媒体服务器可覆盖
+        :param parent: 媒体库ID
+        :param since: 时间戳，只返回该时间之后有变化的项目
+        """
+        if since:
+            raise NotImplementedError(f"{self.client_name} 不支持增量同步")
+        return self.get_items(parent)
+
+    def get_library_item_ids(self, parent):
+        """
+        同步用：获取媒体库中所有电影和剧集的ID，用于比对已删除的项目
+        :param parent: 媒体库ID
+        """
+        return [item.get("id") for item in self.get_library_items(parent) if item and item.get("id")]
+
+    def get_sync_item(self, item_id):
+        """
+        同步用：查询单个电影或剧集的同步数据，不存在时返回None
+        :param item_id: 媒体的ID
+        """
+        return None
+
+    def get_item_library_ids(self, item_id):
+        """
+        同步用：查询电影或剧集所在的媒体库ID列表，无法查询时返回None
+        :param item_id: 媒体的ID
+        """
+        return None
+
+    def support_incremental_sync(self):
+        """
+        是否支持增量同步，支持时需实现get_library_items的since参数及get_sync_item
+        """
+        return False
+
     @abstractmethod
     def get_play_url(self, item_id):
         """
@@ -1,3 +1,4 @@
+import datetime
 import re
 from urllib.parse import quote
 
@@ -525,16 +526,7 @@ class Jellyfin(_IMediaClient):
                         continue
                     if result.get("Type") in ["Movie", "Series"]:
                         item_info = self.get_iteminfo(result.get("Id"))
-                        yield {"id": result.get("Id"),
-                               "library": item_info.get("ParentId"),
-                               "type": item_info.get("Type"),
-                               "title": item_info.get("Name"),
-                               "originalTitle": item_info.get("OriginalTitle"),
-                               "year": item_info.get("ProductionYear"),
-                               "tmdbid": item_info.get("ProviderIds", {}).get("Tmdb"),
-                               "imdbid": item_info.get("ProviderIds", {}).get("Imdb"),
-                               "path": item_info.get("Path"),
-                               "json": str(item_info)}
+                        yield self.__format_item(result.get("Id"), item_info)
                     elif "Folder" in result.get("Type"):
                         for item in self.get_items(result.get("Id")):
                             yield item
@@ -542,6 +534,119 @@ class Jellyfin(_IMediaClient):
             log.exception(f"【{self.client_name}】连接/Items出错: " + str(e))
         yield {}
 
+    @staticmethod
+    def __format_item(item_id, item_info):
+        """
+        转换为同步数据格式
+        """
+        return {"id": item_id,
+                "library": item_info.get("ParentId"),
+                "type": item_info.get("Type"),
+                "title": item_info.get("Name"),
+                "originalTitle": item_info.get("OriginalTitle"),
+                "year": item_info.get("ProductionYear"),
+                "tmdbid": (item_info.get("ProviderIds") or {}).get("Tmdb"),
+                "imdbid": (item_info.get("ProviderIds") or {}).get("Imdb"),
+                "path": item_info.get("Path"),
+                "json": str(item_info)}
+
+    def __get_items_page(self, parent, start_index, page_size, params):
+        """
+        分页查询媒体库项目
+        :return: 项目列表, 总数
+        """
+        req_url = "%sUsers/%s/Items?ParentId=%s&Recursive=true%s" \
+                  "&StartIndex=%s&Limit=%s&api_key=%s" % (
+                      self._host, self._user, parent, params, start_index, page_size, self._apikey)
+        try:
+            res = RequestUtils().get_res(req_url)
+            if not res or res.status_code != 200:
+                raise Exception(f"状态码：{res.status_code if res is not None else '无响应'}")
+            res_json = res.json()
+        except Exception as e:
+            log.exception(f"【{self.client_name}】分页获取媒体库项目出错: ")
+            raise
+        return res_json.get("Items") or [], res_json.get("TotalRecordCount") or 0
+
+    def __iter_items(self, parent, params, page_size=500):
+        """
+        遍历媒体库项目的所有分页
+        """
+        start_index = 0
+        while True:
+            items, total = self.__get_items_page(parent, start_index, page_size, params)
+            for item in items:
+                if item:
+                    yield item
+            start_index += len(items)
+            if not items or start_index >= total:
+                break
+
+    def get_library_items(self, parent, since=None):
+        """
+        分页获取媒体库中的所有电影和剧集，列表中直接返回所需字段，无需逐个查询详情
+        :param parent: 媒体库ID
+        :param since: 时间戳，只返回该时间之后有变化的项目，新增或变化的集按所属剧集返回
+        """
+        if not parent or not self._host or not self._apikey:
+            return
+        params = "&Fields=ProviderIds,Path,OriginalTitle,ProductionYear,ParentId"
+        if since:
+            params += "&IncludeItemTypes=Movie,Series,Episode&MinDateLastSaved=%s" % quote(
+                datetime.datetime.utcfromtimestamp(since).strftime("%Y-%m-%dT%H:%M:%SZ"))
+        else:
+            params += "&IncludeItemTypes=Movie,Series"
+        series_ids = set()
+        changed_series_ids = set()
+        for item in self.__iter_items(parent, params):
+            if item.get("Type") in ["Movie", "Series"]:
+                if item.get("Type") == "Series":
+                    series_ids.add(item.get("Id"))
+                yield self.__format_item(item.get("Id"), item)
+            elif item.get("Type") == "Episode" and item.get("SeriesId"):
+                changed_series_ids.add(item.get("SeriesId"))
+        # 剧集本身未变化但有新增的集
+        for series_id in changed_series_ids - series_ids:
+            item = self.get_sync_item(series_id)
+            if item:
+                yield item
+
+    def support_incremental_sync(self):
+        return True
+
+    def get_library_item_ids(self, parent):
+        """
+        获取媒体库中所有电影和剧集的ID，不查询其它字段，用于比对已删除的项目
+        """
+        if not parent or not self._host or not self._apikey:
+            return []
+        params = "&IncludeItemTypes=Movie,Series&EnableImages=false&EnableUserData=false"
+        return [item.get("Id") for item in self.__iter_items(parent, params, page_size=2000)]
+
+    def get_item_library_ids(self, item_id):
+        """
+        查询电影或剧集所在的媒体库ID列表，无法查询时返回None
+        """
+        if not item_id or not self._host or not self._apikey:
+            return None
+        req_url = "%sItems/%s/Ancestors?api_key=%s" % (self._host, item_id, self._apikey)
+        try:
+            res = RequestUtils().get_res(req_url)
+            if res and res.status_code == 200:
+                return [str(item.get("Id")) for item in res.json() if item.get("Type") == "CollectionFolder"]
+        except Exception as e:
+            log.exception(f"【{self.client_name}】查询项目所在媒体库 出错: ")
+        return None
+
+    def get_sync_item(self, item_id):
+        """
+        查询单个电影或剧集的同步数据，不存在时返回None
+        """
+        item_info = self.get_iteminfo(item_id)
+        if not item_info or item_info.get("Type") not in ["Movie", "Series"]:
+            return None
+        return self.__format_item(item_info.get("Id") or item_id, item_info)
+
     def get_play_url(self, item_id):
         """
         拼装媒体播放链接
@@ -578,6 +683,11 @@ class Jellyfin(_IMediaClient):
                      'user_name': message.get('NotificationUsername'),
                      'play_url': f"/open?url={quote(self.get_play_url(message.get('Id')))}&type=jellyfin"
                      }
+        # 集按所属剧集处理
+        if message.get('ItemType') == 'Episode':
+            eventItem['item_id'] = message.get('SeriesId')
+        else:
+            eventItem['item_id'] = message.get('ItemId') or message.get('Id')
         return eventItem
 
     def get_resume(self, num=12):
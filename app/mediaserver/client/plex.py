@@ -1,9 +1,11 @@
+import datetime
 import os
 from urllib.parse import quote
 from urllib.parse import quote_plus
 from cachetools import TTLCache, cached
 
 from plexapi import media
+from plexapi.exceptions import NotFound
 from plexapi.myplex import MyPlexAccount
 from plexapi.server import PlexServer
 
@@ -444,24 +446,108 @@ class Plex(_IMediaClient):
                 for item in section.all():
                     if not item:
                         continue
-                    ids = self.__get_ids(item.guids)
-                    path = None
-                    if item.locations:
-                        path = item.locations[0]
-                    yield {"id": item.key,
-                           "library": item.librarySectionID,
-                           "type": item.type,
-                           "title": item.title,
-                           "originalTitle": item.originalTitle,
-                           "year": item.year,
-                           "tmdbid": ids['tmdb_id'],
-                           "imdbid": ids['imdb_id'],
-                           "tvdbid": ids['tvdb_id'],
-                           "path": path}
+                    yield self.__format_item(item)
         except Exception as err:
             log.exception(f"【{self.client_name}】获取媒体服务器所有媒体库列表失败: ")
         yield {}
 
+    def __format_item(self, item):
+        """
+        转换为同步数据格式
+        """
+        ids = self.__get_ids(item.guids)
+        path = None
+        if item.locations:
+            path = item.locations[0]
+        return {"id": item.key,
+                "library": item.librarySectionID,
+                "type": item.type,
+                "title": item.title,
+                "originalTitle": item.originalTitle,
+                "year": item.year,
+                "tmdbid": ids['tmdb_id'],
+                "imdbid": ids['imdb_id'],
+                "tvdbid": ids['tvdb_id'],
+                "path": path}
+
+    def get_library_items(self, parent, since=None):
+        """
+        获取媒体库中的所有电影和剧集
+        :param parent: 媒体库ID
+        :param since: 时间戳，只返回该时间之后有变化的项目，新增或变化的集按所属剧集返回
+        """
+        if not parent or not self._plex:
+            return
+        section = self._plex.library.sectionByID(int(parent))
+        if not section:
+            return
+        if not since:
+            for item in section.all():
+                if item:
+                    yield self.__format_item(item)
+            return
+        updated_at = datetime.datetime.fromtimestamp(since)
+        item_keys = set()
+        for item in section.search(filters={"updatedAt>>": updated_at}):
+            if item:
+                item_keys.add(item.ratingKey)
+                yield self.__format_item(item)
+        if section.type != "show":
+            return
+        # 剧集本身未变化但有新增的集
+        show_keys = set()
+        for episode in section.search(libtype="episode", filters={"updatedAt>>": updated_at}):
+            if episode.grandparentRatingKey and episode.grandparentRatingKey not in item_keys:
+                show_keys.add(episode.grandparentRatingKey)
+        for show_key in show_keys:
+            item = self.get_sync_item(show_key)
+            if item:
+                yield item
+
+    def support_incremental_sync(self):
+        return True
+
+    def get_library_item_ids(self, parent):
+        """
+        获取媒体库中所有电影和剧集的ID，用于比对已删除的项目
+        """
+        if not parent or not self._plex:
+            return []
+        section = self._plex.library.sectionByID(int(parent))
+        if not section:
+            return []
+        return [item.key for item in section.all() if item]
+
+    def get_item_library_ids(self, item_id):
+        """
+        查询电影或剧集所在的媒体库ID列表，无法查询时返回None
+        """
+        if not item_id or not self._plex:
+            return None
+        try:
+            item = self._plex.fetchItem(int(item_id) if str(item_id).isdigit() else item_id)
+        except NotFound:
+            return []
+        except Exception as e:
+            log.exception(f"【{self.client_name}】查询项目所在媒体库 出错: ")
+            return None
+        section_id = getattr(item, "librarySectionID", None)
+        return [str(section_id)] if section_id is not None else None
+
+    def get_sync_item(self, item_id):
+        """
+        查询单个电影或剧集的同步数据，不存在时返回None
+        """
+        if not item_id or not self._plex:
+            return None
+        try:
+            item = self._plex.fetchItem(int(item_id) if str(item_id).isdigit() else item_id)
+        except NotFound:
+            return None
+        if not item or item.type not in ["movie", "show"]:
+            return None
+        return self.__format_item(item)
+
     @staticmethod
     def __get_ids(guids):
         guid_mapping = {
@@ -523,6 +609,7 @@ class Plex(_IMediaClient):
                     "E" + str(message.get('Metadata', {}).get('index')),
                     message.get('Metadata', {}).get('title'))
                 eventItem['item_id'] = message.get('Metadata', {}).get('ratingKey')
+                eventItem['series_id'] = message.get('Metadata', {}).get('grandparentRatingKey')
                 eventItem['season_id'] = message.get('Metadata', {}).get('parentIndex')
                 eventItem['episode_id'] = message.get('Metadata', {}).get('index')
 
@@ -1,5 +1,7 @@
-import json
 import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import Tuple
 
@@ -7,18 +9,41 @@ import log
 
 from app.conf import SystemConfig
 from app.db.media_db import MediaDb
-from app.helper import ProgressHelper, SubmoduleHelper
+from app.helper import ProgressHelper, SubmoduleHelper, SnapshotCache
 from app.media import Media
 from app.message import Message
 from app.utils.commons import singleton
 from app.utils.constants import Constants
-from app.utils.types import MediaServerType, SystemConfigKey, ProgressKey
+from app.utils.types import MediaServerType, SystemConfigKey, ProgressKey, SnapshotKey
 
 from config import Config
 
 lock = threading.Lock()
 server_lock = threading.Lock()
 
+# 同步时并发查询剧集信息的线程数
+MEDIASYNC_WORKERS = 8
+# 每批写入数据库的条数
+MEDIASYNC_BATCH_SIZE = 500
+# 同步过程中暂存数据使用的服务器类型后缀
+MEDIASYNC_STAGING_SUFFIX = ":syncing"
+# 增量同步时超过该时间（秒）未全量同步则改为全量同步，用于校正增量同步遗漏的变化
+MEDIASYNC_FULL_INTERVAL = 7 * 24 * 3600
+# 增量同步查询变化时回退的时间（秒），避免媒体服务器与本机时间不一致遗漏变化
+MEDIASYNC_OVERLAP = 600
+# 首页中来自媒体服务器的数据
+MEDIASERVER_SNAPSHOTS = [SnapshotKey.MediaLibraries,
+                         SnapshotKey.MediaActivity,
+                         SnapshotKey.MediaLatest,
+                         SnapshotKey.MediaCounts]
+# 触发单个项目同步的Webhook事件，值为是否为删除事件
+MEDIASYNC_WEBHOOK_EVENTS = {
+    "library.new": False,
+    "ItemAdded": False,
+    "library.deleted": True,
+    "ItemDeleted": True
+}
+
 
 @singleton
 class MediaServer:
@@ -49,6 +74,8 @@ class MediaServer:
         # 当前使用的媒体库服务器
         self._server_type = Config().get_config('media').get('media_server') or 'emby'
         self._server = None
+        # 媒体服务器配置变化后首页数据需重新获取
+        SnapshotCache().invalidate(*MEDIASERVER_SNAPSHOTS)
 
     def __build_class(self, ctype, conf):
         for mediaserver_schema in self._mediaserver_schemas:
@@ -221,6 +248,7 @@ class MediaServer:
     def sync_mediaserver(self):
         """
         同步媒体库所有数据到本地数据库
+        新数据先写入暂存区，全部完成后一次替换，同步过程中查询到的仍为旧数据
         """
         if not self.server:
             return
@@ -242,40 +270,59 @@ class MediaServer:
             total_count = 0
             movie_count = 0
             tv_count = 0
-            # 清空登记薄
-            self.mediadb.empty(server_type=self._server_type)
-            for library in self.get_libraries():
-                if str(library.get("id")) not in librarys:
-                    continue
-                # 获取媒体库所有项目
+            sync_time = time.time()
+            # 清理上次未完成的暂存数据
+            staging_server_type = "%s%s" % (self._server_type, MEDIASYNC_STAGING_SUFFIX)
+            self.mediadb.empty(server_type=staging_server_type)
+            try:
+                with ThreadPoolExecutor(max_workers=MEDIASYNC_WORKERS,
+                                        thread_name_prefix="mediasync") as executor:
+                    for library in self.get_libraries():
+                        if str(library.get("id")) not in librarys:
+                            continue
+                        # 获取媒体库所有项目
+                        self.progress.update(ptype=ProgressKey.MediaSync,
+                                             text="正在获取 %s 数据..." % (library.get("name")))
+                        batch = []
+                        for item, seasoninfo in self.__fetch_library_items(executor, library.get("id")):
+                            # 更新进度
+                            total_count += 1
+                            if item.get("type") in ['Movie', 'movie']:
+                                movie_count += 1
+                            elif item.get("type") in ['Series', 'show']:
+                                tv_count += 1
+                            self.progress.update(ptype=ProgressKey.MediaSync,
+                                                 text="正在同步 %s，已完成：%s / %s ..." % (
+                                                     library.get("name"), total_count, total_media_count),
+                                                 value=round(100 * total_count / total_media_count, 1)
+                                                 if total_media_count else 0)
+                            # 批量写入暂存区
+                            batch.append((item, seasoninfo))
+                            if len(batch) >= MEDIASYNC_BATCH_SIZE:
+                                self.__insert_batch(staging_server_type, batch)
+                                batch = []
+                        self.__insert_batch(staging_server_type, batch)
+                # 替换为新数据
+                if not self.mediadb.swap(server_type=self._server_type,
+                                         staging_server_type=staging_server_type):
+                    raise Exception("替换媒体库数据失败")
+            except Exception as e:
+                log.exception("【MediaServer】媒体库数据同步出错，保留原有数据：")
+                self.mediadb.empty(server_type=staging_server_type)
                 self.progress.update(ptype=ProgressKey.MediaSync,
-                                     text="正在获取 %s 数据..." % (library.get("name")))
-                for item in self.get_items(library.get("id")):
-                    if not item:
-                        continue
-                    # 更新进度
-                    seasoninfo = []
-                    total_count += 1
-                    if item.get("type") in ['Movie', 'movie']:
-                        movie_count += 1
-                    elif item.get("type") in ['Series', 'show']:
-                        tv_count += 1
-                        # 查询剧集信息
-                        seasoninfo = self.get_tv_episodes(item.get("id"))
-                    self.progress.update(ptype=ProgressKey.MediaSync,
-                                         text="正在同步 %s，已完成：%s / %s ..." % (
-                                             library.get("name"), total_count, total_media_count),
-                                         value=round(100 * total_count / total_media_count, 1))
-                    # 插入数据
-                    self.mediadb.insert(server_type=self._server_type,
-                                        iteminfo=item,
-                                        seasoninfo=seasoninfo)
-
+                                     value=100,
+                                     text="媒体库数据同步出错：%s" % str(e))
+                self.progress.end(ProgressKey.MediaSync)
+                return
             # 更新总体同步情况
             self.mediadb.statistics(server_type=self._server_type,
                                     total_count=total_count,
                                     movie_count=movie_count,
                                     tv_count=tv_count)
+            # 记录同步时间，之后的增量同步从该时间开始
+            self.__set_watermark({"full_sync": sync_time,
+                                  "since": sync_time,
+                                  "libraries": librarys})
             # 结束进度条
             self.progress.update(ptype=ProgressKey.MediaSync,
                                  value=100,
@@ -283,6 +330,187 @@ class MediaServer:
             self.progress.end(ProgressKey.MediaSync)
             log.info("【MediaServer】媒体库数据同步完成，同步数量：%s" % total_count)
 
+    def sync_mediaserver_incremental(self):
+        """
+        增量同步媒体库数据，只同步上次同步后有变化的项目，并清理媒体服务器中已删除的项目
+        媒体服务器不支持、未全量同步过、同步范围有变化或距上次全量同步时间过长时执行全量同步
+        """
+        if not self.server:
+            return
+        librarys = self.systemconfig.get(SystemConfigKey.SyncLibrary) or []
+        watermark = self.__get_watermark()
+        if not self.server.support_incremental_sync() \
+                or not watermark.get("since") \
+                or sorted(watermark.get("libraries") or []) != sorted(librarys) \
+                or time.time() - (watermark.get("full_sync") or 0) > MEDIASYNC_FULL_INTERVAL:
+            self.sync_mediaserver()
+            return
+        with lock:
+            log.info("【MediaServer】开始增量同步媒体库数据...")
+            sync_time = time.time()
+            since = watermark.get("since") - MEDIASYNC_OVERLAP
+            changed_count = 0
+            server_item_ids = set()
+            try:
+                with ThreadPoolExecutor(max_workers=MEDIASYNC_WORKERS,
+                                        thread_name_prefix="mediasync") as executor:
+                    for library in self.get_libraries():
+                        if str(library.get("id")) not in librarys:
+                            continue
+                        batch = []
+                        for item, seasoninfo in self.__fetch_library_items(executor,
+                                                                           library.get("id"),
+                                                                           since=since):
+                            changed_count += 1
+                            batch.append((item, seasoninfo))
+                            if len(batch) >= MEDIASYNC_BATCH_SIZE:
+                                self.__upsert_batch(batch)
+                                batch = []
+                        self.__upsert_batch(batch)
+                        # 媒体库当前的所有项目ID，用于清理已删除的项目
+                        server_item_ids.update(
+                            [str(item_id) for item_id in self.server.get_library_item_ids(library.get("id"))])
+                # 清理媒体服务器中已删除的项目，媒体库为空时可能是查询异常，等待全量同步处理
+                deleted_ids = self.mediadb.get_item_ids(server_type=self._server_type) - server_item_ids \
+                    if server_item_ids else set()
+                if deleted_ids and not self.mediadb.delete_items(server_type=self._server_type,
+                                                                 item_ids=deleted_ids):
+                    raise Exception("清理已删除的媒体库数据失败")
+            except Exception as e:
+                # 增量同步失败后下次执行全量同步
+                log.exception("【MediaServer】媒体库数据增量同步出错，下次将全量同步：")
+                self.__set_watermark({})
+                return
+            self.__set_watermark({"full_sync": watermark.get("full_sync"),
+                                  "since": sync_time,
+                                  "libraries": librarys})
+            self.__update_statistics()
+            log.info("【MediaServer】媒体库数据增量同步完成，更新数量：%s，删除数量：%s" % (
+                changed_count, len(deleted_ids)))
+
+    def refresh_sync_item(self, item_id, deleted=False):
+        """
+        刷新单个电影或剧集的同步数据，收到媒体服务器新增或删除通知时调用
+        :param item_id: 电影或剧集的ID
+        :param deleted: 是否为删除通知，项目已不存在时删除同步数据
+        """
+        if not item_id or not self.server or not self.server.support_incremental_sync():
+            return
+        # 未同步过时不处理
+        if not self.__get_watermark().get("since"):
+            return
+        # 同步进行中时由同步处理
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            item = self.server.get_sync_item(item_id)
+            if item:
+                in_sync = self.__in_sync_libraries(item_id)
+                if in_sync is None:
+                    # 无法确定所在媒体库，由增量同步处理
+                    return
+                if not in_sync:
+                    # 不在同步的媒体库中，清理可能残留的数据
+                    self.mediadb.delete_items(server_type=self._server_type,
+                                              item_ids=[str(item.get("id") or item_id)])
+                    log.debug(f"【MediaServer】{item.get('title')} 不在同步的媒体库中，跳过")
+                    return
+            if item:
+                seasoninfo = []
+                if item.get("type") in ['Series', 'show']:
+                    seasoninfo = self.get_tv_episodes(item.get("id")) or []
+                self.__upsert_batch([(item, seasoninfo)])
+                log.info(f"【MediaServer】已更新媒体库数据：{item.get('title')}")
+            elif deleted:
+                self.mediadb.delete_items(server_type=self._server_type, item_ids=[str(item_id)])
+                log.info(f"【MediaServer】已删除媒体库数据：{item_id}")
+            else:
+                return
+            self.__update_statistics()
+        except Exception as e:
+            log.error(f"【MediaServer】更新媒体库数据 {item_id} 出错：{str(e)}")
+        finally:
+            lock.release()
+
+    def __in_sync_libraries(self, item_id):
+        """
+        项目是否在需同步的媒体库中，无法查询所在媒体库时返回None
+        """
+        library_ids = self.server.get_item_library_ids(item_id)
+        if library_ids is None:
+            return None
+        librarys = self.systemconfig.get(SystemConfigKey.SyncLibrary) or []
+        return bool(set(library_ids) & set(str(library) for library in librarys))
+
+    def __get_watermark(self):
+        """
+        获取当前媒体服务器的增量同步进度
+        """
+        watermarks = self.systemconfig.get(SystemConfigKey.MediaSyncWatermark) or {}
+        return watermarks.get(self._server_type) or {}
+
+    def __set_watermark(self, watermark):
+        """
+        保存当前媒体服务器的增量同步进度，为空时下次执行全量同步
+        """
+        watermarks = dict(self.systemconfig.get(SystemConfigKey.MediaSyncWatermark) or {})
+        watermarks[self._server_type] = watermark
+        self.systemconfig.set(SystemConfigKey.MediaSyncWatermark, watermarks)
+
+    def __update_statistics(self):
+        """
+        按数据库中的数据重新统计同步数量
+        """
+        counts = self.mediadb.count_items(server_type=self._server_type)
+        movie_count = sum([counts.get(item_type) or 0 for item_type in ['Movie', 'movie']])
+        tv_count = sum([counts.get(item_type) or 0 for item_type in ['Series', 'show']])
+        self.mediadb.statistics(server_type=self._server_type,
+                                total_count=sum(counts.values()),
+                                movie_count=movie_count,
+                                tv_count=tv_count)
+
+    def __fetch_library_items(self, executor, library_id, since=None):
+        """
+        获取媒体库所有项目及剧集信息，剧集信息并发查询，按媒体库中的顺序返回
+        :param since: 时间戳，只获取该时间之后有变化的项目
+        :return: (项目信息, 剧集信息) 生成器
+        """
+        pending = deque()
+        for item in self.server.get_library_items(library_id, since=since):
+            if not item:
+                continue
+            if item.get("type") in ['Series', 'show']:
+                pending.append((item, executor.submit(self.get_tv_episodes, item.get("id"))))
+            else:
+                pending.append((item, None))
+            # 控制排队中的查询数量
+            while len(pending) > MEDIASYNC_WORKERS * 4:
+                yield self.__resolve(*pending.popleft())
+        while pending:
+            yield self.__resolve(*pending.popleft())
+
+    @staticmethod
+    def __resolve(item, future):
+        if not future:
+            return item, []
+        try:
+            return item, future.result() or []
+        except Exception as e:
+            log.error(f"【MediaServer】查询 {item.get('title')} 剧集信息出错：{str(e)}")
+            return item, []
+
+    def __insert_batch(self, server_type, batch):
+        if not batch:
+            return
+        if not self.mediadb.insert_batch(server_type=server_type, items=batch):
+            raise Exception("写入媒体库数据失败")
+
+    def __upsert_batch(self, batch):
+        if not batch:
+            return
+        if not self.mediadb.upsert_batch(server_type=self._server_type, items=batch):
+            raise Exception("更新媒体库数据失败")
+
     def check_item_exists(self,
                           mtype,
                           title=None,
@@ -304,22 +532,40 @@ class MediaServer:
                                    title=title,
                                    year=year,
                                    tmdbid=tmdbid)
+        return self.__match_item(media, mtype=mtype, season=season, episode=episode)
+
+    def check_items_exists(self, medias):
+        """
+        批量检查媒体库是否已存在，用于一次检查整页的项目，非实时同步数据，仅用于展示
+        :param medias: [{"type": 媒体类型, "title": 标题, "year": 年份, "tmdbid": TMDB ID, "season": 季号, "episode": 集号}]
+        :return: 与输入顺序一致的媒体服务器ITEMID列表，不存在的为None
+        """
+        if not medias:
+            return []
+        items = self.mediadb.query_batch(server_type=self._server_type,
+                                         medias=[(media.get("title"), media.get("year"), media.get("tmdbid"))
+                                                 for media in medias])
+        return [self.__match_item(item,
+                                  mtype=media.get("type"),
+                                  season=media.get("season"),
+                                  episode=media.get("episode")) for media, item in zip(medias, items)]
+
+    @staticmethod
+    def __match_item(media, mtype, season=None, episode=None):
+        """
+        匹配季集是否存在
+        :return: 媒体服务器中的ITEMID
+        """
         if not media:
             return None
-
         # 剧集没有季时默认为第1季
         if mtype not in Constants.MOVIE_TYPES:
             if not season:
                 season = 1
         if season:
             # 匹配剧集是否存在
-            seasoninfos = json.loads(media.JSON or "[]")
-            for seasoninfo in seasoninfos:
-                if seasoninfo.get("season_num") == int(season):
-                    if not episode:
-                        return media.ITEM_ID
-                    elif seasoninfo.get("episode_num") == int(episode):
-                        return media.ITEM_ID
+            if media.has_episode(season, episode):
+                return media.ITEM_ID
             return None
         else:
             return media.ITEM_ID
@@ -386,6 +632,14 @@ class MediaServer:
             self.message.send_mediaserver_message(event_info=event_info,
                                                   channel=channel.value,
                                                   image_url=image_url)
+            if event_info.get("event") in MEDIASYNC_WEBHOOK_EVENTS:
+                # 通知首页刷新媒体服务器数据
+                SnapshotCache().invalidate(*MEDIASERVER_SNAPSHOTS)
+                # 同步新增或删除的项目
+                self.refresh_sync_item(item_id=event_info.get("series_id") or event_info.get("item_id"),
+                                       deleted=MEDIASYNC_WEBHOOK_EVENTS.get(event_info.get("event")))
+            else:
+                SnapshotCache().invalidate(SnapshotKey.MediaActivity)
 
     def get_resume(self, num=12):
         """
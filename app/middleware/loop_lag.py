@@ -0,0 +1,22 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.loop_monitor import LoopLagMonitor
+
+
+class LoopLagMiddleware:
+    """
+    记录正在处理的请求，事件循环被阻塞时用于定位是哪个请求
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        request_id = LoopLagMonitor.request_started(f"{scope.get('method') or 'WS'} {scope.get('path')}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            LoopLagMonitor.request_finished(request_id)
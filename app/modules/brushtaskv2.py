@@ -243,6 +243,10 @@ class BrushTaskV2(object):
             downloading_count = self.__get_downloading_count(downloader_id) or 0
             new_torrent_count = int(max_dlcount) - int(downloading_count)
 
+        # 批量查询已在刷流任务中的种子
+        handled_enclosures = self.dbhelper.get_brushtask_handled_enclosures(
+            [item.get('enclosure') for item in result_aaray])
+
         for item in result_aaray:
             try:
                 # 种子名
@@ -271,7 +275,7 @@ class BrushTaskV2(object):
                                                    torrent_size=size):
                     continue
                 # 检查是否已处理过
-                if self.is_torrent_handled(enclosure=enclosure):
+                if enclosure in handled_enclosures:
                     log.info("【Brush】%s 已在刷流任务中" % torrent_name)
                     continue
                 # 开始下载
@@ -282,6 +286,8 @@ class BrushTaskV2(object):
                                            title=torrent_name,
                                            enclosure=enclosure,
                                            size=size):
+                    # 同一报文中重复的种子只处理一次
+                    handled_enclosures.add(enclosure)
                     # 计数
                     success_count += 1
                     # 添加种子后不能超过最大下载数量
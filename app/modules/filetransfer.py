@@ -5,14 +5,13 @@ import re
 import shutil
 
 from enum import Enum
-from threading import Lock
 from time import sleep
 from typing import Tuple
 
 import log
 
 from app.conf import ModuleConf
-from app.helper import DbHelper, ProgressHelper, FileHelper
+from app.helper import DbHelper, ProgressHelper, FileHelper, TransferLimiter, LibraryIndex, SnapshotCache
 from app.media import Media, Category, Scraper
 from app.media.meta import MetaInfo
 from app.mediaserver import MediaServer
@@ -21,7 +20,7 @@ from app.plugins import EventManager
 from app.utils import EpisodeFormat, PathUtils, StringUtils, SystemUtils, NumberUtils
 from app.utils.commons import singleton
 from app.utils.constants import Constants
-from app.utils.types import MediaType, SyncType, RmtMode, EventType, ProgressKey
+from app.utils.types import MediaType, SyncType, RmtMode, EventType, ProgressKey, SnapshotKey
 
 from config import RMT_FAVTYPE, Config
 
@@ -32,8 +31,6 @@ DEFAULT_MOVIE_FORMAT = '{title} ({year})/{title} ({year})-{part} - {videoFormat}
 # 电视剧默认命名格式
 DEFAULT_TV_FORMAT = '{title} ({year})/Season {season}/{title} - {season_episode}-{part} - 第 {episode} 集'
 
-lock = Lock()
-
 
 @singleton
 class FileTransfer:
@@ -162,7 +159,8 @@ class FileTransfer:
         :param target_file: 目标文件路径
         :param rmt_mode: RmtMode转移方式
         """
-        with lock:
+        limiter = TransferLimiter()
+        with limiter.path_lock(target_file), limiter.slot(rmt_mode, file_item, target_file):
             if rmt_mode == RmtMode.LINK:
                 # 更链接
                 retcode, retmsg = SystemUtils.link(file_item, target_file)
@@ -187,6 +185,10 @@ class FileTransfer:
             else:
                 # 复制
                 retcode, retmsg = SystemUtils.copy(file_item, target_file)
+        # 媒体库目录已变化
+        LibraryIndex().invalidate(target_file)
+        if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
+            LibraryIndex().invalidate(file_item)
         if retcode != 0:
             log.error("【Rmt】%s", retmsg)
         return retcode
@@ -459,16 +461,23 @@ class FileTransfer:
         :param over_flag: 是否覆盖，为True时会先删除再转移
         """
         file_name = os.path.basename(file_item)
-        if not over_flag and os.path.exists(new_file):
-            log.warn("【Rmt】文件已存在：%s" % new_file)
-            return 0
-        if over_flag and old_file and os.path.isfile(old_file):
-            log.info("【Rmt】正在删除已存在的文件：%s" % old_file)
-            os.remove(old_file)
-        log.info("【Rmt】正在转移文件：%s 到 %s" % (file_name, new_file))
-        retcode = self.__transfer_command(file_item=file_item,
-                                          target_file=new_file,
-                                          rmt_mode=rmt_mode)
+        # 同一集的不同后缀共用一个锁，判断是否已存在及转移一起完成，避免多个任务同时转移同一集
+        with TransferLimiter().path_lock(os.path.splitext(new_file)[0]):
+            if rmt_mode not in ModuleConf.REMOTE_RMT_MODES:
+                # 加锁后重新判断，其它任务可能已转移了同一集
+                over_flag, old_file = self.__recheck_exists(file_item, new_file, rmt_mode, over_flag, old_file)
+                if over_flag is None:
+                    return 0
+            if not over_flag and os.path.exists(new_file):
+                log.warn("【Rmt】文件已存在：%s" % new_file)
+                return 0
+            if over_flag and old_file and os.path.isfile(old_file):
+                log.info("【Rmt】正在删除已存在的文件：%s" % old_file)
+                os.remove(old_file)
+            log.info("【Rmt】正在转移文件：%s 到 %s" % (file_name, new_file))
+            retcode = self.__transfer_command(file_item=file_item,
+                                              target_file=new_file,
+                                              rmt_mode=rmt_mode)
         if retcode == 0:
             log.info("【Rmt】文件 %s %s完成" % (file_name, rmt_mode.value))
             self.dbhelper.insert_transfer_blacklist(file_item)
@@ -481,6 +490,27 @@ class FileTransfer:
                                            rmt_mode=rmt_mode,
                                            over_flag=over_flag)
 
+    def __recheck_exists(self, file_item, new_file, rmt_mode, over_flag, old_file):
+        """
+        在路径锁内重新判断同一集是否已存在，按覆盖设置决定是否转移
+        :return: 是否覆盖（None表示不转移），要覆盖的原文件
+        """
+        exist_file = LibraryIndex().find_media_file(os.path.splitext(new_file)[0], Constants.RMT_MEDIAEXT)
+        if not exist_file:
+            return over_flag, old_file
+        if over_flag and old_file and os.path.normcase(exist_file) == os.path.normcase(old_file):
+            return over_flag, old_file
+        # 已存在的文件与判断时不同，按文件大小及覆盖设置重新判断
+        if rmt_mode != RmtMode.SOFTLINK and (over_flag or self._filesize_cover):
+            try:
+                if os.path.getsize(file_item) > os.path.getsize(exist_file):
+                    log.info(f"【Rmt】文件 {exist_file} 已存在，新文件更大，覆盖为 {new_file} ...")
+                    return True, exist_file
+            except OSError as err:
+                log.warn(f"【Rmt】获取文件大小失败：{str(err)}")
+        log.warn("【Rmt】文件已存在：%s" % exist_file)
+        return None, None
+
     def transfer_media(self,
                        in_from: Enum,
                        in_path,
@@ -801,7 +831,8 @@ class FileTransfer:
                     elif rmt_mode not in ModuleConf.REMOTE_RMT_MODES:
                         # 创建目录
                         log.debug("【Rmt】正在创建目录：%s" % ret_dir_path)
-                        os.makedirs(ret_dir_path)
+                        os.makedirs(ret_dir_path, exist_ok=True)
+                        LibraryIndex().invalidate(ret_dir_path)
                 # 转移蓝光原盘
                 if bluray_disk_dir:
                     ret = self.__transfer_bluray_dir(file_item, ret_dir_path, rmt_mode)
@@ -936,6 +967,9 @@ class FileTransfer:
         # 如果本次同步的文件包含在媒体库中，将触发一次媒体库刷新
         if total_count > 0 and target_in_media_lib:
             MediaServer().refresh_root_library()
+        # 存储空间已变化
+        if total_count > 0:
+            SnapshotCache().invalidate(SnapshotKey.LibrarySpace)
 
         if alert_count > 0:
             reason = "、".join(alert_messages)
@@ -1001,6 +1035,8 @@ class FileTransfer:
         :param media: 已识别的媒体信息
         :return: 目录是否存在，目录路径，文件是否存在，文件路径
         """
+        # 通过目录清单缓存判断，避免逐个后缀查询文件系统
+        library_index = LibraryIndex()
         # 返回变量
         dir_exist_flag = False
         file_exist_flag = False
@@ -1018,25 +1054,23 @@ class FileTransfer:
                 for m_type in [RMT_FAVTYPE, media.category]:
                     type_path = os.path.join(media_dest, m_type, dir_name)
                     # 目录是否存在
-                    if os.path.exists(type_path):
+                    if library_index.exists(type_path):
                         file_path = type_path
                         break
             # 返回路径
             ret_dir_path = file_path
             # 路径存在标志
-            if os.path.exists(file_path):
+            if library_index.exists(file_path):
                 dir_exist_flag = True
             # 文件路径
             file_dest = os.path.join(file_path, file_name)
             # 返回文件路径
             ret_file_path = file_dest
             # 文件是否存在
-            for ext in Constants.RMT_MEDIAEXT:
-                ext_dest = "%s%s" % (file_dest, ext)
-                if os.path.exists(ext_dest):
-                    file_exist_flag = True
-                    ret_file_path = ext_dest
-                    break
+            ext_dest = library_index.find_media_file(file_dest, Constants.RMT_MEDIAEXT)
+            if ext_dest:
+                file_exist_flag = True
+                ret_file_path = ext_dest
         # 电视剧或者动漫
         else:
             # 目录名称
@@ -1054,7 +1088,7 @@ class FileTransfer:
                 # 返回目录路径
                 ret_dir_path = season_dir
                 # 目录是否存在
-                if os.path.exists(season_dir):
+                if library_index.exists(season_dir):
                     dir_exist_flag = True
                 # 处理集
                 episodes = media.get_episode_list()
@@ -1064,12 +1098,10 @@ class FileTransfer:
                     # 返回文件路径
                     ret_file_path = file_path
                     # 文件存在标志
-                    for ext in Constants.RMT_MEDIAEXT:
-                        ext_dest = "%s%s" % (file_path, ext)
-                        if os.path.exists(ext_dest):
-                            file_exist_flag = True
-                            ret_file_path = ext_dest
-                            break
+                    ext_dest = library_index.find_media_file(file_path, Constants.RMT_MEDIAEXT)
+                    if ext_dest:
+                        file_exist_flag = True
+                        ret_file_path = ext_dest
         return dir_exist_flag, ret_dir_path, file_exist_flag, ret_file_path
 
     def get_dest_path_by_info(self, dest, meta_info):
@@ -1138,7 +1170,7 @@ class FileTransfer:
                 else:
                     dest_path = os.path.join(dest_path, dir_name, season_name)
                 # 目录不存在
-                if not os.path.exists(dest_path):
+                if not LibraryIndex().exists(dest_path):
                     continue
                 files = PathUtils.get_dir_files(dest_path, Constants.RMT_MEDIAEXT)
                 for file in files:
@@ -1518,6 +1550,9 @@ class FileTransfer:
                                     shutil.rmtree(os.path.dirname(dest_path))
                                 except Exception as e:
                                     log.exception("【Rmt】删除指定目录 异常:")
+                    # 媒体库目录已变化
+                    if dest_path:
+                        LibraryIndex().invalidate(os.path.dirname(dest_path))
         return {"retcode": 0}
 
     def re_identification(self, flag, ids):
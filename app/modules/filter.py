@@ -12,6 +12,137 @@ from app.utils.types import MediaType
 from config import Config
 
 
+class FilterRuleProgram(object):
+    """
+    编译后的单条过滤规则：正则已预编译，大小范围、促销阈值已解析
+    """
+    __slots__ = ("name", "order_seq", "includes", "excludes", "size_range", "free_factors", "error", "source")
+
+    def __init__(self, rule_info):
+        self.name = rule_info.get("name")
+        self.source = rule_info
+        self.error = None
+        self.order_seq = 0
+        self.includes = ()
+        self.excludes = ()
+        self.size_range = None
+        self.free_factors = None
+        try:
+            self.order_seq = 100 - int(rule_info.get('pri'))
+            self.includes = tuple(re.compile(r'%s' % include.strip(), re.IGNORECASE)
+                                  for include in rule_info.get('include') or [] if include)
+            self.excludes = tuple(re.compile(r'%s' % exclude.strip(), re.IGNORECASE)
+                                  for exclude in rule_info.get('exclude') or [] if exclude)
+            self.size_range = self.__parse_size(rule_info.get('size'))
+            free = rule_info.get("free")
+            if free:
+                ul_factor, dl_factor = free.split()
+                self.free_factors = (float(ul_factor), float(dl_factor))
+        except Exception as err:
+            self.error = err
+
+    @staticmethod
+    def __parse_size(sizes):
+        """
+        解析大小范围，单位GB，返回字节范围
+        """
+        if not sizes:
+            return None
+        if sizes.find(',') != -1:
+            sizes = sizes.split(',')
+            begin_size = int(sizes[0].strip()) if sizes[0].isdigit() else 0
+            end_size = int(sizes[1].strip()) if sizes[1].isdigit() else 0
+        else:
+            begin_size = 0
+            end_size = int(sizes.strip()) if sizes.isdigit() else 0
+        return begin_size * 1024 ** 3, end_size * 1024 ** 3
+
+    def match(self, meta_info, title):
+        """
+        检查种子是否命中本条规则
+        """
+        # 必须包括的项
+        for include in self.includes:
+            if not include.search(title):
+                return False
+        # 不能包含的项，全部命中时才排除
+        if self.excludes and all(exclude.search(title) for exclude in self.excludes):
+            return False
+        # 大小
+        if self.size_range and meta_info.size:
+            meta_info.size = StringUtils.num_filesize(meta_info.size)
+            begin_size, end_size = self.size_range
+            if meta_info.type == MediaType.MOVIE:
+                if not begin_size <= int(meta_info.size) <= end_size:
+                    return False
+            else:
+                if meta_info.total_episodes \
+                        and not begin_size <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size:
+                    return False
+        # 促销
+        if self.free_factors \
+                and meta_info.upload_volume_factor is not None \
+                and meta_info.download_volume_factor is not None:
+            ul_factor, dl_factor = self.free_factors
+            if ul_factor > meta_info.upload_volume_factor \
+                    or dl_factor < meta_info.download_volume_factor:
+                return False
+        return True
+
+
+class FilterGroupProgram(object):
+    """
+    编译后的过滤规则组，规则变化时整体重建，不可修改
+    """
+    __slots__ = ("group_id", "name", "rules")
+
+    def __init__(self, group_id, name, rule_infos):
+        self.group_id = group_id
+        self.name = name
+        self.rules = tuple(FilterRuleProgram(rule_info) for rule_info in rule_infos)
+
+    @staticmethod
+    def get_text(meta_info):
+        """
+        过滤使用的文本
+        """
+        title = meta_info.rev_string
+        if meta_info.subtitle:
+            title = f"{title} {meta_info.subtitle}"
+        return title
+
+    def evaluate(self, meta_info):
+        """
+        按规则顺序检查，命中任一规则即返回
+        :return: 是否匹配，匹配的优先值
+        """
+        title = self.get_text(meta_info)
+        # 命中优先级
+        order_seq = 0
+        # 当前规则组是否命中
+        group_match = True
+        for rule in self.rules:
+            order_seq = rule.order_seq
+            if rule.error:
+                log.error(f"【Filter】过滤规则出现严重错误 {rule.error}，请检查：{rule.source}")
+                continue
+            try:
+                if rule.match(meta_info, title):
+                    return True, order_seq
+                group_match = False
+            except Exception as err:
+                log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{rule.source}")
+        if not group_match:
+            return False, 0
+        return True, order_seq
+
+    def evaluate_batch(self, meta_infos):
+        """
+        批量检查，返回每个种子的 (是否匹配, 匹配的优先值)
+        """
+        return [self.evaluate(meta_info) for meta_info in meta_infos]
+
+
 @singleton
 class Filter:
 
@@ -19,6 +150,9 @@ class Filter:
     dbhelper = None
     _groups = []
     _rules = []
+    # 编译后的规则组，KEY为规则组ID
+    _programs = {}
+    _default_program = None
 
     def __init__(self):
         self.init_config()
@@ -28,6 +162,31 @@ class Filter:
         self.rg_matcher = ReleaseGroupsMatcher()
         self._groups = self.get_filter_group()
         self._rules = self.get_filter_rule()
+        self.__compile_programs()
+
+    def __compile_programs(self):
+        """
+        将所有规则组编译为过滤程序，规则变化时重新编译
+        """
+        programs = {}
+        default_program = None
+        for group in self.get_rule_groups():
+            program = FilterGroupProgram(group_id=group.get("id"),
+                                         name=group.get("name"),
+                                         rule_infos=self.get_rules(group.get("id")))
+            programs[str(group.get("id"))] = program
+            if group.get("default") == "Y" and not default_program:
+                default_program = program
+        self._programs = programs
+        self._default_program = default_program
+
+    def get_rule_program(self, rulegroup=None):
+        """
+        获取编译后的规则组，为空时返回默认规则组
+        """
+        if not rulegroup:
+            return self._default_program
+        return self._programs.get(str(rulegroup))
 
     def get_rule_groups(self, groupid=None, default=False):
         """
@@ -109,99 +268,30 @@ class Filter:
         # 为-1时不使用过滤规则
         if rulegroup and int(rulegroup) == -1:
             return True, 0, "不过滤"
-        # 过滤使用的文本
-        title = meta_info.rev_string
-        if meta_info.subtitle:
-            title = f"{title} {meta_info.subtitle}"
         # 过滤规则组
-        if not rulegroup:
-            rulegroup = self.get_rule_groups(default=True)
+        program = self.get_rule_program(rulegroup)
+        if not program:
             if not rulegroup:
                 return True, 0, "未配置过滤规则"
-        else:
-            rulegroup = self.get_rule_groups(groupid=rulegroup)
-        filters = self.get_rules(groupid=rulegroup.get("id"))
-        # 命中优先级
-        order_seq = 0
-        # 当前规则组是否命中
-        group_match = True
-        for filter_info in filters:
-            try:
-                # 当前规则是否命中
-                rule_match = True
-                # 命中规则的序号
-                order_seq = 100 - int(filter_info.get('pri'))
-                # 必须包括的项
-                includes = filter_info.get('include')
-                if includes and rule_match:
-                    include_flag = True
-                    for include in includes:
-                        if not include:
-                            continue
-                        if not re.search(r'%s' % include.strip(), title, re.IGNORECASE):
-                            include_flag = False
-                            break
-                    if not include_flag:
-                        rule_match = False
-
-                # 不能包含的项
-                excludes = filter_info.get('exclude')
-                if excludes and rule_match:
-                    exclude_flag = False
-                    exclude_count = 0
-                    for exclude in excludes:
-                        if not exclude:
-                            continue
-                        exclude_count += 1
-                        if not re.search(r'%s' % exclude.strip(), title, re.IGNORECASE):
-                            exclude_flag = True
-                    if exclude_count > 0 and not exclude_flag:
-                        rule_match = False
-                # 大小
-                sizes = filter_info.get('size')
-                if sizes and rule_match and meta_info.size:
-                    meta_info.size = StringUtils.num_filesize(meta_info.size)
-                    if sizes.find(',') != -1:
-                        sizes = sizes.split(',')
-                        if sizes[0].isdigit():
-                            begin_size = int(sizes[0].strip())
-                        else:
-                            begin_size = 0
-                        if sizes[1].isdigit():
-                            end_size = int(sizes[1].strip())
-                        else:
-                            end_size = 0
-                    else:
-                        begin_size = 0
-                        if sizes.isdigit():
-                            end_size = int(sizes.strip())
-                        else:
-                            end_size = 0
-                    if meta_info.type == MediaType.MOVIE:
-                        if not begin_size * 1024 ** 3 <= int(meta_info.size) <= end_size * 1024 ** 3:
-                            rule_match = False
-                    else:
-                        if meta_info.total_episodes \
-                                and not begin_size * 1024 ** 3 <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size * 1024 ** 3:
-                            rule_match = False
-
-                # 促销
-                free = filter_info.get("free")
-                if free and meta_info.upload_volume_factor is not None and meta_info.download_volume_factor is not None:
-                    ul_factor, dl_factor = free.split()
-                    if float(ul_factor) > meta_info.upload_volume_factor \
-                            or float(dl_factor) < meta_info.download_volume_factor:
-                        rule_match = False
-
-                if rule_match:
-                    return True, order_seq, rulegroup.get("name")
-                else:
-                    group_match = False
-            except Exception as err:
-                log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{filter_info}")
-        if not group_match:
-            return False, 0, rulegroup.get("name")
-        return True, order_seq, rulegroup.get("name")
+            return True, 0, None
+        match_flag, order_seq = program.evaluate(meta_info)
+        return match_flag, order_seq, program.name
+
+    def check_rules_batch(self, meta_infos, rulegroup=None):
+        """
+        批量检查种子是否匹配过滤规则
+        :param meta_infos: 识别的信息列表
+        :param rulegroup: 规则组ID
+        :return: 每个种子的 (是否匹配, 匹配的优先值)
+        """
+        if not meta_infos:
+            return []
+        if rulegroup and int(rulegroup) == -1:
+            return [(True, 0) for _ in meta_infos]
+        program = self.get_rule_program(rulegroup)
+        if not program:
+            return [(True, 0) for _ in meta_infos]
+        return program.evaluate_batch(meta_infos)
 
     def is_rule_free(self, rulegroup=None):
         """
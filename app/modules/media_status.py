@@ -20,12 +20,54 @@ class MediaStatusChecker:
         :param: mediaid TMDBID/DB:豆瓣ID/BG:Bangumi的ID
         :return: 1-已订阅/2-已下载/0-不存在未订阅, RSSID, 如果已下载,还会有对应的媒体库的播放地址链接
         """
+        return self.get_medias_exists_info([{"type": mtype,
+                                             "title": title,
+                                             "year": year,
+                                             "mediaid": mediaid}])[0]
+
+    def get_medias_exists_info(self, medias):
+        """
+        批量获取媒体存在标记，媒体服务器中是否存在一次查询完成
+        :param: medias [{"type": 媒体类型, "title": 标题, "year": 年份, "mediaid": TMDBID/DB:豆瓣ID/BG:Bangumi的ID}]
+        :return: 与输入顺序一致的 (标记, RSSID, 播放地址) 列表
+        """
+        results = [None] * len(medias)
+        # 未订阅的项目再检查媒体服务器
+        checks = []
+        for i, media in enumerate(medias):
+            check = self.__get_subscribe_info(mtype=media.get("type"),
+                                              title=media.get("title"),
+                                              year=media.get("year"),
+                                              mediaid=media.get("mediaid"))
+            if check.get("rssid"):
+                # 已订阅
+                results[i] = ("1", check.get("rssid"), None)
+            else:
+                checks.append((i, check))
+        if not checks:
+            return results
+        mediaserver = MediaServer()
+        item_ids = mediaserver.check_items_exists([check for _, check in checks])
+        for (i, check), item_id in zip(checks, item_ids):
+            if item_id:
+                # 已下载
+                results[i] = ("2", None, mediaserver.get_play_url(item_id=item_id))
+            else:
+                # 未订阅、未下载
+                results[i] = ("0", None, None)
+        return results
+
+    @staticmethod
+    def __get_subscribe_info(mtype, title, year, mediaid):
+        """
+        查询订阅ID
+        :return: 订阅ID及检查媒体服务器所需的参数
+        """
         if str(mediaid).isdigit():
             tmdbid = mediaid
         else:
             tmdbid = None
 
-        rssid = None
         if mtype in Constants.MOVIE_TYPES:
             rssid = Subscribe().get_subscribe_id(mtype=MediaType.MOVIE,
                                                  title=title,
@@ -45,18 +87,4 @@ class MediaStatusChecker:
                                                  year=year,
                                                  season=season,
                                                  tmdbid=tmdbid)
-        item_url = None
-        if rssid:
-            # 已订阅
-            fav = "1"
-        else:
-            # 检查媒体服务器是否存在
-            item_id = MediaServer().check_item_exists(mtype=mtype, title=title, year=year, tmdbid=tmdbid)
-            if item_id:
-                # 已下载
-                fav = "2"
-                item_url = MediaServer().get_play_url(item_id=item_id)
-            else:
-                # 未订阅、未下载
-                fav = "0"
-        return fav, rssid, item_url
+        return {"rssid": rssid, "type": mtype, "title": title, "year": year, "tmdbid": tmdbid}
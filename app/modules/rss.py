@@ -1,4 +1,6 @@
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
 
 import log
@@ -16,6 +18,11 @@ from app.utils.types import MediaType, SearchType
 
 lock = Lock()
 
+# RSS并发下载的站点数
+RSS_FETCH_WORKERS = 8
+# 单个站点RSS下载超时（秒）
+RSS_FETCH_TIMEOUT = 30
+
 
 @singleton
 class Rss:
@@ -96,20 +103,24 @@ class Rss:
             rss_download_torrents = []
             # 缺失的资源详情
             rss_no_exists = {}
-            # 遍历站点资源
+            # 需要下载RSS的站点
+            fetch_sites = []
             for site_info in rss_sites_list:
                 if not site_info:
                     continue
-                # 站点名称
-                site_name = site_info.name
                 # 没有订阅的站点中的不搜索
-                if check_sites and site_name not in check_sites:
+                if check_sites and site_info.name not in check_sites:
                     continue
+                if not site_info.rssurl:
+                    log.info(f"【Rss】{site_info.name} 未配置rssurl，跳过...")
+                    continue
+                fetch_sites.append(site_info)
+            # 并发下载各站点RSS，按下载完成的顺序处理
+            for site_info, rss_acticles, fetch_cost in self.__fetch_sites_rss(fetch_sites):
+                # 站点名称
+                site_name = site_info.name
                 # 站点rss链接
                 rss_url = site_info.rssurl
-                if not rss_url:
-                    log.info(f"【Rss】{site_name} 未配置rssurl，跳过...")
-                    continue
                 # 站点信息
                 site_id = site_info.id
 
@@ -128,7 +139,6 @@ class Rss:
                     site_order = 100 - site_info.pri
                 else:
                     site_order = 0
-                rss_acticles = self.rsshelper.parse_rssxml(url=rss_url)
                 if rss_acticles is None:
                     # RSS链接过期
                     log.error(f"【Rss】站点 {site_name} RSS链接已过期，请重新获取！")
@@ -142,8 +152,13 @@ class Rss:
                     continue
                 
                 log.info(f"【Rss】{site_name} 获取数据：{len(rss_acticles)}")
+                match_start = time.time()
+                # 批量查询未处理过的种子
+                unrssd_enclosures = self.rsshelper.get_unrssd_enclosures(
+                    [article.get('enclosure') for article in rss_acticles])
                 # 处理RSS结果
                 res_num = 0
+                rss_history = []
                 for article in rss_acticles:
                     try:
                         # 种子名
@@ -157,7 +172,7 @@ class Rss:
                         # 开始处理
                         log.debug(f"【Rss】开始处理：{title}")
                         # 检查这个种子是不是下过了
-                        if self.rsshelper.is_rssd_by_enclosure(enclosure):
+                        if enclosure not in unrssd_enclosures:
                             log.info(f"【Rss】{title} 已成功订阅过")
                             continue
 
@@ -300,8 +315,10 @@ class Rss:
                         # 设置下载参数
                         media_info.set_download_info(download_setting=match_info.get("download_setting"),
                                                      save_path=match_info.get("save_path"))
-                        # 插入数据库历史记录
-                        self.rsshelper.insert_rss_torrents(media_info)
+                        # 数据库历史记录，站点处理完后批量写入
+                        rss_history.append(media_info)
+                        # 同一报文中重复的种子只处理一次
+                        unrssd_enclosures.discard(enclosure)
                         # 加入下载列表
                         if media_info not in rss_download_torrents:
                             rss_download_torrents.append(media_info)
@@ -311,12 +328,40 @@ class Rss:
                     except Exception as e:
                         log.exception('【Rss】处理RSS发生错误: ')
                         continue
-                log.info("【Rss】%s 处理结束，匹配到 %s 个有效资源" , site_name, res_num)
+                # 插入数据库历史记录
+                self.rsshelper.insert_rss_torrents_batch(rss_history)
+                log.info("【Rss】%s 处理结束，匹配到 %s 个有效资源，下载解析耗时 %.2f 秒，匹配耗时 %.2f 秒",
+                         site_name, res_num, fetch_cost, time.time() - match_start)
             log.info("【Rss】所有RSS处理结束，共 %s 个有效资源", len(rss_download_torrents))
             # 开始择优下载
             self.download_rss_torrent(rss_download_torrents=rss_download_torrents,
                                       rss_no_exists=rss_no_exists)
 
+    def __fetch_sites_rss(self, sites):
+        """
+        并发下载解析各站点的RSS，按完成顺序返回
+        :param sites: 站点列表
+        :return: 生成器，(站点信息, RSS条目列表, 下载解析耗时)，条目列表为None代表RSS过期
+        """
+        if not sites:
+            return
+
+        def _fetch(_site_info):
+            _start = time.time()
+            try:
+                _articles = self.rsshelper.parse_rssxml(url=_site_info.rssurl, timeout=RSS_FETCH_TIMEOUT)
+            except Exception as err:
+                log.error(f"【Rss】{_site_info.name} RSS下载出错：{str(err)}")
+                _articles = []
+            return _articles, time.time() - _start
+
+        with ThreadPoolExecutor(max_workers=min(len(sites), RSS_FETCH_WORKERS),
+                                thread_name_prefix="RssFetch") as executor:
+            futures = {executor.submit(_fetch, site_info): site_info for site_info in sites}
+            for future in as_completed(futures):
+                articles, cost = future.result()
+                yield futures[future], articles, cost
+
     def check_torrent_rss(self,
                           media_info,
                           rss_movies,
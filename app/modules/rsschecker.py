@@ -204,6 +204,11 @@ class RssChecker(object):
             return
         else:
             log.info("【RssChecker】%s 获取数据：%s" % (taskinfo.get("name"), len(rss_result)))
+        task_type = taskinfo.get("uses")
+        # 批量查询未处理过的报文
+        unprocessed_keys = self.rsshelper.get_unrssd_enclosures(
+            [self.__get_article_key(task_type, res.get('title'), res.get('year'), res.get('enclosure'))
+             for res in rss_result])
         # 处理RSS结果
         res_num = 0
         no_exists = {}
@@ -230,10 +235,16 @@ class RssChecker(object):
 
                 log.info("【RssChecker】开始处理：%s" % title)
 
-                task_type = taskinfo.get("uses")
                 meta_name = "%s %s" % (title, year) if year else title
                 # 检查是否已处理过
-                if self.is_article_processed(task_type, title, year, enclosure):
+                article_key = self.__get_article_key(task_type, title, year, enclosure)
+                if article_key:
+                    if article_key not in unprocessed_keys:
+                        log.info("【RssChecker】%s 已处理过" % title)
+                        continue
+                    # 同一报文中重复的条目只处理一次
+                    unprocessed_keys.discard(article_key)
+                elif self.is_article_processed(task_type, title, year, enclosure):
                     log.info("【RssChecker】%s 已处理过" % title)
                     continue
 
@@ -723,6 +734,22 @@ class RssChecker(object):
         except Exception as e:
             log.exception('【RssChecker】停止定时服务出错: ')
 
+    @staticmethod
+    def __get_article_key(task_type, title, year, enclosure):
+        """
+        获取报文在RSS记录中的查重链接，与is_article_processed保持一致
+        :return: 查重链接，无法按链接查重时返回None
+        """
+        if year and len(year) > 4:
+            year = year[:4]
+        match task_type:
+            case "D":
+                return enclosure or None
+            case "R":
+                return (f"{title} {year}" if year else title) or None
+            case _:
+                return None
+
     def is_article_processed(self, task_type, title, year, enclosure):
         """
         检查报文是否已处理
@@ -1,5 +1,7 @@
 from typing import List, Tuple
 
+import log
+
 from app.core.task_manager import GlobalTaskManager
 from app.helper import DbHelper
 from app.media import Media
@@ -57,14 +59,15 @@ class Searcher:
 
         torrent_list = self.indexer.search_by_keyword(key_word, filter_args, match_media, in_from, task_id)
 
-        # 清空上次结果
-        self.delete_all_search_torrents()
-        # 排序, 入库
-        if torrent_list and (in_from == SearchType.WEB or in_from in self.message.get_search_types()):
-            # 排序
-            torrent_list = sorted(torrent_list, key=lambda x: x.get_sort_str(), reverse=True)
-            # 插入数据库
-            self.insert_search_results(media_items=torrent_list, ident_flag=ident_flag, title=search_theme)
+        # 清空上次结果并入库，索引器返回的结果已去重并按优先级排序，在同一个事务中完成
+        try:
+            with self.dbhelper.unit_of_work():
+                self.delete_all_search_torrents()
+                if torrent_list and (in_from == SearchType.WEB or in_from in self.message.get_search_types()):
+                    # 插入数据库
+                    self.insert_search_results(media_items=torrent_list, ident_flag=ident_flag, title=search_theme)
+        except Exception as e:
+            log.error("【Searcher】保存搜索结果失败：%s" % str(e))
 
         # 结束进度
         if task_id:
@@ -1,6 +1,7 @@
 import os.path
 import sqlite3
 import shutil
+import tempfile
 import time
 
 from pathlib import Path
@@ -28,7 +29,14 @@ class Backup:
             # 把现有的相关文件进行copy备份
             shutil.copy(f'{config_path}/config.yaml', backup_path)
             shutil.copy(f'{config_path}/default-category.yaml', backup_path)
-            shutil.copy(f'{config_path}/user.db', backup_path)
+            # 数据库使用WAL模式，通过备份接口复制，包含尚未合并的日志
+            src_conn = sqlite3.connect(f'{config_path}/user.db')
+            dst_conn = sqlite3.connect(f'{backup_path}/user.db')
+            try:
+                src_conn.backup(dst_conn)
+            finally:
+                dst_conn.close()
+                src_conn.close()
 
             # 完整备份不删除表
             if not full_backup:
@@ -60,3 +68,32 @@ class Backup:
         except Exception as e:
             log.exception("[act]备份 异常:")
             return None
+
+    def restore(self, zip_file):
+        """
+        恢复备份文件
+        数据库通过备份接口写入运行中的数据库，其它线程的连接无需关闭，也不会残留旧的WAL日志
+        @param zip_file  备份文件
+        """
+        config_path = Config().get_config_path()
+        with tempfile.TemporaryDirectory(dir=Config().get_temp_path()) as temp_path:
+            shutil.unpack_archive(zip_file, temp_path, format='zip')
+            for name in os.listdir(temp_path):
+                # 数据库单独处理，旧版本备份中可能带有日志文件，不能覆盖运行中的日志
+                if name in ("user.db", "user.db-wal", "user.db-shm"):
+                    continue
+                src = os.path.join(temp_path, name)
+                dst = os.path.join(config_path, name)
+                if os.path.isdir(src):
+                    shutil.copytree(src, dst, dirs_exist_ok=True)
+                else:
+                    shutil.copy(src, dst)
+            db_file = os.path.join(temp_path, "user.db")
+            if os.path.exists(db_file):
+                src_conn = sqlite3.connect(db_file)
+                dst_conn = sqlite3.connect(f'{config_path}/user.db', timeout=30)
+                try:
+                    src_conn.backup(dst_conn)
+                finally:
+                    dst_conn.close()
+                    src_conn.close()
@@ -169,12 +169,17 @@ class SitesDataStatisticsCenter(object):
             with ThreadPool(min(len(refresh_sites), self._MAX_CONCURRENCY)) as p:
                 site_user_infos = list(filter(None, p.map(self.__refresh_site_data, refresh_sites)))
                 
-            # 登记历史数据
-            self.dbhelper.insert_site_statistics_history(site_user_infos)
-            # 实时用户数据
-            self.dbhelper.update_site_user_statistics(site_user_infos)
-            # 实时做种信息
-            self.dbhelper.update_site_seed_info(site_user_infos)
+            # 站点数据在同一个事务中写入
+            try:
+                with self.dbhelper.unit_of_work():
+                    # 登记历史数据
+                    self.dbhelper.insert_site_statistics_history(site_user_infos)
+                    # 实时用户数据
+                    self.dbhelper.update_site_user_statistics(site_user_infos)
+                    # 实时做种信息
+                    self.dbhelper.update_site_seed_info(site_user_infos)
+            except Exception as e:
+                log.error("【Sites】保存站点数据失败：%s" % str(e))
 
             # 更新时间
             self._last_update_time = datetime.now()
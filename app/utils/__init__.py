@@ -1,7 +1,7 @@
 from .dom_utils import DomUtils
 from .episode_format import EpisodeFormat
 from .async_request import AsyncRequestUtils
-from .http_utils import RequestUtils
+from .http_utils import RequestUtils, HttpSessionPool
 from .json_utils import JsonUtils
 from .number_utils import NumberUtils
 from .path_utils import PathUtils
@@ -1,16 +1,221 @@
+import threading
+import time
+from collections import OrderedDict
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
+
 import requests
 import urllib3
 
-from functools import lru_cache
 from typing import Any, Optional, Union
 from requests import Session, Response
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
 
 from config import Config
 import log
 
 urllib3.disable_warnings(InsecureRequestWarning)
 
+# 共享会话数量上限，超过后关闭最久未使用的会话
+HTTP_SESSION_MAX = 64
+# 每个会话缓存的主机连接池数量（同一站点跳转到其它域名时使用）
+HTTP_POOL_CONNECTIONS = 4
+# 每个主机保持的连接数，可通过 laboratory.http_pool_maxsize 调整
+HTTP_POOL_MAXSIZE = 10
+# 建立连接失败时的重试次数，可通过 laboratory.http_max_retries 调整
+HTTP_MAX_RETRIES = 1
+# 重试间隔系数（秒）
+HTTP_RETRY_BACKOFF = 0.3
+
+
+class _MetricsConnectionMixin:
+    """
+    统计连接建立（TCP+TLS握手）耗时及连接复用次数
+    """
+    # 连接建立后尚未发出过请求
+    _fresh = False
+
+    def _metrics_host(self):
+        # 通过代理隧道连接时统计目标主机
+        return getattr(self, "_tunnel_host", None) or self.host
+
+    def connect(self):
+        started = time.monotonic()
+        super().connect()
+        self._fresh = True
+        HttpSessionPool.record_connect(self._metrics_host(), time.monotonic() - started)
+
+    def request(self, *args, **kwargs):
+        reused = not self._fresh and self.sock is not None
+        result = super().request(*args, **kwargs)
+        self._fresh = False
+        HttpSessionPool.record_request(self._metrics_host(), reused)
+        return result
+
+
+class _MetricsHTTPConnection(_MetricsConnectionMixin, HTTPConnection):
+    pass
+
+
+class _MetricsHTTPSConnection(_MetricsConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _MetricsHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _MetricsHTTPConnection
+
+
+class _MetricsHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _MetricsHTTPSConnection
+
+
+_METRICS_POOL_CLASSES = {
+    "http": _MetricsHTTPConnectionPool,
+    "https": _MetricsHTTPSConnectionPool
+}
+
+
+class _MetricsHTTPAdapter(HTTPAdapter):
+    """
+    使用带统计的连接池
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _METRICS_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # SOCKS代理使用自己的连接类，不统计
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = _METRICS_POOL_CLASSES
+        return manager
+
+
+class _NoCookiePolicy(DefaultCookiePolicy):
+    """
+    共享会话不保存响应的Cookie，Cookie由每次请求单独传入，避免不同用途的请求互相影响
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class HttpSessionPool(object):
+    """
+    共享的HTTP会话
+    未指定会话的请求按 站点、代理、UA 复用会话，保持长连接，避免每次请求都重新建立TCP及TLS连接；
+    同时统计各主机的连接复用率及握手耗时
+    """
+    _lock = threading.Lock()
+    # (协议+域名, 代理, UA) -> Session
+    _sessions = OrderedDict()
+    # 主机 -> 统计数据
+    _stats = {}
+
+    @classmethod
+    def get_session(cls, url, proxies=None, ua=None):
+        """
+        获取共享会话
+        """
+        url_info = urlparse(url)
+        key = (f"{url_info.scheme}://{url_info.netloc}".lower(),
+               tuple(sorted((proxies or {}).items())),
+               ua)
+        with cls._lock:
+            session = cls._sessions.get(key)
+            if session:
+                cls._sessions.move_to_end(key)
+                return session
+            session = cls.__create_session()
+            cls._sessions[key] = session
+            while len(cls._sessions) > HTTP_SESSION_MAX:
+                _, expired = cls._sessions.popitem(last=False)
+                expired.close()
+            return session
+
+    @staticmethod
+    def __create_session():
+        laboratory = Config().get_config('laboratory') or {}
+        try:
+            pool_maxsize = int(laboratory.get('http_pool_maxsize') or HTTP_POOL_MAXSIZE)
+        except (TypeError, ValueError):
+            pool_maxsize = HTTP_POOL_MAXSIZE
+        try:
+            max_retries = int(laboratory.get('http_max_retries', HTTP_MAX_RETRIES))
+        except (TypeError, ValueError):
+            max_retries = HTTP_MAX_RETRIES
+        # 只重试建立连接失败，请求已发出后的错误不重试，与不使用共享会话时的行为一致
+        retry = Retry(total=max_retries,
+                      connect=max_retries,
+                      read=False,
+                      backoff_factor=HTTP_RETRY_BACKOFF)
+        adapter = _MetricsHTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS,
+                                      pool_maxsize=pool_maxsize,
+                                      max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.cookies.set_policy(_NoCookiePolicy())
+        return session
+
+    @classmethod
+    def __get_stats(cls, host):
+        stats = cls._stats.get(host)
+        if stats is None:
+            stats = cls._stats[host] = {"requests": 0, "reused": 0, "connections": 0, "handshake_time": 0}
+        return stats
+
+    @classmethod
+    def record_connect(cls, host, elapsed):
+        """
+        记录新建连接及耗时
+        """
+        with cls._lock:
+            stats = cls.__get_stats(host)
+            stats["connections"] += 1
+            stats["handshake_time"] += elapsed
+
+    @classmethod
+    def record_request(cls, host, reused):
+        """
+        记录请求是否复用了已有连接
+        """
+        with cls._lock:
+            stats = cls.__get_stats(host)
+            stats["requests"] += 1
+            if reused:
+                stats["reused"] += 1
+
+    @classmethod
+    def clear(cls):
+        """
+        关闭所有共享会话
+        """
+        with cls._lock:
+            sessions = list(cls._sessions.values())
+            cls._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    @classmethod
+    def stats(cls):
+        """
+        各主机的连接复用率及平均握手耗时（毫秒）
+        """
+        with cls._lock:
+            return {host: {
+                "requests": stats["requests"],
+                "connections": stats["connections"],
+                "reuse_ratio": round(stats["reused"] / stats["requests"], 3) if stats["requests"] else 0,
+                "avg_handshake_ms": round(stats["handshake_time"] * 1000 / stats["connections"], 1)
+                if stats["connections"] else 0
+            } for host, stats in cls._stats.items()}
+
 
 class RequestUtils:
     
@@ -64,14 +269,16 @@ class RequestUtils:
         :return: HTTP响应对象
         :raises: requests.exceptions.RequestException 仅raise_exception为True时会抛出
         """
-        if self._session is None:
-            req_method = requests.request
-        else:
-            req_method = self._session.request
-
         kwargs.setdefault("headers", self._headers)
         kwargs.setdefault("cookies", self._cookies)
         kwargs.setdefault("proxies", self._proxies)
+        if self._session is None:
+            # 未指定会话时使用按站点共享的会话，复用长连接
+            req_method = HttpSessionPool.get_session(url=url,
+                                                     proxies=kwargs.get("proxies"),
+                                                     ua=(kwargs.get("headers") or {}).get("User-Agent")).request
+        else:
+            req_method = self._session.request
         kwargs.setdefault("timeout", self._timeout)
         kwargs.setdefault("verify", False)
         kwargs.setdefault("stream", False)
@@ -218,14 +425,3 @@ class RequestUtils:
         :return: 转换后的字符串
         """
         return ";".join(f"{key}={value}" for key, value in data.items())
-    
-    @staticmethod
-    @lru_cache(maxsize=128)
-    def request_cache(url):
-        """
-        带缓存的请求
-        """
-        ret = RequestUtils().get_res(url)
-        if ret:
-            return ret.content
-        return None
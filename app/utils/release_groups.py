@@ -11,6 +11,8 @@ class ReleaseGroupsMatcher(object):
     __release_groups = None
     custom_release_groups = None
     custom_separator = None
+    # 配置版本，变更时递增，用于识别结果缓存失效
+    version = 0
     RELEASE_GROUPS = {
         "0ff": ['FF(?:(?:A|WE)B|CD|E(?:DU|B)|TV)'],
         "1pt": ['1PTBA'],
@@ -109,3 +111,4 @@ class ReleaseGroupsMatcher(object):
         """
         self.custom_release_groups = release_groups
         self.custom_separator = separator
+        self.version += 1
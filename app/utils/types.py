@@ -183,6 +183,22 @@ class SystemConfigKey(Enum):
     UserScraperConf = "UserScraperConf"
     # 索引站点
     UserIndexerSites = "UserIndexerSites"
+    # 媒体库增量同步进度
+    MediaSyncWatermark = "MediaSyncWatermark"
+
+
+# 后台刷新的数据快照Key字典
+class SnapshotKey(Enum):
+    # 媒体库列表
+    MediaLibraries = "media_libraries"
+    # 媒体服务器活动日志
+    MediaActivity = "media_activity"
+    # 最近添加
+    MediaLatest = "media_latest"
+    # 媒体数量
+    MediaCounts = "media_counts"
+    # 媒体库存储空间
+    LibrarySpace = "library_space"
 
 
 # 处理进度Key字典
@@ -1,14 +1,18 @@
 import os
 import threading
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException
 from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
 
+from app.middleware.loop_lag import LoopLagMiddleware
+from app.middleware.security import get_current_user
 from app.middleware.staticfile import NoCacheStaticFiles
 from app.modules.wallpaper import get_login_wallpaper
+from app.indexer.client.browser import BrowserPool
+from app.utils import HttpSessionPool
 
 from app.api.action import action_router
 from app.api.auth import auth_router
@@ -40,6 +44,9 @@ app.add_middleware(
 # 启用压缩
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
+# 记录处理中的请求，用于定位阻塞事件循环的请求
+app.add_middleware(LoopLagMiddleware)
+
 # 注册路由
 app.include_router(open_router)
 app.include_router(data_router)
@@ -123,4 +130,13 @@ def thread_debug():
     return {
         "thread_count": len(threads),
         "threads": [t.name for t in threads]
-    }
\ No newline at end of file
+    }
+
+@app.get("/debug/http", dependencies=[Depends(get_current_user)])
+def http_debug():
+    return HttpSessionPool.stats()
+
+
+@app.get("/debug/browser", dependencies=[Depends(get_current_user)])
+def browser_debug():
+    return BrowserPool().stats()
@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS ix_RSS_TORRENTS_ENCLOSURE ON RSS_TORRENTS (ENCLOSURE);
+CREATE INDEX IF NOT EXISTS ix_SITE_BRUSH_TORRENTS_ENCLOSURE ON SITE_BRUSH_TORRENTS (ENCLOSURE);